@@ -1,11 +1,14 @@
 import requests
 import json
 import time
-from typing import Optional, Dict, Any
-from config import LM_STUDIO, SYSTEM_PROMPTS
-from exceptions import AIConnectionError, InvalidResponseError
+from typing import Optional, Dict, Any, Callable, List
+from config import LM_STUDIO, SYSTEM_PROMPTS, GENERATION
+from exceptions import AIConnectionError, InvalidResponseError, CassetteMissError
 from logger import logger
-from json_utils import robust_json_parse
+from json_utils import robust_json_parse, locate_json_error, clean_markdown_json
+import llm_cassette
+import llm_trace
+import metrics
 
 
 class AIClient:
@@ -16,6 +19,15 @@ class AIClient:
         self.headers = {"Content-Type": "application/json"}
         self.max_retries = LM_STUDIO.max_retries
         self.timeout = LM_STUDIO.timeout
+        # Наблюдатели получают описание каждого вызова make_request (трассировка, метрики)
+        self.observers: List[Callable[[Dict[str, Any]], None]] = []
+        if llm_trace.recorder is not None:
+            self.observers.append(llm_trace.recorder)
+        self.metrics = metrics.observer()
+        if self.metrics is not None:
+            self.observers.append(self.metrics)
+        # Кассета: запись ответов модели или воспроизведение без сети (CASSETTE.mode)
+        self.cassette = llm_cassette.from_config()
         logger.info(f"AI клиент инициализирован для работы с LM Studio: {self.base_url}")
 
     def make_request(self, prompt: str, system_prompt: str = None, 
@@ -35,9 +47,40 @@ class AIClient:
             "stream": False
         }
 
+        call = {
+            'ts': time.time(),
+            'session_id': llm_trace.current_session_id(),
+            'call_site': llm_trace.call_site(),
+            'model': payload['model'],
+            'system_prompt': system_content,
+            'prompt': prompt,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'content': None,
+            'usage': None,
+            'latency': None,
+            'attempts': 0,
+            'error': None
+        }
+        started = time.perf_counter()
+
+        if self.cassette is not None and self.cassette.replaying:
+            try:
+                recorded = self.cassette.play(payload)
+            except CassetteMissError as e:
+                logger.error(e.message)
+                call.update(error=e.message, latency=time.perf_counter() - started)
+                self._notify(call)
+                raise
+            call.update(content=recorded['content'], usage=recorded.get('usage'), attempts=1,
+                        latency=time.perf_counter() - started)
+            self._notify(call)
+            return recorded['content']
+
         for attempt in range(self.max_retries):
+            call['attempts'] = attempt + 1
             try:
-                logger.debug(f"Отправка запроса к AI (попытка {attempt + 1})")
+                logger.debug("Отправка запроса к AI (попытка %d)", attempt + 1)
                 response = requests.post(
                     f"{self.base_url}/chat/completions",
                     headers=self.headers,
@@ -48,22 +91,41 @@ class AIClient:
                 if response.status_code == 200:
                     result = response.json()
                     content = result['choices'][0]['message']['content'].strip()
-                    logger.debug(f"Получен ответ от AI: {len(content)} символов")
+                    logger.debug("Получен ответ от AI: %d символов", len(content))
+                    call.update(content=content, usage=result.get('usage'), error=None,
+                                latency=time.perf_counter() - started)
+                    if self.cassette is not None:
+                        self.cassette.record(payload, content, call['usage'], call['latency'])
+                    self._notify(call)
                     return content
                 else:
                     logger.warning(f"Ошибка API: {response.status_code} - {response.text}")
+                    call['error'] = f"HTTP {response.status_code}"
                     
             except requests.exceptions.RequestException as e:
                 logger.warning(f"Ошибка подключения (попытка {attempt + 1}): {e}")
+                call['error'] = str(e)
                 if attempt < self.max_retries - 1:
                     time.sleep(2)
                     
         error_msg = "Не удалось получить ответ от нейросети после всех попыток"
         logger.error(error_msg)
+        call['latency'] = time.perf_counter() - started
+        self._notify(call)
         raise AIConnectionError(error_msg)
 
+    def _notify(self, call: Dict[str, Any]):
+        """Передача описания вызова наблюдателям; их ошибки не влияют на запрос"""
+        for observer in self.observers:
+            try:
+                observer(call)
+            except Exception as e:
+                logger.warning(f"Ошибка наблюдателя запросов к AI: {e}")
+
     def check_connection(self) -> bool:
         """Проверка подключения к LM Studio"""
+        if self.cassette is not None and self.cassette.replaying:
+            return True
         try:
             response = requests.get(f"{self.base_url}/models", timeout=3)
             is_connected = response.status_code == 200
@@ -75,14 +137,87 @@ class AIClient:
 
     def parse_json_response(self, response: str) -> Optional[Dict[str, Any]]:
         """Парсинг JSON ответа с надежной обработкой"""
+        site = llm_trace.call_site() if self.metrics is not None else None
         result = robust_json_parse(response)
         if result is not None:
             logger.debug("JSON ответ успешно распарсен")
+            self._record_parse(site, 'ok')
             return result
-        else:
-            logger.error(f"Не удалось распарсить JSON ответ")
-            logger.error(f"Исходный ответ: {response}")
-            raise InvalidResponseError("Не удалось распарсить JSON ответ после всех попыток")
+        
+        # Вместо перегенерации всего ответа просим модель исправить только сломанный участок
+        result = self.repair_json_response(response)
+        if result is not None:
+            logger.info("JSON ответ восстановлен точечным исправлением")
+            self._record_parse(site, 'repaired')
+            return result
+        
+        self._record_parse(site, 'failed')
+        # Длинный ответ обрезается обработчиком лога до LOGGING.max_message_chars
+        logger.error("Не удалось распарсить JSON ответ (%d символов): %s", len(response), response)
+        raise InvalidResponseError("Не удалось распарсить JSON ответ после всех попыток")
+
+    def _record_parse(self, call_site: Optional[str], outcome: str):
+        if self.metrics is not None:
+            self.metrics.record_parse(call_site, outcome)
+
+    def repair_json_response(self, response: str) -> Optional[Any]:
+        """
+        Точечное исправление синтаксиса JSON силами модели
+        
+        В запрос уходит только окрестность позиции ошибки, а не весь ответ,
+        поэтому каждая попытка стоит десятки токенов, а не тысячи.
+        Исправленный участок вклеивается обратно во фрагмент.
+        """
+        located = locate_json_error(response)
+        if located is None:
+            return robust_json_parse(response)
+        
+        fragment = located[0]
+        window = GENERATION.json_repair_window
+        
+        for attempt in range(GENERATION.json_repair_attempts):
+            located = locate_json_error(fragment)
+            if located is None:
+                break
+            
+            _, error_pos, error_msg = located
+            start = max(0, error_pos - window)
+            end = min(len(fragment), error_pos + window)
+            snippet = fragment[start:end]
+            marker = error_pos - start
+            
+            prompt = f"""
+Во фрагменте JSON синтаксическая ошибка: {error_msg} (позиция {marker} во фрагменте, отмечена символом ⟦⟧).
+
+Фрагмент с отметкой:
+{snippet[:marker]}⟦⟧{snippet[marker:]}
+
+Исправь ТОЛЬКО синтаксис (запятые, кавычки, скобки, экранирование).
+НЕ меняй текст значений, НЕ добавляй и НЕ удаляй поля.
+Фрагмент может начинаться и заканчиваться посреди документа - не дописывай недостающие скобки за его пределами.
+
+Верни исправленный фрагмент без отметки ⟦⟧ и без пояснений.
+"""
+            
+            try:
+                fixed = self.make_request(
+                    prompt,
+                    SYSTEM_PROMPTS["json_repair"],
+                    GENERATION.max_tokens_repair,
+                    GENERATION.temperature_repair
+                )
+            except AIConnectionError as e:
+                logger.warning(f"Не удалось выполнить исправление JSON: {e}")
+                return None
+            
+            if "```" in fixed:
+                fixed = clean_markdown_json(fixed)
+            fixed = fixed.replace("⟦⟧", "")
+            
+            logger.debug("Исправление JSON (попытка %d): позиция %s, %s", attempt + 1, error_pos, error_msg)
+            fragment = fragment[:start] + fixed + fragment[end:]
+        
+        return robust_json_parse(fragment)
 
     def _clean_json_response(self, text: str) -> str:
         """Очистка JSON ответа от обрамлений"""
@@ -0,0 +1,79 @@
+"""
+Базовые результаты бенчмарков: сохранение прогона в JSON и сравнение с ним
+
+Результаты - словарь {случай: {метрика: значение}}; для всех метрик
+меньше - лучше (время, число вызовов, токены). Рост метрики больше порога
+считается регрессией.
+"""
+
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import json_backend
+
+
+# Относительный рост метрики, после которого она помечается как регрессия
+DEFAULT_THRESHOLD = 0.10
+
+Results = Dict[str, Dict[str, float]]
+
+
+def save_results(path: Path, benchmark: str, results: Results, settings: Dict[str, Any] = None):
+    """Запись результатов прогона вместе с окружением"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    json_backend.strict.dump_file({
+        'benchmark': benchmark,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'settings': settings or {},
+        'results': results
+    }, path, pretty=True, atomic=True)
+
+
+def load_results(path: Path) -> Dict[str, Any]:
+    """Сохраненный прогон"""
+    return json_backend.load_file(Path(path))
+
+
+def compare(current: Results, baseline: Results, metrics: List[str],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, str, float]]:
+    """
+    Таблица сравнения с базовым прогоном
+    Возвращает регрессии: (случай, метрика, относительный рост)
+    """
+    regressions = []
+    header = f"{'случай':<36} {'метрика':<18} {'база':>12} {'сейчас':>12} {'изменение':>10}"
+    print(header)
+    print('-' * len(header))
+
+    for case, values in current.items():
+        base_values = baseline.get(case)
+        if base_values is None:
+            print(f"{case:<36} {'(нет в базе)':<18}")
+            continue
+        for metric in metrics:
+            if metric not in values or metric not in base_values:
+                continue
+            now, base = values[metric], base_values[metric]
+            change = (now - base) / base if base else 0.0
+            mark = ''
+            if change > threshold:
+                regressions.append((case, metric, change))
+                mark = ' ⚠️'
+            print(f"{case:<36} {metric:<18} {base:>12.4g} {now:>12.4g} {change:>+9.1%}{mark}")
+
+    for case in baseline:
+        if case not in current:
+            print(f"{case:<36} {'(нет в прогоне)':<18}")
+
+    print()
+    if regressions:
+        print(f"Регрессий (рост больше {threshold:.0%}): {len(regressions)}")
+    else:
+        print(f"Регрессий нет (порог {threshold:.0%})")
+    return regressions
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Сквозной бенчмарк брифинга с учетом вызовов модели
+
+Проводит полный брифинг NeuralNetwork (анализ компетенций, адаптивные
+вопросы, уточнение идеи, итерации, итоговый отчет) для каждой идеи корпуса
+и считает по этапам: вызовы модели (с разбивкой по месту вызова, включая
+скрытые перегенерации), токены из usage, время по часам, процессорное время
+потока и время ожидания модели.
+
+Модель - встроенная заглушка (stub_lm_server, по умолчанию), кассета
+(--cassette) или настоящий LM Studio (--live).
+
+Запуск: python benchmark_briefing.py [--corpus ideas.jsonl] [--iterations 2]
+                                     [--output results.json] [--baseline baseline.json]
+Корпус - JSON Lines с полем idea (или user_idea, title) либо текст по идее в строке.
+"""
+
+import argparse
+import logging
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+import benchmark_baseline
+from config import CASSETTE, LM_STUDIO, SessionStep
+from logger import logger
+
+
+DEFAULT_CORPUS = [
+    "Хочу открыть кофейню рядом с домом",
+    "Хочу придумать новое блюдо из доступных мне ингредиентов",
+    "Планирую запустить онлайн-школу программирования для детей",
+    "Хочу сделать мобильное приложение для учета личных финансов",
+    "Думаю организовать доставку фермерских продуктов по подписке",
+    "Хочу написать книгу о путешествиях по России",
+    "Планирую открыть небольшой сервис по ремонту велосипедов",
+    "Хочу автоматизировать учет заказов в семейной пекарне",
+]
+
+# Метрики этапа, которые сравниваются с базовым прогоном
+METRICS = ['calls', 'prompt_tokens', 'completion_tokens', 'wall', 'cpu']
+
+STAGE_FINAL = SessionStep.COMPLETED.value
+
+
+def load_corpus(path: Path) -> List[str]:
+    """Идеи из файла: JSON Lines (idea/user_idea/title) или по идее в строке"""
+    import json_backend
+
+    ideas = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    item = json_backend.loads(line)
+                except ValueError:
+                    continue
+                idea = item.get('idea') or item.get('user_idea') or item.get('title')
+                if idea:
+                    ideas.append(idea)
+            else:
+                ideas.append(line)
+    return ideas
+
+
+class CallAccounting:
+    """Наблюдатель AIClient: вызовы модели по этапам брифинга"""
+
+    def __init__(self):
+        self.stage = None
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def _stage(self, stage: str) -> Dict[str, Any]:
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = {
+                'calls': 0, 'failures': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                'model': 0.0, 'wall': 0.0, 'cpu': 0.0, 'runs': 0, 'call_sites': Counter()
+            }
+        return stats
+
+    def __call__(self, call: Dict[str, Any]):
+        stats = self._stage(self.stage or '-')
+        stats['calls'] += 1
+        stats['call_sites'][call['call_site']] += 1
+        stats['model'] += call['latency'] or 0.0
+        if call['content'] is None:
+            stats['failures'] += 1
+        usage = call.get('usage') or {}
+        stats['prompt_tokens'] += usage.get('prompt_tokens', 0)
+        stats['completion_tokens'] += usage.get('completion_tokens', 0)
+
+    def measure(self, stage: str, func, *args, **kwargs):
+        """Выполнение этапа с замером времени по часам и процессорного времени потока"""
+        self.stage = stage
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats = self._stage(stage)
+            stats['wall'] += time.perf_counter() - wall
+            stats['cpu'] += time.thread_time() - cpu
+            stats['runs'] += 1
+            self.stage = None
+
+
+def run_briefing(nn, idea: str, accounting: CallAccounting, iterations: int):
+    """Полный брифинг одной идеи с ответами по шаблону (Да/Нет по очереди)"""
+    def answer(questions) -> Dict[str, str]:
+        return {q.text: ('Да' if i % 2 == 0 else 'Нет') for i, q in enumerate(questions)}
+
+    assessment = accounting.measure(
+        SessionStep.COMPETENCY_ANALYSIS.value,
+        nn.analyze_user_request_and_generate_competency_assessment, idea
+    )
+    competency_answers = answer(assessment['competency_questions'])
+
+    asked: List[str] = []
+    refined_idea = idea
+    all_iterations = []
+    for iteration in range(iterations):
+        briefing = accounting.measure(
+            SessionStep.GENERATE_QUESTIONS.value,
+            nn.build_competency_profile_and_generate_questions,
+            idea, competency_answers, assessment['required_competencies'],
+            assessment['context_questions'], asked
+        )
+        answers = answer(briefing['questions'])
+        asked.extend(answers)
+
+        refined_idea = accounting.measure(SessionStep.GENERATE_REFINED.value, nn.generate_refined_idea, idea, answers)
+        all_iterations.append({'iteration': iteration + 1, 'answers': answers, 'refined_idea': refined_idea})
+
+    accounting.measure(STAGE_FINAL, nn.generate_final_result, idea, refined_idea, all_iterations, iterations)
+
+
+def _start_stub(args: argparse.Namespace):
+    """Заглушка LM Studio в фоновом потоке на свободном порту"""
+    import stub_lm_server
+
+    stub_args = stub_lm_server.build_parser().parse_args([
+        '--port', '0', '--ttft', str(args.ttft), '--per-token', str(args.per_token),
+        '--concurrency', '4', '--open-rate', str(args.open_rate), '--seed', str(args.seed)
+    ])
+    server = stub_lm_server.make_server(stub_args)
+    threading.Thread(target=server.serve_forever, name="stub-lm-server", daemon=True).start()
+    return server
+
+
+def _summarize(accounting: CallAccounting, briefings: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for stage, stats in accounting.stages.items():
+        results[stage] = {
+            'calls': stats['calls'] / briefings,
+            'failures': stats['failures'] / briefings,
+            'prompt_tokens': stats['prompt_tokens'] / briefings,
+            'completion_tokens': stats['completion_tokens'] / briefings,
+            'wall': stats['wall'] / briefings,
+            'cpu': stats['cpu'] / briefings,
+            'model': stats['model'] / briefings,
+        }
+    results['total'] = {
+        metric: sum(values[metric] for values in results.values())
+        for metric in ('calls', 'failures', 'prompt_tokens', 'completion_tokens', 'wall', 'cpu', 'model')
+    }
+    return results
+
+
+def _print_report(results: Dict[str, Dict[str, float]], accounting: CallAccounting, briefings: int):
+    print(f"Брифингов: {briefings}, значения - в среднем на брифинг")
+    print()
+    header = (f"{'этап':<22} {'вызовов':>8} {'ошибок':>7} {'prompt ток':>11} {'compl ток':>10} "
+              f"{'время, с':>9} {'CPU, с':>8} {'модель, с':>10} {'свое, с':>8}")
+    print(header)
+    print('-' * len(header))
+    for stage, values in results.items():
+        own = values['wall'] - values['model']
+        print(f"{stage:<22} {values['calls']:>8.1f} {values['failures']:>7.1f} "
+              f"{values['prompt_tokens']:>11.0f} {values['completion_tokens']:>10.0f} "
+              f"{values['wall']:>9.3f} {values['cpu']:>8.3f} {values['model']:>10.3f} {own:>8.3f}")
+
+    print()
+    print("Вызовы модели по месту вызова (в среднем на брифинг):")
+    for stage, stats in accounting.stages.items():
+        sites = ', '.join(f"{site} {count / briefings:.1f}" for site, count in stats['call_sites'].most_common())
+        print(f"  {stage}: {sites}")
+
+
+def run_benchmark(args: argparse.Namespace):
+    ideas = load_corpus(Path(args.corpus)) if args.corpus else list(DEFAULT_CORPUS)
+    if args.limit:
+        ideas = ideas[:args.limit]
+    if not ideas:
+        print("Корпус пуст")
+        return
+
+    # Сводка важнее построчных сообщений генераторов
+    logger.logger.setLevel(logging.WARNING)
+
+    server = None
+    if args.cassette:
+        CASSETTE.mode, CASSETTE.path, CASSETTE.latency = 'replay', args.cassette, args.latency
+        backend = f"кассета {args.cassette}"
+    elif args.live:
+        backend = f"LM Studio {LM_STUDIO.base_url}"
+    else:
+        server = _start_stub(args)
+        LM_STUDIO.base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        backend = f"заглушка (ttft {args.ttft}с, {args.per_token}с/токен)"
+
+    from neural_network import NeuralNetwork
+
+    nn = NeuralNetwork()
+    accounting = CallAccounting()
+    # Только учет вызовов: трассировка бенчмарка не нужна
+    nn.ai_client.observers = [accounting]
+
+    print(f"Модель: {backend}")
+    try:
+        for number, idea in enumerate(ideas, 1):
+            print(f"[{number}/{len(ideas)}] {idea[:70]}")
+            run_briefing(nn, idea, accounting, args.iterations)
+    finally:
+        if server is not None:
+            server.shutdown()
+    print()
+
+    results = _summarize(accounting, len(ideas))
+    _print_report(results, accounting, len(ideas))
+
+    settings = {
+        'backend': 'cassette' if args.cassette else 'live' if args.live else 'stub',
+        'ideas': len(ideas), 'iterations': args.iterations,
+        'ttft': args.ttft, 'per_token': args.per_token, 'open_rate': args.open_rate, 'seed': args.seed
+    }
+    if args.output:
+        benchmark_baseline.save_results(Path(args.output), 'briefing', results, settings)
+        print(f"\nРезультаты сохранены: {args.output}")
+    if args.baseline:
+        print()
+        baseline = benchmark_baseline.load_results(Path(args.baseline))
+        benchmark_baseline.compare(results, baseline['results'], METRICS, args.threshold)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк брифинга")
+    parser.add_argument('--corpus', help="Файл с идеями (по умолчанию - встроенный набор)")
+    parser.add_argument('--limit', type=int, default=None, help="Не больше N идей из корпуса")
+    parser.add_argument('--iterations', type=int, default=2, help="Итераций уточнения на брифинг")
+    backend = parser.add_mutually_exclusive_group()
+    backend.add_argument('--cassette', help="Воспроизводить ответы из кассеты")
+    backend.add_argument('--live', action='store_true', help="Использовать LM Studio из настроек")
+    parser.add_argument('--latency', choices=('none', 'fixed', 'sampled'), default='none',
+                        help="Пауза при воспроизведении кассеты")
+    parser.add_argument('--ttft', type=float, default=0.0, help="Заглушка: секунд до первого токена")
+    parser.add_argument('--per-token', type=float, default=0.0, help="Заглушка: секунд на токен")
+    parser.add_argument('--open-rate', type=float, default=0.1,
+                        help="Заглушка: доля вопросов не в закрытой форме")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Сохранить результаты в JSON")
+    parser.add_argument('--baseline', help="Сравнить с сохраненными результатами")
+    parser.add_argument('--threshold', type=float, default=benchmark_baseline.DEFAULT_THRESHOLD,
+                        help="Порог регрессии (доля роста)")
+    args = parser.parse_args()
+
+    run_benchmark(args)
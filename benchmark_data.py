@@ -0,0 +1,187 @@
+"""Генераторы синтетических данных для бенчмарков"""
+
+import random
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+from config import CompetencyLevel, SessionStep
+from models import (
+    Question, Answer, CompetencyProfile, RequiredCompetencies,
+    SessionIteration, SessionData
+)
+
+_WORDS = [
+    'приложение', 'пользователь', 'платформа', 'интеграция', 'аудитория', 'монетизация',
+    'подписка', 'команда', 'разработка', 'инвестиции', 'рынок', 'клиент', 'сервис',
+    'данные', 'аналитика', 'обучение', 'мобильное', 'веб', 'бюджет', 'запуск'
+]
+
+_PREFIXES = ['Планируете', 'Нужна', 'Требуется', 'Это будет', 'Хотите', 'Есть ли']
+
+_CATEGORIES = ['education', 'experience', 'knowledge', 'skills']
+
+_WEIGHTS = ['high', 'medium', 'low']
+
+
+def make_text(rng: random.Random, words: int) -> str:
+    """Случайный текст из словаря предметной области"""
+    return ' '.join(rng.choice(_WORDS) for _ in range(words))
+
+
+def make_question_text(rng: random.Random, index: int) -> str:
+    """Случайный закрытый вопрос"""
+    return f"{rng.choice(_PREFIXES)} {make_text(rng, 6)} №{index}?"
+
+
+def make_question(rng: random.Random, index: int) -> Question:
+    return Question(
+        text=make_question_text(rng, index),
+        explanation=make_text(rng, 12),
+        examples=[make_text(rng, 4) for _ in range(2)],
+        category=rng.choice(_CATEGORIES),
+        weight=rng.choice(_WEIGHTS),
+        adapted_for='Адаптировано под уровень базовый'
+    )
+
+
+def make_session(iterations: int = 20, questions_per_iteration: int = 7,
+                 seed: int = 0) -> SessionData:
+    """
+    Синтетическая сессия с длинной историей итераций
+    Размер растет линейно по iterations * questions_per_iteration
+    """
+    rng = random.Random(seed)
+    created_at = datetime(2024, 1, 1) + timedelta(minutes=seed)
+    question_index = 0
+
+    def next_question() -> Question:
+        nonlocal question_index
+        question_index += 1
+        return make_question(rng, question_index)
+
+    session = SessionData(
+        session_id=str(uuid.UUID(int=rng.getrandbits(128))),
+        created_at=created_at,
+        updated_at=created_at + timedelta(hours=1),
+        status=rng.choice(['active', 'completed']),
+        current_step=SessionStep.GENERATE_REFINED,
+        iteration_count=iterations,
+        competency_stage='main',
+        user_idea=make_text(rng, 40),
+        original_user_idea=make_text(rng, 40),
+        refined_idea=make_text(rng, 120),
+        final_result=make_text(rng, 300),
+        competency_profile=CompetencyProfile(
+            domain='Технологии/IT',
+            overall_level=CompetencyLevel.INTERMEDIATE,
+            strengths=[make_text(rng, 3) for _ in range(3)],
+            gaps=[make_text(rng, 3) for _ in range(3)],
+            question_strategy={'complexity_level': 'средние', 'explanation_needed': True},
+            profile_summary=make_text(rng, 20)
+        ),
+        required_competencies=RequiredCompetencies(
+            domain='Технологии/IT',
+            competencies=[make_text(rng, 2) for _ in range(3)],
+            knowledge=[make_text(rng, 2) for _ in range(3)],
+            skills=[make_text(rng, 2) for _ in range(3)],
+            experience=[make_text(rng, 2) for _ in range(2)]
+        ),
+        context_questions=[make_question_text(rng, i) for i in range(8)]
+    )
+
+    session.competency_questions = [next_question() for _ in range(5)]
+    session.clarifying_questions = [next_question() for _ in range(questions_per_iteration)]
+    session.competency_answers = {q.text: rng.choice(['Да', 'Нет']) for q in session.competency_questions}
+    session.main_answers = {q.text: rng.choice(['Да', 'Нет']) for q in session.clarifying_questions}
+    session.main_comments = {q.text: make_text(rng, 8) for q in session.clarifying_questions[:2]}
+
+    for i in range(iterations):
+        questions = [next_question() for _ in range(questions_per_iteration)]
+        timestamp = created_at + timedelta(minutes=i)
+        session.all_iterations.append(SessionIteration(
+            iteration=i,
+            timestamp=timestamp,
+            refined_idea=make_text(rng, 120),
+            feedback_type='iterate_again',
+            comments='Пользователь запросил новую итерацию',
+            questions=questions,
+            answers=[
+                Answer(
+                    question=q.text,
+                    answer=rng.choice(['Да', 'Нет', 'Не знаю']),
+                    comment=make_text(rng, 6) if rng.random() < 0.3 else '',
+                    timestamp=timestamp
+                )
+                for q in questions
+            ]
+        ))
+
+    session.all_asked_questions = [q.text for q in session.competency_questions + session.clarifying_questions]
+    for iteration in session.all_iterations:
+        session.all_asked_questions.extend(q.text for q in iteration.questions)
+
+    session.validation_history = [
+        {'timestamp': (created_at + timedelta(minutes=i)).isoformat(), 'feedback_type': 'mostly_correct'}
+        for i in range(iterations // 4)
+    ]
+    return session
+
+
+def make_sessions(count: int, iterations: int = 3, seed: int = 0) -> List[SessionData]:
+    """Набор сессий умеренного размера"""
+    return [make_session(iterations=iterations, seed=seed + i) for i in range(count)]
+
+
+def make_question_history(count: int, seed: int = 0) -> List[str]:
+    """Длинная история заданных вопросов (для фильтра дубликатов)"""
+    rng = random.Random(seed)
+    return [make_question_text(rng, i) for i in range(count)]
+
+
+def make_questions_text(count: int, seed: int = 0, open_share: float = 0.3) -> str:
+    """Ответ модели со списком вопросов: нумерованные строки, часть - не в закрытой форме"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(count):
+        if rng.random() < open_share:
+            lines.append(f"{i + 1}. Какой {make_text(rng, 4)} или {make_text(rng, 2)}?")
+        else:
+            lines.append(f"{i + 1}. {make_question_text(rng, i)}")
+        if rng.random() < 0.2:
+            lines.append(make_text(rng, 10))
+    return '\n'.join(lines)
+
+
+def make_nested_json(depth: int, width: int = 3, seed: int = 0) -> dict:
+    """Глубоко вложенный документ: на каждом уровне словарь со списком и вложенным уровнем"""
+    rng = random.Random(seed)
+    node: dict = {'value': make_text(rng, 3)}
+    for level in range(depth):
+        node = {
+            'level': level,
+            'title': make_text(rng, 4),
+            'items': [{'text': make_text(rng, 5), 'flag': rng.random() < 0.5} for _ in range(width)],
+            'child': node
+        }
+    return node
+
+
+def write_session_files(directory: Path, count: int, iterations: int = 1, seed: int = 0) -> int:
+    """
+    Файлы сессий в шардированной папке, записанные напрямую (без менеджера и манифеста)
+    Возвращает суммарный размер в байтах
+    """
+    import json_backend
+    from session_layout import SessionLayout
+
+    layout = SessionLayout(directory)
+    total = 0
+    for i in range(count):
+        document = make_session(iterations=iterations, questions_per_iteration=3, seed=seed + i).to_dict()
+        data = json_backend.backend.dumps_bytes(document)
+        path = layout.write_path(document['session_id'])
+        path.write_bytes(data)
+        total += len(data)
+    return total
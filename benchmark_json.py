@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк JSON бэкендов на больших файлах сессий
+
+Сравнивает пропускную способность сохранения и загрузки сессии
+для каждого установленного бэкенда (stdlib, orjson, ujson)
+в компактном и форматированном виде.
+
+Запуск: python benchmark_json.py [--iterations 200] [--repeat 20]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import json_backend
+from benchmark_data import make_session
+
+
+def _measure(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков, в секундах"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_benchmark(iterations: int, repeat: int):
+    session = make_session(iterations=iterations)
+    document = session.to_dict()
+
+    print(f"Активный бэкенд: {json_backend.backend.name}")
+    print(f"json5 доступен: {'да' if json_backend.HAS_JSON5 else 'нет'}")
+    print()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'session.json'
+
+        header = f"{'бэкенд':<10} {'формат':<8} {'размер, КБ':>11} {'save, МБ/с':>11} {'load, МБ/с':>11} {'save, мс':>9} {'load, мс':>9}"
+        print(header)
+        print('-' * len(header))
+
+        for name, backend in json_backend.BACKENDS.items():
+            for pretty in (False, True):
+                backend.dump_file(document, path, pretty=pretty)
+                size_mb = path.stat().st_size / (1024 * 1024)
+
+                save_time = _measure(lambda: backend.dump_file(document, path, pretty=pretty), repeat)
+                load_time = _measure(lambda: backend.load_file(path), repeat)
+
+                print(
+                    f"{name:<10} {'pretty' if pretty else 'compact':<8} "
+                    f"{size_mb * 1024:>11.1f} {size_mb / save_time:>11.1f} {size_mb / load_time:>11.1f} "
+                    f"{save_time * 1000:>9.2f} {load_time * 1000:>9.2f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк JSON бэкендов")
+    parser.add_argument('--iterations', type=int, default=200, help="Итераций в синтетической сессии")
+    parser.add_argument('--repeat', type=int, default=20, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    run_benchmark(args.iterations, args.repeat)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк стоимости вызовов логгера при выключенном уровне DEBUG
+
+Сравнивает отладочный вызов с f-строкой (текст собирается всегда) с ленивыми
+вариантами: %-аргументы, функция-сообщение и логгер сессии. При выключенном
+уровне ленивые вызовы должны стоить почти как пустой вызов функции.
+
+Запуск: python benchmark_logging.py [--calls 200000] [--repeat 5]
+"""
+
+import argparse
+import logging
+import timeit
+
+from logger import BriefingLogger
+
+
+def run_benchmark(calls: int, repeat: int):
+    # Отдельный логгер без файла: уровень INFO, отладочные сообщения отбрасываются
+    log = BriefingLogger("benchmark_logging")
+    log.logger.setLevel(logging.INFO)
+    session_log = log.for_session("3fa2c1d0-0000-4000-8000-000000000000")
+
+    question = "Планируется ли мобильное приложение для клиентов?" * 3
+    similarity = 0.8731
+    session_id = "3fa2c1d0-0000-4000-8000-000000000000"
+
+    def noop(*args, **kwargs):
+        pass
+
+    cases = [
+        ("пустой вызов функции", lambda: noop("Найден похожий вопрос: '%s'", question)),
+        ("f-строка", lambda: log.debug(f"Найден похожий вопрос (схожесть: {similarity:.2f}): '{question}'")),
+        ("f-строка + session_id", lambda: log.debug(f"Найден похожий вопрос: '{question}'", session_id=session_id)),
+        ("%-аргументы", lambda: log.debug("Найден похожий вопрос (схожесть: %.2f): '%s'", similarity, question)),
+        ("%-аргументы + session_id", lambda: log.debug("Найден похожий вопрос: '%s'", question, session_id=session_id)),
+        ("функция-сообщение", lambda: log.debug(lambda: f"Найден похожий вопрос: '{question}'")),
+        ("логгер сессии", lambda: session_log.debug("Найден похожий вопрос: '%s'", question)),
+    ]
+
+    print(f"Вызовов в замере: {calls}, повторов: {repeat}")
+    print()
+    header = f"{'вариант':<28} {'нс/вызов':>10} {'сверх пустого, нс':>19}"
+    print(header)
+    print('-' * len(header))
+
+    baseline = None
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=calls, repeat=repeat))
+        per_call_ns = best / calls * 1e9
+        if baseline is None:
+            baseline = per_call_ns
+        print(f"{name:<28} {per_call_ns:>10.1f} {per_call_ns - baseline:>19.1f}")
+
+    log.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк выключенных отладочных вызовов логгера")
+    parser.add_argument('--calls', type=int, default=200000, help="Вызовов в одном замере")
+    parser.add_argument('--repeat', type=int, default=5, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    run_benchmark(args.calls, args.repeat)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Микробенчмарки процессорных участков кода
+
+Замеряет на синтетических данных:
+- QuestionValidator.is_closed_form_question и extract_questions_from_text
+- utils.extract_questions_from_text
+- QuestionGenerator._filter_duplicate_questions на длинной истории вопросов
+- json_utils.robust_json_parse на глубоко вложенном, обернутом в markdown и сломанном JSON
+- SessionData.to_dict / from_dict на сессии с длинной историей
+- SessionManager.get_all_sessions на папке с тысячами сессий (с готовым манифестом и без)
+
+Результат - лучшее и медианное время на операцию в микросекундах.
+Прогон сохраняется как базовый (--save-baseline) и сравнивается с ним
+при следующих запусках, чтобы отслеживать регрессии.
+
+Запуск: python benchmark_micro.py [--sessions 10000] [--repeat 5] [--only robust_json]
+                                  [--save-baseline] [--baseline benchmark_results/micro_baseline.json]
+"""
+
+import argparse
+import logging
+import statistics
+import tempfile
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import benchmark_baseline
+import benchmark_data
+import json_backend
+from config import STORAGE
+from logger import logger
+
+
+DEFAULT_BASELINE = "benchmark_results/micro_baseline.json"
+
+# Метрики случая, которые сравниваются с базовым прогоном
+METRICS = ['best_us', 'median_us']
+
+# Случай: (имя, функция, операций за вызов)
+Case = Tuple[str, Callable[[], object], int]
+
+
+def _measure(func: Callable[[], object], repeat: int, ops: int) -> Dict[str, float]:
+    """Лучшее и медианное время на операцию, мкс; число вызовов в замере подбирается автоматически"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [total / number / ops * 1e6 for total in timer.repeat(repeat, number)]
+    return {'best_us': min(times), 'median_us': statistics.median(times)}
+
+
+def validator_cases() -> List[Case]:
+    from question_validator import QuestionValidator
+    import utils
+
+    validator = QuestionValidator()
+    text = benchmark_data.make_questions_text(200, seed=1)
+    questions = validator.extract_questions_from_text(text)
+
+    return [
+        ("validator.is_closed_form_question", lambda: [validator.is_closed_form_question(q) for q in questions],
+         len(questions)),
+        ("validator.extract_questions_200", lambda: validator.extract_questions_from_text(text), 1),
+        ("utils.extract_questions_200", lambda: utils.extract_questions_from_text(text), 1),
+    ]
+
+
+def duplicate_filter_cases() -> List[Case]:
+    from models import Question
+    from question_generator import QuestionGenerator
+
+    generator = QuestionGenerator(None)
+    cases = []
+    for history_size in (100, 1000):
+        history = benchmark_data.make_question_history(history_size, seed=2)
+        # Половина новых вопросов - почти дубликаты истории
+        new_questions = [Question(text=q) for q in benchmark_data.make_question_history(4, seed=3)]
+        new_questions += [Question(text=history[i * 7].replace('?', ' ?')) for i in range(3)]
+        cases.append((
+            f"filter_duplicates_{history_size}",
+            lambda history=history, new_questions=new_questions:
+                generator._filter_duplicate_questions(new_questions, history),
+            1
+        ))
+    return cases
+
+
+def json_cases() -> List[Case]:
+    from json_utils import robust_json_parse
+
+    nested = json_backend.dumps(benchmark_data.make_nested_json(depth=200), pretty=True)
+    markdown = f"Вот результат анализа:\n```json\n{nested}\n```\nГотово."
+    # Висячие запятые: прямой разбор падает, срабатывают запасные стратегии
+    broken = nested.replace('\n  }', ',\n  }', 50)
+
+    return [
+        ("robust_json.nested_200", lambda: robust_json_parse(nested), 1),
+        ("robust_json.markdown", lambda: robust_json_parse(markdown), 1),
+        ("robust_json.broken", lambda: robust_json_parse(broken), 1),
+    ]
+
+
+def model_cases() -> List[Case]:
+    from models import SessionData
+
+    session = benchmark_data.make_session(iterations=50)
+    document = session.to_dict()
+    return [
+        ("session.to_dict_50", session.to_dict, 1),
+        ("session.from_dict_50", lambda: SessionData.from_dict(document), 1),
+    ]
+
+
+def session_list_cases(directory: Path, sessions: int) -> List[Case]:
+    from session_manager import SessionManager
+
+    print(f"Создание {sessions} файлов сессий...")
+    size = benchmark_data.write_session_files(directory, sessions)
+    print(f"Записано {size / (1024 * 1024):.1f} МБ")
+
+    manager = SessionManager(str(directory))
+    manager.get_all_sessions()
+
+    def cold():
+        # Без манифеста: полный обход шардов и разбор каждого файла
+        (directory / STORAGE.index_dirname / "manifest.json").unlink(missing_ok=True)
+        (directory / STORAGE.index_dirname / "manifest.log").unlink(missing_ok=True)
+        SessionManager(str(directory)).get_all_sessions(limit=50)
+
+    return [
+        (f"get_all_sessions_{sessions}.warm", lambda: manager.get_all_sessions(limit=50), 1),
+        (f"get_all_sessions_{sessions}.cold", cold, 1),
+    ]
+
+
+def run_benchmark(args: argparse.Namespace):
+    # Сообщения генераторов и фоновая миграция шардов исказили бы замеры
+    logger.logger.setLevel(logging.ERROR)
+    STORAGE.shard_migrate_on_start = False
+
+    results: Dict[str, Dict[str, float]] = {}
+    header = f"{'случай':<36} {'лучшее, мкс':>12} {'медиана, мкс':>13}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        builders = [validator_cases, duplicate_filter_cases, json_cases, model_cases]
+        # Файлы сессий создаются, только если случаи get_all_sessions будут замеряться
+        if args.sessions > 0 and (not args.only or args.only in 'get_all_sessions' or 'get_all_sessions' in args.only):
+            builders.append(lambda: session_list_cases(Path(tmp) / 'sessions', args.sessions))
+        cases = [case for build in builders for case in build() if not args.only or args.only in case[0]]
+
+        print()
+        print(header)
+        print('-' * len(header))
+        for name, func, ops in cases:
+            results[name] = _measure(func, args.repeat, ops)
+            print(f"{name:<36} {results[name]['best_us']:>12.2f} {results[name]['median_us']:>13.2f}")
+
+    settings = {'sessions': args.sessions, 'repeat': args.repeat, 'json_backend': json_backend.backend.name}
+    baseline_path = Path(args.baseline)
+    print()
+    if args.save_baseline:
+        benchmark_baseline.save_results(baseline_path, 'micro', results, settings)
+        print(f"Базовый прогон сохранен: {baseline_path}")
+    elif baseline_path.exists():
+        baseline = benchmark_baseline.load_results(baseline_path)
+        print(f"Сравнение с базовым прогоном от {baseline.get('created_at')}:")
+        print()
+        benchmark_baseline.compare(results, baseline['results'], METRICS, args.threshold)
+    else:
+        print(f"Базового прогона нет ({baseline_path}); сохранить текущий: --save-baseline")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Микробенчмарки процессорных участков")
+    parser.add_argument('--sessions', type=int, default=10000,
+                        help="Файлов сессий для get_all_sessions (0 - без этих случаев)")
+    parser.add_argument('--repeat', type=int, default=5, help="Повторов каждого замера")
+    parser.add_argument('--only', help="Только случаи, в имени которых есть подстрока")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Файл базового прогона")
+    parser.add_argument('--save-baseline', action='store_true', help="Сохранить прогон как базовый")
+    parser.add_argument('--threshold', type=float, default=benchmark_baseline.DEFAULT_THRESHOLD,
+                        help="Порог регрессии (доля роста)")
+    args = parser.parse_args()
+
+    run_benchmark(args)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк моделей данных сессии
+
+Показывает память на одну сессию в памяти процесса и пропускную способность
+to_dict/from_dict - с ленивым разбором секций и с полным разбором.
+
+Запуск: python benchmark_models.py [--sessions 500] [--iterations 10] [--repeat 5]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmark_data import make_sessions
+from models import SessionData, _DATACLASS_OPTIONS
+
+
+def _measure(func, repeat: int) -> float:
+    """Лучшее время из repeat запусков, в секундах"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _materialize(session: SessionData) -> SessionData:
+    """Разбор всех ленивых секций"""
+    session.all_iterations
+    session.competency_questions
+    session.clarifying_questions
+    return session
+
+
+def _memory_per_session(documents, materialize: bool) -> float:
+    """Прирост памяти на одну загруженную сессию, в КБ"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [SessionData.from_dict(document) for document in documents]
+    if materialize:
+        for session in sessions:
+            _materialize(session)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(sessions) / 1024
+
+
+def run_benchmark(count: int, iterations: int, repeat: int):
+    sessions = make_sessions(count, iterations=iterations)
+    documents = [session.to_dict() for session in sessions]
+
+    print(f"Сессий: {count}, итераций в сессии: {iterations}")
+    print(f"__slots__: {'да' if _DATACLASS_OPTIONS.get('slots') else 'нет'}")
+    print()
+
+    # Документы уже в памяти, поэтому для ленивой загрузки прирост - только сами объекты
+    print(f"Память на сессию (лениво):      {_memory_per_session(documents, materialize=False):>8.1f} КБ")
+    print(f"Память на сессию (полностью):   {_memory_per_session(documents, materialize=True):>8.1f} КБ")
+    print()
+
+    loaded = [_materialize(SessionData.from_dict(document)) for document in documents]
+    lazy_loaded = [SessionData.from_dict(document) for document in documents]
+
+    timings = [
+        ('from_dict (лениво)', lambda: [SessionData.from_dict(document) for document in documents]),
+        ('from_dict (полностью)', lambda: [_materialize(SessionData.from_dict(document)) for document in documents]),
+        ('to_dict (неразобранные)', lambda: [session.to_dict() for session in lazy_loaded]),
+        ('to_dict (разобранные)', lambda: [session.to_dict() for session in loaded]),
+    ]
+
+    header = f"{'операция':<26} {'сессий/с':>10} {'мкс/сессия':>11}"
+    print(header)
+    print('-' * len(header))
+    for name, func in timings:
+        elapsed = _measure(func, repeat)
+        print(f"{name:<26} {count / elapsed:>10.0f} {elapsed / count * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк моделей данных сессии")
+    parser.add_argument('--sessions', type=int, default=500, help="Количество синтетических сессий")
+    parser.add_argument('--iterations', type=int, default=10, help="Итераций в каждой сессии")
+    parser.add_argument('--repeat', type=int, default=5, help="Повторов каждого замера")
+    args = parser.parse_args()
+
+    run_benchmark(args.sessions, args.iterations, args.repeat)
@@ -46,6 +46,10 @@ class GenerationConfig:
     temperature_questions: float = 0.8
     temperature_refined: float = 0.6
     temperature_final: float = 0.5
+    json_repair_attempts: int = 2
+    json_repair_window: int = 200
+    max_tokens_repair: int = 384
+    temperature_repair: float = 0.0
 
 @dataclass
 class UIConfig:
@@ -55,6 +59,69 @@ class UIConfig:
     layout: str = "wide"
     max_sessions_display: int = 10
 
+@dataclass
+class StorageConfig:
+    """Настройки хранения сессий"""
+    backend: str = "json"  # json/sqlite
+    sessions_dir: str = "sessions"
+    sqlite_path: str = "sessions.db"
+    index_dirname: str = ".index"
+    json_backend: str = "auto"  # auto/orjson/ujson/stdlib
+    pretty_json: bool = True
+    cache_enabled: bool = True
+    cache_capacity: int = 32
+    cache_flush_delay: float = 0.5  # секунд тишины перед записью
+    cache_max_flush_delay: float = 2.0  # крайний срок записи после первого изменения
+    journal_enabled: bool = True  # изменения дописываются в журнал событий вместо перезаписи файла
+    journal_compact_every: int = 64  # событий до свертки журнала в снимок
+    shard_depth: int = 2  # уровней подпапок по префиксу ID (0 - плоская папка)
+    shard_migrate_on_start: bool = True  # фоновый перенос файлов в текущую раскладку
+    archive_dirname: str = "archive"
+    archive_after_days: int = 30  # завершенные сессии старше - в сжатый архив
+    archive_segment_size: int = 64 * 1024 * 1024  # байт до начала нового сегмента архива
+    lock_dirname: str = ".locks"
+    lock_timeout: float = 10.0  # секунд ожидания блокировки сессии другим процессом
+    conflict_retries: int = 3  # повторов записи из кэша при конфликте версий
+
+@dataclass
+class LoggingConfig:
+    """Настройки логирования"""
+    log_file: str = "logs/briefing.log"
+    max_bytes: int = 5 * 1024 * 1024  # размер файла лога до ротации
+    backup_count: int = 5  # сколько старых файлов хранить (сжатыми .gz)
+    compress_backups: bool = True
+    max_message_chars: int = 2000  # длинные сообщения (например, ответы модели) обрезаются
+    queue_size: int = 10000  # записей в очереди до фонового потока; при переполнении лишние отбрасываются
+
+@dataclass
+class TraceConfig:
+    """Настройки трассировки запросов к модели (промпты и ответы пишутся целиком, включая идеи пользователей)"""
+    enabled: bool = False  # включается явно: TRACE.enabled или флаг --trace
+    trace_dir: str = "logs/traces"
+    sample_rate: float = 1.0  # доля записываемых вызовов
+    segment_bytes: int = 4 * 1024 * 1024  # размер сжатого сегмента до начала следующего
+    max_segments: int = 16  # старые сегменты сверх лимита удаляются
+    queue_size: int = 1000  # вызовов в очереди до фонового потока; при переполнении лишние отбрасываются
+    lock_timeout: float = 5.0
+
+@dataclass
+class CassetteConfig:
+    """Настройки записи и воспроизведения запросов к модели"""
+    mode: str = "off"  # off/record/replay
+    path: str = "cassettes/default.jsonl"
+    latency: str = "none"  # none/fixed/sampled - пауза при воспроизведении
+    fixed_latency: float = 0.5  # секунд, для latency = fixed
+    seed: int = 0  # для latency = sampled
+
+@dataclass
+class MetricsConfig:
+    """Настройки метрик запросов к модели (текстовый формат Prometheus)"""
+    enabled: bool = True
+    textfile: str = ""  # файл для textfile-коллектора (например, logs/metrics.prom); пусто - без записи
+    export_interval: float = 15.0  # секунд между записями файла
+    http_host: str = "127.0.0.1"
+    http_port: int = 0  # HTTP /metrics для работы без GUI; 0 - выключен
+
 @dataclass
 class ValidationConfig:
     """Настройки валидации вопросов"""
@@ -84,13 +151,19 @@ SYSTEM_PROMPTS = {
     "questions": "Ты специализируешься на создании уточняющих вопросов в закрытой форме (да/нет).",
     "competency": "Ты анализируешь компетенции пользователя и адаптируешь вопросы под его уровень.",
     "refinement": "Ты помогаешь уточнять и детализировать идеи на основе полученной информации.",
-    "final": "Ты создаешь итоговые отчеты и рекомендации по результатам брифинга."
+    "final": "Ты создаешь итоговые отчеты и рекомендации по результатам брифинга.",
+    "json_repair": "Ты исправляешь синтаксические ошибки во фрагментах JSON. Возвращай только исправленный фрагмент без пояснений и без изменения содержимого."
 }
 
 # Глобальные настройки
 LM_STUDIO = LMStudioConfig()
 GENERATION = GenerationConfig()
 UI = UIConfig()
+STORAGE = StorageConfig()
+LOGGING = LoggingConfig()
+TRACE = TraceConfig()
+CASSETTE = CassetteConfig()
+METRICS = MetricsConfig()
 VALIDATION = ValidationConfig()
 
 # Домены знаний
@@ -3,8 +3,14 @@
 
 """
 Пример использования новой логики многоэтапного анализа компетенций
+
+Запуск: python example_usage.py [--record cassettes/example.jsonl | --replay cassettes/example.jsonl]
+С --record ответы модели сохраняются в кассету, с --replay пример работает без LM Studio.
 """
 
+import argparse
+
+from config import CASSETTE
 from neural_network import NeuralNetwork
 
 def example_competency_analysis():
@@ -32,16 +38,16 @@ def example_competency_analysis():
     
     print("🎯 Необходимые компетенции:")
     competencies = analysis_result['required_competencies']
-    print(f"Область: {competencies['domain']}")
-    print(f"Компетенции: {', '.join(competencies['competencies'])}")
-    print(f"Знания: {', '.join(competencies['knowledge'])}")
-    print(f"Умения: {', '.join(competencies['skills'])}")
-    print(f"Опыт: {', '.join(competencies['experience'])}")
+    print(f"Область: {competencies.domain}")
+    print(f"Компетенции: {', '.join(competencies.competencies)}")
+    print(f"Знания: {', '.join(competencies.knowledge)}")
+    print(f"Умения: {', '.join(competencies.skills)}")
+    print(f"Опыт: {', '.join(competencies.experience)}")
     print()
     
     print("❓ Вопросы для оценки компетенций:")
     for i, q_data in enumerate(analysis_result['competency_questions'], 1):
-        print(f"{i}. {q_data['question']} ({q_data['category']})")
+        print(f"{i}. {q_data.text} ({q_data.category})")
     print()
     
     # Симуляция ответов пользователя
@@ -70,21 +76,34 @@ def example_competency_analysis():
     
     print("👤 Профиль компетенций пользователя:")
     profile = final_result['competency_profile']
-    print(f"Общий уровень: {profile['overall_level']}")
-    print(f"Сильные стороны: {', '.join(profile['strengths'])}")
-    print(f"Пробелы: {', '.join(profile['gaps'])}")
-    print(f"Стратегия: {profile['question_strategy']['complexity_level']} вопросы")
+    print(f"Общий уровень: {profile.overall_level.value}")
+    print(f"Сильные стороны: {', '.join(profile.strengths)}")
+    print(f"Пробелы: {', '.join(profile.gaps)}")
+    print(f"Стратегия: {profile.question_strategy.get('complexity_level', 'средние')} вопросы")
     print()
     
     print("🎯 Адаптивные вопросы для брифинга:")
     for i, q_data in enumerate(final_result['questions'], 1):
-        print(f"{i}. {q_data['question']}")
-        if q_data.get('explanation'):
-            print(f"   💡 {q_data['explanation']}")
-        if q_data.get('examples'):
-            print(f"   📝 Примеры: {', '.join(q_data['examples'])}")
-        print(f"   🔧 {q_data['adapted_for']}")
+        print(f"{i}. {q_data.text}")
+        if q_data.explanation:
+            print(f"   💡 {q_data.explanation}")
+        if q_data.examples:
+            print(f"   📝 Примеры: {', '.join(q_data.examples)}")
+        print(f"   🔧 {q_data.adapted_for}")
         print()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пример многоэтапного анализа компетенций")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', metavar='PATH', help="Записать ответы модели в кассету")
+    cassette.add_argument('--replay', metavar='PATH', help="Воспроизвести ответы из кассеты без LM Studio")
+    parser.add_argument('--latency', choices=('none', 'fixed', 'sampled'), default=CASSETTE.latency,
+                        help="Пауза при воспроизведении")
+    args = parser.parse_args()
+
+    if args.record or args.replay:
+        CASSETTE.mode = 'record' if args.record else 'replay'
+        CASSETTE.path = args.record or args.replay
+        CASSETTE.latency = args.latency
+
     example_competency_analysis() 
\ No newline at end of file
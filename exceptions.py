@@ -10,6 +10,12 @@ class AIConnectionError(BriefingError):
         self.message = message
         super().__init__(self.message)
 
+class CassetteMissError(AIConnectionError):
+    """Ошибка - в кассете нет ответа на запрос (режим воспроизведения без сети)"""
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"В кассете нет записанного ответа на запрос {key[:12]}")
+
 class InvalidResponseError(BriefingError):
     """Ошибка некорректного ответа от AI"""
     def __init__(self, message: str = "Получен некорректный ответ от AI"):
@@ -23,6 +29,16 @@ class SessionNotFoundError(BriefingError):
         self.message = f"Сессия {session_id} не найдена"
         super().__init__(self.message)
 
+class SessionConflictError(BriefingError):
+    """Ошибка - сессию успели изменить после загрузки (другим процессом или объектом)"""
+    def __init__(self, session_id: str, expected_version: int, actual_version: int):
+        self.session_id = session_id
+        self.expected_version = expected_version
+        self.actual_version = actual_version
+        self.message = (f"Сессия {session_id} изменена параллельно: "
+                        f"загружена версия {expected_version}, текущая {actual_version}")
+        super().__init__(self.message)
+
 class ValidationError(BriefingError):
     """Ошибка валидации данных"""
     def __init__(self, message: str, field: str = None):
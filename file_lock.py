@@ -0,0 +1,153 @@
+"""
+Межпроцессные блокировки сессий
+
+Несколько процессов (второй экземпляр GUI, пакетная обработка) могут работать
+с одной папкой sessions/. Запись сессии выполняется под рекомендательной
+блокировкой файла: fcntl.flock на Linux/macOS, msvcrt.locking на Windows.
+
+Файлов блокировок фиксированное число - по одному на префикс ID
+(sessions/.locks/3f.lock), поэтому сессии с разными префиксами
+записываются параллельно, а папка не растет вместе с числом сессий.
+Блокировка реентерабельна в пределах потока: вложенные операции
+(запись события -> свертка журнала) не ждут сами себя.
+"""
+
+import errno
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from config import STORAGE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+
+# Символов ID в имени файла блокировки (16 ** 2 = 256 файлов)
+STRIPE_WIDTH = 2
+
+# Пауза между попытками захвата при ожидании с таймаутом
+_POLL_INTERVAL = 0.01
+
+_BUSY_ERRNOS = {errno.EAGAIN, errno.EWOULDBLOCK, errno.EACCES, errno.EDEADLK}
+
+
+class FileLock:
+    """Эксклюзивная рекомендательная блокировка файла"""
+
+    def __init__(self, path: Path, timeout: Optional[float] = None):
+        self.path = Path(path)
+        self.timeout = timeout
+        self._fd: Optional[int] = None
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif msvcrt is not None:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError as e:
+            # Занято: EWOULDBLOCK у flock, EACCES/EDEADLOCK у msvcrt
+            if e.errno in _BUSY_ERRNOS:
+                return False
+            raise
+
+    def _unlock(self, fd: int):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def acquire(self):
+        """Захват блокировки; TimeoutError, если не удалось за timeout секунд"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        try:
+            while not self._try_lock(fd):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Блокировка {self.path.name} занята дольше {self.timeout:.1f}с")
+                time.sleep(_POLL_INTERVAL)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            self._unlock(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> 'FileLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class SessionLocks:
+    """Блокировки сессий по префиксу ID: межпроцессные и реентерабельные внутри потока"""
+
+    def __init__(self, lock_dir: Path, timeout: float = None):
+        self.lock_dir = Path(lock_dir)
+        self.timeout = STORAGE.lock_timeout if timeout is None else timeout
+        self._thread_locks: Dict[str, threading.Lock] = {}
+        self._held = threading.local()
+        self._guard = threading.Lock()
+
+    def _stripe(self, session_id: str) -> str:
+        key = session_id.replace('-', '').lower()[:STRIPE_WIDTH]
+        return key or '_'
+
+    def _thread_lock(self, stripe: str) -> threading.Lock:
+        with self._guard:
+            lock = self._thread_locks.get(stripe)
+            if lock is None:
+                lock = self._thread_locks[stripe] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def lock(self, session_id: str) -> Iterator[None]:
+        """Эксклюзивный доступ к сессии на время блока with"""
+        stripe = self._stripe(session_id)
+        held: Dict[str, int] = self._held.__dict__.setdefault('counts', {})
+
+        # Повторный вход в том же потоке: файл уже заблокирован
+        if held.get(stripe):
+            held[stripe] += 1
+            try:
+                yield
+            finally:
+                held[stripe] -= 1
+            return
+
+        thread_lock = self._thread_lock(stripe)
+        if not thread_lock.acquire(timeout=self.timeout if self.timeout is not None else -1):
+            raise TimeoutError(f"Блокировка сессии {session_id} занята дольше {self.timeout:.1f}с")
+        try:
+            with FileLock(self.lock_dir / f"{stripe}.lock", self.timeout):
+                held[stripe] = 1
+                try:
+                    yield
+                finally:
+                    held[stripe] = 0
+        finally:
+            thread_lock.release()
@@ -2,12 +2,13 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import threading
 import time
-from session_manager import SessionManager
+from session_manager import create_session_manager
 from neural_network import NeuralNetwork
 from config import SessionStep
 from session_monitor import session_monitor
 from logger import logger
-import requests
+import llm_trace
+from llm_trace import trace_session
 
 
 class AIBriefingGUI:
@@ -18,7 +19,7 @@ class AIBriefingGUI:
         self.root.configure(bg='#f0f0f0')
         
         # Инициализация компонентов
-        self.session_manager = SessionManager()
+        self.session_manager = create_session_manager()
         self.neural_network = NeuralNetwork()
         self.current_session_id = None
         
@@ -58,6 +59,14 @@ class AIBriefingGUI:
         )
         new_session_btn.pack(fill=tk.X, pady=(0, 10))
         
+        # Поиск по сессиям
+        ttk.Label(sidebar_frame, text="🔍 Поиск:").pack(anchor=tk.W)
+        self.search_var = tk.StringVar()
+        self._search_after_id = None
+        search_entry = ttk.Entry(sidebar_frame, textvariable=self.search_var)
+        search_entry.pack(fill=tk.X, pady=(0, 10))
+        search_entry.bind('<KeyRelease>', self.on_search_changed)
+        
         # Список сессий
         ttk.Label(sidebar_frame, text="📋 Сессии:").pack(anchor=tk.W)
         
@@ -152,19 +161,34 @@ class AIBriefingGUI:
             messagebox.showerror("Ошибка", f"Не удалось создать сессию: {str(e)}")
             logger.error(f"Ошибка создания сессии: {e}")
     
+    def on_search_changed(self, event=None):
+        """Поиск по мере ввода - с задержкой, чтобы не искать на каждую клавишу"""
+        if self._search_after_id is not None:
+            self.root.after_cancel(self._search_after_id)
+        self._search_after_id = self.root.after(250, self.update_session_list)
+    
+    def find_sessions(self, query: str, limit: int = 20):
+        """Сессии по поисковому запросу (полнотекстовый индекс есть у обоих хранилищ)"""
+        return self.session_manager.search(query, limit=limit)
+    
     def update_session_list(self):
         """Обновление списка сессий"""
+        self._search_after_id = None
         try:
-            sessions = self.session_manager.get_all_sessions()
+            query = self.search_var.get().strip()
+            if query:
+                sessions = self.find_sessions(query)
+            else:
+                sessions = self.session_manager.get_all_sessions(limit=20)  # Показываем последние 20
             self.sessions_listbox.delete(0, tk.END)
             
-            for session in sessions[:20]:  # Показываем последние 20
+            for session in sessions:
                 status_emoji = "✅" if session['status'] == 'completed' else "🔄"
                 display_text = f"{status_emoji} {session['user_idea'][:40]}..."
                 self.sessions_listbox.insert(tk.END, display_text)
                 
             # Сохраняем данные сессий для доступа
-            self.session_data = sessions[:20]
+            self.session_data = sessions
             
         except Exception as e:
             logger.error(f"Ошибка обновления списка сессий: {e}")
@@ -358,7 +382,7 @@ class AIBriefingGUI:
         self.status_label.pack()
         
         # Запускаем анализ компетенций в отдельном потоке
-        threading.Thread(target=self.analyze_competency_async, daemon=True).start()
+        self._start_session_task(self.analyze_competency_async)
 
     def show_generate_questions_step(self):
         """Шаг генерации основных вопросов (после анализа компетенций)"""
@@ -388,10 +412,21 @@ class AIBriefingGUI:
         self.status_label.pack()
         
         # Запускаем генерацию в отдельном потоке
-        threading.Thread(target=self.generate_adaptive_questions_async, daemon=True).start()
+        self._start_session_task(self.generate_adaptive_questions_async)
     
+    def _start_session_task(self, target):
+        """Запуск фоновой задачи; запросы к модели в ней привязываются к текущей сессии"""
+        session_id = self.current_session_id
+
+        def run():
+            with trace_session(session_id):
+                target()
+
+        threading.Thread(target=run, daemon=True).start()
+
     def analyze_competency_async(self):
         """Асинхронный анализ компетенций пользователя"""
+        session_monitor.track_stage_entry(self.current_session_id, SessionStep.COMPETENCY_ANALYSIS.value)
         try:
             data = self.session_manager.load_session(self.current_session_id)
             
@@ -416,6 +451,7 @@ class AIBriefingGUI:
                 data.current_step = SessionStep.ANSWER_QUESTIONS
                 data.competency_stage = 'assessment'  # Указываем, что это этап оценки компетенций
                 self.session_manager.save_session(data)
+                session_monitor.mark_stage_completed(data.session_id, SessionStep.COMPETENCY_ANALYSIS.value)
                 
                 # Переходим к ответам на вопросы о компетенциях
                 self.root.after(0, self.show_competency_questions_step)
@@ -429,6 +465,7 @@ class AIBriefingGUI:
 
     def generate_adaptive_questions_async(self):
         """Асинхронная генерация адаптивных вопросов (после анализа компетенций)"""
+        session_monitor.track_stage_entry(self.current_session_id, SessionStep.GENERATE_QUESTIONS.value)
         try:
             data = self.session_manager.load_session(self.current_session_id)
             
@@ -467,6 +504,7 @@ class AIBriefingGUI:
                 data.current_step = SessionStep.ANSWER_QUESTIONS
                 data.competency_stage = 'main'  # Указываем, что это основной этап
                 self.session_manager.save_session(data)
+                session_monitor.mark_stage_completed(data.session_id, SessionStep.GENERATE_QUESTIONS.value)
                 
                 # Переходим к ответам на основные вопросы
                 self.root.after(0, self.show_main_questions_step)
@@ -699,15 +737,14 @@ class AIBriefingGUI:
                     if i < len(comments) and comments[i]:
                         comments_dict[question] = comments[i]
             
-            data.competency_answers = answers_dict
-            if comments_dict:
-                if not hasattr(data, 'competency_comments'):
-                    data.competency_comments = {}
-                data.competency_comments.update(comments_dict)
-            
-            data.current_step = SessionStep.GENERATE_QUESTIONS
-            data.competency_stage = 'profile_built'
-            self.session_manager.save_session(data)
+            # Ответы ИИ уже получены - все изменения сессии одной записью
+            with self.session_manager.transaction(self.current_session_id) as data:
+                data.competency_answers = answers_dict
+                if comments_dict:
+                    data.competency_comments.update(comments_dict)
+                
+                data.current_step = SessionStep.GENERATE_QUESTIONS
+                data.competency_stage = 'profile_built'
             
             self.show_generate_questions_step()
             
@@ -756,14 +793,13 @@ class AIBriefingGUI:
                     if i < len(comments) and comments[i]:
                         comments_dict[question] = comments[i]
             
-            data.main_answers = answers_dict
-            if comments_dict:
-                if not hasattr(data, 'main_comments'):
-                    data.main_comments = {}
-                data.main_comments.update(comments_dict)
-            
-            data.current_step = SessionStep.REFORMULATE_QUESTIONS
-            self.session_manager.save_session(data)
+            # Ответы ИИ уже получены - все изменения сессии одной записью
+            with self.session_manager.transaction(self.current_session_id) as data:
+                data.main_answers = answers_dict
+                if comments_dict:
+                    data.main_comments.update(comments_dict)
+                
+                data.current_step = SessionStep.REFORMULATE_QUESTIONS
             
             self.show_reformulate_questions_step()
             
@@ -786,7 +822,8 @@ class AIBriefingGUI:
 Формат ответа: "Да/Нет - [краткое обоснование]"
 """
             
-            response = self.neural_network._make_request(prompt, max_tokens=200, temperature=0.3)
+            with trace_session(self.current_session_id):
+                response = self.neural_network._make_request(prompt, max_tokens=200, temperature=0.3)
             return response.strip() if response else "Да - ИИ рекомендует положительный ответ"
             
         except Exception as e:
@@ -813,7 +850,8 @@ class AIBriefingGUI:
 Формат ответа: "Да/Нет - [краткое обоснование]"
 """
             
-            response = self.neural_network._make_request(prompt, max_tokens=300, temperature=0.3)
+            with trace_session(self.current_session_id):
+                response = self.neural_network._make_request(prompt, max_tokens=300, temperature=0.3)
             return response.strip() if response else "Да - ИИ рекомендует положительный ответ"
             
         except Exception as e:
@@ -842,10 +880,11 @@ class AIBriefingGUI:
         self.status_label.pack()
         
         # Запускаем обработку в отдельном потоке
-        threading.Thread(target=self.process_answers_async, daemon=True).start()
+        self._start_session_task(self.process_answers_async)
     
     def process_answers_async(self):
         """Асинхронная обработка ответов"""
+        session_monitor.track_stage_entry(self.current_session_id, SessionStep.GENERATE_REFINED.value)
         try:
             data = self.session_manager.load_session(self.current_session_id)
             
@@ -889,6 +928,7 @@ class AIBriefingGUI:
                 data.refined_idea = refined_idea
                 data.current_step = SessionStep.GENERATE_REFINED
                 self.session_manager.save_session(data)
+                session_monitor.mark_stage_completed(data.session_id, SessionStep.GENERATE_REFINED.value)
                 
                 self.root.after(0, self.show_generate_refined_step)
             else:
@@ -969,57 +1009,46 @@ class AIBriefingGUI:
     def iterate_again(self):
         """Новая итерация уточнения"""
         try:
-            data = self.session_manager.load_session(self.current_session_id)
-            
-            # Сохраняем текущую итерацию в историю
             from models import SessionIteration, Answer
             from datetime import datetime
             
-            current_iteration = SessionIteration(
-                iteration=data.iteration_count,
-                timestamp=datetime.now(),
-                refined_idea=data.refined_idea,
-                feedback_type="iterate_again",
-                comments="Пользователь запросил новую итерацию",
-                questions=data.clarifying_questions.copy() if data.clarifying_questions else [],
-                answers=[]
-            )
-            
-            # Добавляем ответы в итерацию
-            if hasattr(data, 'main_answers') and data.main_answers:
+            # Перенос итерации в историю и сброс ответов - одной записью
+            with self.session_manager.transaction(self.current_session_id) as data:
+                # Сохраняем текущую итерацию в историю
+                current_iteration = SessionIteration(
+                    iteration=data.iteration_count,
+                    timestamp=datetime.now(),
+                    refined_idea=data.refined_idea,
+                    feedback_type="iterate_again",
+                    comments="Пользователь запросил новую итерацию",
+                    questions=data.clarifying_questions.copy() if data.clarifying_questions else [],
+                    answers=[]
+                )
+                
+                # Добавляем ответы в итерацию
                 for question, answer in data.main_answers.items():
-                    comment = ""
-                    if hasattr(data, 'main_comments') and data.main_comments and question in data.main_comments:
-                        comment = data.main_comments[question]
-                    
-                    answer_obj = Answer(
+                    current_iteration.answers.append(Answer(
                         question=question,
                         answer=answer,
-                        comment=comment,
+                        comment=data.main_comments.get(question, ""),
                         timestamp=datetime.now()
-                    )
-                    current_iteration.answers.append(answer_obj)
-            
-            # Добавляем итерацию в историю
-            if not hasattr(data, 'all_iterations'):
-                data.all_iterations = []
-            data.all_iterations.append(current_iteration)
-            
-            # Увеличиваем счетчик итераций
-            data.iteration_count += 1
-            
-            # Очищаем текущие ответы для новой итерации
-            data.main_answers = {}
-            data.main_comments = {}
-            data.clarifying_questions = []
-            
-            # НЕ очищаем all_asked_questions - они должны накапливаться между итерациями
-            
-            # Возвращаемся к генерации адаптивных вопросов (пропускаем анализ компетенций)
-            data.current_step = SessionStep.GENERATE_QUESTIONS
-            data.competency_stage = 'profile_built'  # Профиль уже построен
+                    ))
+                
+                # Добавляем итерацию в историю и увеличиваем счетчик итераций
+                data.all_iterations.append(current_iteration)
+                data.iteration_count += 1
+                
+                # Очищаем текущие ответы для новой итерации
+                data.main_answers = {}
+                data.main_comments = {}
+                data.clarifying_questions = []
+                
+                # НЕ очищаем all_asked_questions - они должны накапливаться между итерациями
+                
+                # Возвращаемся к генерации адаптивных вопросов (пропускаем анализ компетенций)
+                data.current_step = SessionStep.GENERATE_QUESTIONS
+                data.competency_stage = 'profile_built'  # Профиль уже построен
             
-            self.session_manager.save_session(data)
             self.show_generate_questions_step()
             
         except Exception as e:
@@ -1102,8 +1131,8 @@ class AIBriefingGUI:
         """Проверка статуса LM Studio"""
         def check_async():
             try:
-                response = requests.get("http://localhost:1234/v1/models", timeout=5)
-                if response.status_code == 200:
+                # Через клиент: учитывается адрес из настроек и режим воспроизведения кассеты
+                if self.neural_network.check_connection():
                     self.root.after(0, lambda: self.lm_status_label.config(
                         text="🟢 LM Studio подключен",
                         foreground="green"
@@ -1130,5 +1159,20 @@ class AIBriefingGUI:
 
 
 if __name__ == "__main__":
+    import argparse
+    from config import CASSETTE
+
+    parser = argparse.ArgumentParser(description="AI-Агент Брифинга")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', metavar='PATH', help="Записать ответы модели в кассету")
+    cassette.add_argument('--replay', metavar='PATH', help="Работать без LM Studio на ответах из кассеты")
+    parser.add_argument('--trace', action='store_true', help="Записывать запросы к модели в logs/traces")
+    args = parser.parse_args()
+    if args.record or args.replay:
+        CASSETTE.mode = 'record' if args.record else 'replay'
+        CASSETTE.path = args.record or args.replay
+    if args.trace:
+        llm_trace.enable()
+
     app = AIBriefingGUI()
     app.run() 
\ No newline at end of file
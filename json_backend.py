@@ -0,0 +1,165 @@
+"""
+JSON бэкенд для парсинга и сериализации сессий
+
+При импорте выбирается самый быстрый доступный кодек (orjson, ujson),
+строгий stdlib json используется как гарантированный fallback.
+json5 подключается как снисходительный уровень парсинга ответов модели.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from config import STORAGE
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import json5
+except ImportError:
+    json5 = None
+
+
+# Все бэкенды сообщают об ошибке разбора исключением-наследником ValueError
+DecodeError = ValueError
+
+HAS_JSON5 = json5 is not None
+
+
+class JsonBackend:
+    """Пара кодировщик/декодировщик с единым интерфейсом"""
+
+    def __init__(self, name: str, loads: Callable[[Union[str, bytes]], Any],
+                 dumps: Callable[[Any, bool], bytes]):
+        self.name = name
+        self._loads = loads
+        self._dumps = dumps
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Декодирование JSON из строки или байтов"""
+        return self._loads(data)
+
+    def dumps_bytes(self, obj: Any, pretty: bool = False) -> bytes:
+        """Кодирование в UTF-8 байты"""
+        return self._dumps(obj, pretty)
+
+    def dumps(self, obj: Any, pretty: bool = False) -> str:
+        """Кодирование в строку"""
+        return self._dumps(obj, pretty).decode('utf-8')
+
+    def load_file(self, path: Union[str, Path]) -> Any:
+        """Чтение JSON файла целиком"""
+        with open(path, 'rb') as f:
+            return self._loads(f.read())
+
+    def dump_file(self, obj: Any, path: Union[str, Path], pretty: bool = False, atomic: bool = False):
+        """
+        Запись JSON файла
+        atomic=True - через временный файл и os.replace, читатели никогда не видят частичную запись
+        """
+        data = self._dumps(obj, pretty)
+        if atomic:
+            atomic_write_bytes(path, data)
+        else:
+            with open(path, 'wb') as f:
+                f.write(data)
+
+    def __repr__(self) -> str:
+        return f"JsonBackend({self.name!r})"
+
+
+def atomic_write_bytes(path: Union[str, Path], data: bytes):
+    """Запись во временный файл рядом с целевым и атомарная замена"""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+
+def _stdlib_dumps(obj: Any, pretty: bool) -> bytes:
+    if pretty:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _orjson_dumps(obj: Any, pretty: bool) -> bytes:
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    except TypeError:
+        # orjson строже stdlib (например, к int > 64 бит) - откатываемся на stdlib
+        return _stdlib_dumps(obj, pretty)
+
+
+def _ujson_dumps(obj: Any, pretty: bool) -> bytes:
+    if pretty:
+        return ujson.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+BACKENDS: Dict[str, JsonBackend] = {
+    'stdlib': JsonBackend('stdlib', json.loads, _stdlib_dumps)
+}
+
+if orjson is not None:
+    BACKENDS['orjson'] = JsonBackend('orjson', orjson.loads, _orjson_dumps)
+
+if ujson is not None:
+    BACKENDS['ujson'] = JsonBackend('ujson', ujson.loads, _ujson_dumps)
+
+# Порядок предпочтения при автоматическом выборе
+_PREFERENCE = ['orjson', 'ujson', 'stdlib']
+
+
+def select_backend(name: Optional[str] = None) -> JsonBackend:
+    """
+    Выбор бэкенда по имени
+    'auto' (или None) - самый быстрый из установленных, неизвестное имя - stdlib
+    """
+    name = name or os.environ.get('BRIEFING_JSON_BACKEND') or STORAGE.json_backend
+    if name != 'auto':
+        return BACKENDS.get(name, BACKENDS['stdlib'])
+
+    for candidate in _PREFERENCE:
+        if candidate in BACKENDS:
+            return BACKENDS[candidate]
+    return BACKENDS['stdlib']
+
+
+# Активный бэкенд, выбирается один раз при импорте
+backend = select_backend()
+strict = BACKENDS['stdlib']
+
+loads = backend.loads
+dumps = backend.dumps
+load_file = backend.load_file
+dump_file = backend.dump_file
+
+
+def lenient_loads(text: str) -> Any:
+    """
+    Снисходительный парсинг через json5 (одинарные кавычки, висячие запятые,
+    ключи без кавычек, комментарии). Без json5 - строгий парсинг.
+    """
+    if json5 is not None:
+        return json5.loads(text)
+    return strict.loads(text)
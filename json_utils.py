@@ -1,7 +1,9 @@
 import json
 import re
-from typing import Optional, Dict, Any, Union, List
+from typing import Optional, Dict, Any, Union, List, Tuple
 from logger import logger
+import json_backend
+from json_backend import DecodeError, HAS_JSON5, lenient_loads
 
 
 def robust_json_parse(text: str) -> Optional[Union[Dict[str, Any], List[Any]]]:
@@ -13,33 +15,41 @@ def robust_json_parse(text: str) -> Optional[Union[Dict[str, Any], List[Any]]]:
     
     # Стратегия 1: Прямой парсинг
     try:
-        return json.loads(text.strip())
-    except json.JSONDecodeError:
+        return json_backend.loads(text.strip())
+    except DecodeError:
         pass
     
     # Стратегия 2: Очистка от markdown обрамлений
     cleaned = clean_markdown_json(text)
     try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError:
+        return json_backend.loads(cleaned)
+    except DecodeError:
         pass
     
     # Стратегия 3: Извлечение первого валидного JSON
     extracted = extract_first_json(text)
     if extracted:
         try:
-            return json.loads(extracted)
-        except json.JSONDecodeError:
+            return json_backend.loads(extracted)
+        except DecodeError:
             pass
     
-    # Стратегия 4: Попытка исправить распространенные ошибки
+    # Стратегия 4: Снисходительный парсинг (json5) до регулярных исправлений
+    if HAS_JSON5:
+        try:
+            return lenient_loads(extract_json_fragment(text))
+        except DecodeError:
+            pass
+    
+    # Стратегия 5: Попытка исправить распространенные ошибки
     fixed = fix_common_json_errors(text)
     try:
-        return json.loads(fixed)
-    except json.JSONDecodeError:
+        return json_backend.loads(fixed)
+    except DecodeError:
         pass
     
-    logger.error(f"Не удалось распарсить JSON после всех попыток: {text[:200]}...")
+    # Итоговую ошибку пишет вызывающий код (AIClient.parse_json_response - после точечного исправления)
+    logger.debug("Не удалось распарсить JSON локальными стратегиями: %s...", text[:200])
     return None
 
 
@@ -80,6 +90,36 @@ def extract_first_json(text: str) -> Optional[str]:
     return None
 
 
+def extract_json_fragment(text: str) -> str:
+    """Вырезание JSON фрагмента из ответа: от первой открывающей до последней закрывающей скобки"""
+    text = clean_markdown_json(text)
+    
+    starts = [pos for pos in (text.find('{'), text.find('[')) if pos != -1]
+    if not starts:
+        return text
+    
+    start = min(starts)
+    closing = '}' if text[start] == '{' else ']'
+    end = text.rfind(closing)
+    if end <= start:
+        return text[start:]
+    
+    return text[start:end + 1]
+
+
+def locate_json_error(text: str) -> Optional[Tuple[str, int, str]]:
+    """
+    Поиск синтаксической ошибки в JSON фрагменте ответа
+    Возвращает (фрагмент, позиция ошибки, сообщение парсера) или None, если фрагмент валиден
+    """
+    fragment = extract_json_fragment(text)
+    try:
+        json.loads(fragment)
+        return None
+    except json.JSONDecodeError as e:
+        return fragment, e.pos, e.msg
+
+
 def fix_common_json_errors(text: str) -> str:
     """Исправление распространенных ошибок в JSON"""
     # Убираем лишние запятые перед закрывающими скобками
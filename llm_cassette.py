@@ -0,0 +1,163 @@
+"""
+Кассеты запросов к модели: запись и воспроизведение без LM Studio
+
+В режиме record каждый успешный ответ модели дописывается в кассету
+(JSON Lines) вместе с запросом, usage и задержкой. В режиме replay AIClient
+не обращается к сети: ответ берется из кассеты по хэшу нормализованного
+запроса. Так пример, GUI и бенчмарки работают офлайн и воспроизводимо.
+
+Ключ - SHA-256 от системного промпта, промпта (пробельные символы схлопнуты),
+max_tokens и temperature; имя модели в ключ не входит, поэтому кассета
+переносится между моделями. Если один запрос записан несколько раз, ответы
+выдаются по очереди, после последнего повторяется последний.
+
+Задержка при воспроизведении:
+    none    - ответ сразу
+    fixed   - фиксированная пауза fixed_latency секунд
+    sampled - пауза, случайно выбранная из записанных задержек (seed - для повторяемости)
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import json_backend
+from config import CASSETTE
+from exceptions import CassetteMissError
+from logger import logger
+
+
+MODES = ('off', 'record', 'replay')
+LATENCY_MODELS = ('none', 'fixed', 'sampled')
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Хэш нормализованного запроса к /chat/completions"""
+    normalized = {
+        'messages': [
+            [message['role'], _WHITESPACE_RE.sub(' ', message['content']).strip()]
+            for message in payload['messages']
+        ],
+        'max_tokens': payload.get('max_tokens'),
+        'temperature': round(float(payload.get('temperature', 0.0)), 4)
+    }
+    data = json_backend.strict.dumps_bytes(normalized)
+    return hashlib.sha256(data).hexdigest()
+
+
+class Cassette:
+    """Файл записанных пар запрос -> ответ"""
+
+    def __init__(self, path: Path, mode: str = 'replay', latency: str = None,
+                 fixed_latency: float = None, seed: Optional[int] = None):
+        if mode not in MODES or mode == 'off':
+            raise ValueError(f"Неизвестный режим кассеты: {mode}")
+        latency = latency or CASSETTE.latency
+        if latency not in LATENCY_MODELS:
+            raise ValueError(f"Неизвестная модель задержки: {latency}")
+
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = latency
+        self.fixed_latency = CASSETTE.fixed_latency if fixed_latency is None else fixed_latency
+        self._random = random.Random(CASSETTE.seed if seed is None else seed)
+
+        # ключ -> записанные ответы; позиция воспроизведения по ключу
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Dict[str, int] = {}
+        self._latencies: List[float] = []
+        self._lock = threading.Lock()
+        self.stats = {'recorded': 0, 'played': 0, 'misses': 0}
+
+        if self.path.exists():
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def _load(self):
+        with open(self.path, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json_backend.loads(line)
+                except ValueError:
+                    logger.warning(f"Пропущена поврежденная строка кассеты {self.path.name}:{line_number}")
+                    continue
+                self._entries.setdefault(entry['key'], []).append(entry)
+                if entry.get('latency') is not None:
+                    self._latencies.append(entry['latency'])
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def record(self, payload: Dict[str, Any], content: str, usage: Optional[Dict[str, Any]], latency: float):
+        """Дописывание ответа модели в кассету"""
+        entry = {
+            'key': request_key(payload),
+            'system_prompt': payload['messages'][0]['content'],
+            'prompt': payload['messages'][-1]['content'],
+            'max_tokens': payload.get('max_tokens'),
+            'temperature': payload.get('temperature'),
+            'content': content,
+            'usage': usage,
+            'latency': latency
+        }
+        line = json_backend.backend.dumps_bytes(entry) + b'\n'
+
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(line)
+            self._entries.setdefault(entry['key'], []).append(entry)
+            self._latencies.append(latency)
+            self.stats['recorded'] += 1
+
+    def play(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Записанный ответ на запрос с паузой по модели задержки
+        CassetteMissError - если такой запрос не записывался
+        """
+        key = request_key(payload)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.stats['misses'] += 1
+                raise CassetteMissError(key)
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+            delay = self._delay()
+            self.stats['played'] += 1
+
+        if delay > 0:
+            time.sleep(delay)
+        return {**entry, 'latency': delay}
+
+    def _delay(self) -> float:
+        if self.latency == 'fixed':
+            return self.fixed_latency
+        if self.latency == 'sampled' and self._latencies:
+            return self._random.choice(self._latencies)
+        return 0.0
+
+    def rewind(self):
+        """Воспроизведение заново с первого записанного ответа"""
+        with self._lock:
+            self._positions.clear()
+
+
+def from_config() -> Optional[Cassette]:
+    """Кассета по настройкам CASSETTE (None - режим off)"""
+    if CASSETTE.mode == 'off':
+        return None
+    return Cassette(Path(CASSETTE.path), CASSETTE.mode)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Трассировка запросов к модели для разбора и повторного воспроизведения
+
+Каждый вызов AIClient.make_request - системный промпт, промпт, параметры,
+ответ, usage и задержка - записывается в кольцевой буфер сжатых сегментов
+logs/traces/segment-NNNNNN.jsonl.gz. Вызывающий поток только кладет запись
+в очередь; сериализация, сжатие и запись идут в фоновом потоке. Сегмент
+закрывается по размеру, сегменты сверх max_segments удаляются (самые старые).
+
+Запись помечается ID сессии (контекст trace_session) и местом вызова -
+методом, который обратился к модели (analyze_idea_domain,
+generate_adaptive_questions, ...). Доля записываемых вызовов - sample_rate.
+
+Записи содержат промпты и ответы целиком, поэтому трассировка выключена
+по умолчанию: TRACE.enabled = True или enable() до создания AIClient.
+
+Запуск:
+    python llm_trace.py sessions
+    python llm_trace.py dump <session_id>
+    python llm_trace.py replay <session_id> [--base-url URL]
+"""
+
+import argparse
+import atexit
+import gzip
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import json_backend
+from config import TRACE
+from file_lock import FileLock
+from logger import logger
+
+
+_SEGMENT_RE = re.compile(r'^segment-(\d{6})\.jsonl\.gz$')
+
+# Обертки над make_request, которые не считаются местом вызова
+_WRAPPER_NAMES = frozenset({'make_request', '_make_request'})
+
+# Записей, сжимаемых одним блоком gzip
+_BATCH_SIZE = 64
+
+_context = threading.local()
+
+
+# === Контекст вызова ===
+
+@contextmanager
+def trace_session(session_id: Optional[str]) -> Iterator[None]:
+    """Привязка вызовов модели в текущем потоке к сессии"""
+    previous = getattr(_context, 'session_id', None)
+    _context.session_id = session_id
+    try:
+        yield
+    finally:
+        _context.session_id = previous
+
+
+def current_session_id() -> Optional[str]:
+    """ID сессии, к которой относятся вызовы модели в текущем потоке"""
+    return getattr(_context, 'session_id', None)
+
+
+def call_site(depth: int = 2) -> str:
+    """Имя метода, обратившегося к модели (обертки make_request пропускаются)"""
+    frame = sys._getframe(depth)
+    while frame is not None and frame.f_code.co_name in _WRAPPER_NAMES:
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else '?'
+
+
+# === Запись ===
+
+class TraceRecorder:
+    """Кольцевой буфер сжатых сегментов с записью в фоновом потоке"""
+
+    def __init__(self, trace_dir: Path, segment_bytes: int = None, max_segments: int = None,
+                 sample_rate: float = None, queue_size: int = None):
+        self.trace_dir = Path(trace_dir)
+        self.segment_bytes = segment_bytes or TRACE.segment_bytes
+        self.max_segments = max_segments or TRACE.max_segments
+        self.sample_rate = TRACE.sample_rate if sample_rate is None else sample_rate
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(queue_size or TRACE.queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def __call__(self, call: Dict[str, Any]):
+        """Наблюдатель AIClient: запись вызова с учетом доли выборки"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.record(call)
+
+    def record(self, entry: Dict[str, Any]):
+        """Постановка записи в очередь; при переполнении запись отбрасывается"""
+        if self._writer is None:
+            self._start()
+        try:
+            self._queue.put_nowait(dict(entry))
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="llm-trace-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _write_loop(self):
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                self._queue.task_done()
+                return
+
+            batch = [entry]
+            while len(batch) < _BATCH_SIZE:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    # Стоп-сигнал вернется в очередь после записи пачки
+                    self._queue.task_done()
+                    self._queue.put(None)
+                    break
+                batch.append(entry)
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.warning(f"Не удалось записать трассировку запросов: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, entries: List[Dict[str, Any]]):
+        """Дописывание пачки отдельным блоком gzip в конец текущего сегмента"""
+        data = b''.join(json_backend.backend.dumps_bytes(entry) + b'\n' for entry in entries)
+        block = gzip.compress(data)
+
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        with FileLock(self.trace_dir / '.lock', TRACE.lock_timeout):
+            segments = self.segments()
+            segment = segments[-1] if segments else 1
+            path = self._segment_path(segment)
+            if path.exists() and path.stat().st_size >= self.segment_bytes:
+                segment += 1
+                path = self._segment_path(segment)
+                segments.append(segment)
+
+            with open(path, 'ab') as f:
+                f.write(block)
+
+            for old in segments[:-self.max_segments]:
+                try:
+                    self._segment_path(old).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def flush(self):
+        """Ожидание записи всех поставленных в очередь записей"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        """Запись оставшихся записей и остановка фонового потока"""
+        writer = self._writer
+        if writer is None:
+            return
+        self._queue.put(None)
+        writer.join()
+        self._writer = None
+
+    # === Чтение ===
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.trace_dir / f"segment-{segment:06d}.jsonl.gz"
+
+    def segments(self) -> List[int]:
+        """Номера сегментов по возрастанию"""
+        if not self.trace_dir.exists():
+            return []
+        return sorted(
+            int(match.group(1))
+            for match in (_SEGMENT_RE.match(name) for name in os.listdir(self.trace_dir))
+            if match
+        )
+
+    def iter_records(self, session_id: str = None) -> Iterator[Dict[str, Any]]:
+        """Записи от старых к новым; оборванный при сбое хвост сегмента пропускается"""
+        for segment in self.segments():
+            try:
+                with gzip.open(self._segment_path(segment), 'rb') as f:
+                    for line in f:
+                        try:
+                            entry = json_backend.loads(line)
+                        except ValueError:
+                            continue
+                        if session_id is None or entry.get('session_id') == session_id:
+                            yield entry
+            except FileNotFoundError:
+                # Сегмент удален при ротации во время чтения
+                continue
+            except (EOFError, OSError, zlib.error) as e:
+                logger.warning(f"Сегмент трассировки segment-{segment:06d} прочитан не полностью: {e}")
+
+
+recorder: Optional[TraceRecorder] = TraceRecorder(Path(TRACE.trace_dir)) if TRACE.enabled else None
+
+
+def enable(sample_rate: float = None) -> TraceRecorder:
+    """Включение трассировки для клиентов, создаваемых после вызова"""
+    global recorder
+    if recorder is None:
+        recorder = TraceRecorder(Path(TRACE.trace_dir), sample_rate=sample_rate)
+    return recorder
+
+
+# === CLI ===
+
+def _print_sessions(trace: TraceRecorder):
+    counts: Dict[str, List[int]] = {}
+    for entry in trace.iter_records():
+        stats = counts.setdefault(entry.get('session_id') or '-', [0, 0])
+        stats[0] += 1
+        stats[1] += 1 if entry.get('error') else 0
+
+    header = f"{'сессия':<38} {'вызовов':>8} {'ошибок':>7}"
+    print(header)
+    print('-' * len(header))
+    for session_id, (calls, errors) in counts.items():
+        print(f"{session_id:<38} {calls:>8} {errors:>7}")
+
+
+def _dump(trace: TraceRecorder, session_id: str):
+    for entry in trace.iter_records(session_id):
+        print(json_backend.dumps(entry, pretty=True))
+
+
+def _replay(trace: TraceRecorder, session_id: str, base_url: str = None):
+    """Повторная отправка вызовов сессии в модель с сравнением ответов"""
+    from ai_client import AIClient
+    from exceptions import AIConnectionError
+
+    client = AIClient(base_url)
+    # Повторные вызовы не пишутся в трассировку, чтобы не смешивать их с исходными
+    client.observers = [observer for observer in client.observers if not isinstance(observer, TraceRecorder)]
+
+    entries = list(trace.iter_records(session_id))
+    if not entries:
+        print(f"Нет записей для сессии {session_id}")
+        return
+
+    for number, entry in enumerate(entries, 1):
+        print(f"=== {number}/{len(entries)} {entry.get('call_site')} ===")
+        try:
+            content = client.make_request(
+                entry['prompt'], entry.get('system_prompt'),
+                entry.get('max_tokens', 8192), entry.get('temperature', 0.7)
+            )
+        except AIConnectionError as e:
+            print(f"Ошибка: {e}")
+            continue
+
+        recorded = entry.get('content') or ''
+        print(f"Записанный ответ: {len(recorded)} символов за {entry.get('latency') or 0:.2f}с")
+        print(f"Новый ответ: {len(content)} символов, {'совпадает' if content == recorded else 'отличается'}")
+        print(content)
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Трассировка запросов к модели")
+    parser.add_argument('--trace-dir', default=TRACE.trace_dir, help="Папка сегментов трассировки")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('sessions', help="Сессии с записанными вызовами")
+    dump_parser = commands.add_parser('dump', help="Все вызовы сессии в JSON")
+    dump_parser.add_argument('session_id')
+    replay_parser = commands.add_parser('replay', help="Повторить вызовы сессии и сравнить ответы")
+    replay_parser.add_argument('session_id')
+    replay_parser.add_argument('--base-url', default=None, help="Адрес LM Studio")
+    args = parser.parse_args()
+
+    trace = TraceRecorder(Path(args.trace_dir))
+    if args.command == 'sessions':
+        _print_sessions(trace)
+    elif args.command == 'dump':
+        _dump(trace, args.session_id)
+    else:
+        _replay(trace, args.session_id, args.base_url)
@@ -1,66 +1,192 @@
+import atexit
+import gzip
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional, Union
+
+from config import LOGGING
+
+
+class TruncatingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Передача записей в очередь фонового потока
+    Сообщение форматируется и обрезается до max_chars здесь, запись в файл
+    и консоль идет в потоке QueueListener. При переполнении очереди запись
+    отбрасывается, а не блокирует вызывающий поток
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Обрезается только текст сообщения, трассировка исключения сохраняется целиком
+        message = record.getMessage()
+        if self.max_chars and len(message) > self.max_chars:
+            record.msg = f"{message[:self.max_chars]}... [обрезано символов: {len(message) - self.max_chars}]"
+            record.args = None
+        return super().prepare(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Ротация файла лога по размеру со сжатием старых файлов в .gz"""
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, compress: bool = True):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        if compress:
+            self.namer = lambda name: name + '.gz'
+            self.rotator = _gzip_rotator
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+# Сообщение: строка с %-аргументами или функция, вызываемая только при включенном уровне
+Message = Union[str, Callable[[], str]]
+
+
+class SessionFormatter(logging.Formatter):
+    """Форматтер, добавляющий к сообщению префикс [session_id] из поля записи"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        session_id = getattr(record, 'session_id', None)
+        record.session_prefix = f"[{session_id}] " if session_id else ''
+        return super().format(record)
+
+
+class SessionLogger(logging.LoggerAdapter):
+    """
+    Логгер с привязанным ID сессии
+    session_id передается в запись структурным полем, а не склеивается с текстом
+    """
+
+    def log(self, level: int, msg: Message, *args, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+        if callable(msg):
+            msg = msg()
+        msg, kwargs = self.process(msg, kwargs)
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg: Message, *args, **kwargs):
+        # Самый частый и обычно выключенный уровень - проверка без промежуточных вызовов
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def process(self, msg: Any, kwargs: dict):
+        kwargs['extra'] = {**self.extra, **(kwargs.get('extra') or {})}
+        return msg, kwargs
+
 
 class BriefingLogger:
     """Логгер для AI-агента брифинга"""
-    
+
     def __init__(self, name: str = "briefing_agent", log_file: Optional[str] = None):
         self.logger = logging.getLogger(name)
         self.logger.setLevel(logging.INFO)
-        
+        self.listener: Optional[logging.handlers.QueueListener] = None
+
         # Избегаем дублирования хендлеров
         if not self.logger.handlers:
             self._setup_handlers(log_file)
-    
+
     def _setup_handlers(self, log_file: Optional[str]):
-        """Настройка обработчиков логов"""
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        """
+        Настройка обработчиков логов
+        Логгер пишет только в очередь; консоль и файл обслуживает фоновый поток,
+        поэтому логирование не добавляет ввод-вывод в GUI и запросы к модели
+        """
+        formatter = SessionFormatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(session_prefix)s%(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
-        
+        handlers = []
+
         # Консольный вывод
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
-        
-        # Файловый вывод
+        handlers.append(console_handler)
+
+        # Файловый вывод с ротацией по размеру
         if log_file:
             log_path = Path(log_file)
             log_path.parent.mkdir(exist_ok=True)
-            
-            file_handler = logging.FileHandler(log_file, encoding='utf-8')
+
+            file_handler = CompressingRotatingFileHandler(
+                log_file, LOGGING.max_bytes, LOGGING.backup_count, LOGGING.compress_backups
+            )
             file_handler.setLevel(logging.DEBUG)
             file_handler.setFormatter(formatter)
-            self.logger.addHandler(file_handler)
-    
-    def info(self, message: str, session_id: str = None):
+            handlers.append(file_handler)
+
+        log_queue = queue.Queue(LOGGING.queue_size)
+        self.queue_handler = TruncatingQueueHandler(log_queue, LOGGING.max_message_chars)
+        self.logger.addHandler(self.queue_handler)
+
+        self.listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        # При выходе дописываем все, что осталось в очереди
+        atexit.register(self.close)
+
+    def close(self):
+        """Остановка фонового потока с записью оставшихся сообщений"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _log(self, level: int, message: Message, args: tuple, session_id: Optional[str],
+             exc_info: bool = False):
+        """
+        Запись сообщения: при выключенном уровне - только проверка isEnabledFor
+        %-аргументы подставляются и функция-сообщение вызывается, только если запись состоится
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        if callable(message):
+            message = message()
+        self.logger.log(level, message, *args, exc_info=exc_info,
+                        extra={'session_id': session_id} if session_id else None)
+
+    def isEnabledFor(self, level: int) -> bool:
+        """Будет ли записано сообщение уровня level"""
+        return self.logger.isEnabledFor(level)
+
+    def for_session(self, session_id: str) -> SessionLogger:
+        """Логгер с привязанным ID сессии"""
+        return SessionLogger(self.logger, {'session_id': session_id})
+
+    def info(self, message: Message, *args, session_id: str = None):
         """Информационное сообщение"""
-        if session_id:
-            message = f"[{session_id}] {message}"
-        self.logger.info(message)
-    
-    def error(self, message: str, session_id: str = None, exc_info: bool = False):
+        self._log(logging.INFO, message, args, session_id)
+
+    def error(self, message: Message, *args, session_id: str = None, exc_info: bool = False):
         """Сообщение об ошибке"""
-        if session_id:
-            message = f"[{session_id}] {message}"
-        self.logger.error(message, exc_info=exc_info)
-    
-    def debug(self, message: str, session_id: str = None):
+        self._log(logging.ERROR, message, args, session_id, exc_info)
+
+    def debug(self, message: Message, *args, session_id: str = None):
         """Отладочное сообщение"""
-        if session_id:
-            message = f"[{session_id}] {message}"
-        self.logger.debug(message)
-    
-    def warning(self, message: str, session_id: str = None):
+        self._log(logging.DEBUG, message, args, session_id)
+
+    def warning(self, message: Message, *args, session_id: str = None):
         """Предупреждение"""
-        if session_id:
-            message = f"[{session_id}] {message}"
-        self.logger.warning(message)
+        self._log(logging.WARNING, message, args, session_id)
 
 # Глобальный экземпляр логгера
-logger = BriefingLogger("briefing_agent", "logs/briefing.log") 
\ No newline at end of file
+logger = BriefingLogger("briefing_agent", LOGGING.log_file)
@@ -0,0 +1,282 @@
+"""
+Метрики запросов к модели в текстовом формате Prometheus
+
+Реестр хранит счетчики и гистограммы с метками в памяти процесса.
+Обновление метрики - поиск в словаре и сложение под собственной
+блокировкой метрики, поэтому метрики можно не выключать в работе.
+
+LLMMetrics - наблюдатель AIClient: задержка, повторы, ошибки, токены
+из usage и исход разбора JSON по месту вызова (analyze_idea_domain,
+generate_adaptive_questions, ...).
+
+Экспорт включается явно (по умолчанию метрики только копятся в памяти):
+- периодическая запись в файл (METRICS.textfile) для textfile-коллектора node_exporter
+- локальный HTTP /metrics (METRICS.http_port) - для работы без GUI
+"""
+
+import atexit
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import METRICS
+from json_backend import atomic_write_bytes
+from logger import logger
+
+
+# Границы корзин задержки запроса к модели, секунд
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и метками"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> [счетчики корзин..., переполнение, сумма]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, *label_values: str) -> int:
+        counts = self._values.get(label_values)
+        return sum(counts[:-1]) if counts else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts)) for key, counts in self._values.items()]
+
+        lines = []
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[len(self.buckets)]
+            le = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class LLMMetrics:
+    """Метрики запросов к модели по месту вызова"""
+
+    def __init__(self, registry: Registry = REGISTRY):
+        self.requests = registry.counter(
+            'briefing_llm_requests_total', 'Запросы к модели по исходу', ('call_site', 'outcome'))
+        self.retries = registry.counter(
+            'briefing_llm_retries_total', 'Повторные попытки запросов к модели', ('call_site',))
+        self.latency = registry.histogram(
+            'briefing_llm_request_duration_seconds', 'Время запроса к модели с повторами', ('call_site',))
+        self.prompt_tokens = registry.counter(
+            'briefing_llm_prompt_tokens_total', 'Токены промптов (usage)', ('call_site',))
+        self.completion_tokens = registry.counter(
+            'briefing_llm_completion_tokens_total', 'Токены ответов (usage)', ('call_site',))
+        self.json_parse = registry.counter(
+            'briefing_llm_json_parse_total', 'Разбор JSON ответов: ok, repaired, failed', ('call_site', 'outcome'))
+
+    def __call__(self, call: Dict):
+        """Наблюдатель AIClient"""
+        site = call['call_site']
+        self.requests.inc(site, 'success' if call['content'] is not None else 'failure')
+        if call['attempts'] > 1:
+            self.retries.inc(site, amount=call['attempts'] - 1)
+        if call['latency'] is not None:
+            self.latency.observe(call['latency'], site)
+        usage = call.get('usage')
+        if usage:
+            self.prompt_tokens.inc(site, amount=usage.get('prompt_tokens') or 0)
+            self.completion_tokens.inc(site, amount=usage.get('completion_tokens') or 0)
+
+    def record_parse(self, call_site: str, outcome: str):
+        self.json_parse.inc(call_site, outcome)
+
+
+LLM = LLMMetrics()
+
+
+# === Экспорт ===
+
+class TextfileExporter:
+    """Периодическая атомарная запись метрик в файл"""
+
+    def __init__(self, path: Path, interval: float, registry: Registry = REGISTRY):
+        self.path = Path(path)
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics-textfile", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def write(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(self.path, self.registry.render().encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"Не удалось записать метрики в {self.path}: {e}")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        """Остановка с финальной записью"""
+        if not self._stop.is_set():
+            self._stop.set()
+            self.write()
+
+
+def serve_http(port: int, host: str = '127.0.0.1', registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """HTTP /metrics в фоновом потоке"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Метрики доступны на http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters():
+    """Запуск экспорта по настройкам METRICS (один раз на процесс)"""
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    if METRICS.textfile:
+        TextfileExporter(Path(METRICS.textfile), METRICS.export_interval).start()
+    if METRICS.http_port:
+        try:
+            serve_http(METRICS.http_port, METRICS.http_host)
+        except OSError as e:
+            logger.warning(f"Не удалось открыть порт метрик {METRICS.http_port}: {e}")
+
+
+def observer() -> Optional[LLMMetrics]:
+    """Наблюдатель для AIClient с запуском экспорта (None - метрики выключены)"""
+    if not METRICS.enabled:
+        return None
+    start_exporters()
+    return LLM
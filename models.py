@@ -1,9 +1,68 @@
+import hashlib
+import sys
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
 from config import CompetencyLevel, QuestionComplexity, SessionStep
 
-@dataclass
+# Модели без __dict__ на экземпляр (slots=True доступно с Python 3.10)
+_DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Кэш поиска элементов перечислений по значению (быстрее вызова Enum(value))
+_STEP_BY_VALUE = {step.value: step for step in SessionStep}
+_LEVEL_BY_VALUE = {level.value: level for level in CompetencyLevel}
+
+# Короткие повторяющиеся строки хранятся в одном экземпляре на процесс
+_intern = sys.intern
+
+# Версия формата документа сессии: 2 - тексты вопросов вынесены в таблицу question_table
+FORMAT_VERSION = 2
+
+QUESTION_ID_LENGTH = 8
+
+
+def question_id(text: str, length: int = QUESTION_ID_LENGTH) -> str:
+    """Стабильный короткий ID вопроса - префикс SHA-1 от текста"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:length]
+
+
+class QuestionTable:
+    """
+    Таблица текстов вопросов сессии
+    Ответы, комментарии и история ссылаются на вопрос по ID, а текст хранится один раз
+    """
+    
+    __slots__ = ('texts', 'ids')
+    
+    def __init__(self, texts: Optional[Dict[str, str]] = None):
+        self.texts: Dict[str, str] = dict(texts or {})
+        self.ids: Dict[str, str] = {text: qid for qid, text in self.texts.items()}
+    
+    def id_for(self, text: str) -> str:
+        """ID вопроса (при первом обращении текст добавляется в таблицу)"""
+        qid = self.ids.get(text)
+        if qid is None:
+            length = QUESTION_ID_LENGTH
+            qid = question_id(text, length)
+            # Коллизия префикса с другим текстом - удлиняем ID
+            while qid in self.texts:
+                length += 2
+                qid = question_id(text, length)
+            self.texts[qid] = text
+            self.ids[text] = qid
+        return qid
+    
+    def text_for(self, qid: str) -> str:
+        """Текст вопроса по ID (неизвестный ключ - текст из документа старого формата)"""
+        return self.texts.get(qid, qid)
+    
+    def encode_keys(self, mapping: Dict[str, Any]) -> Dict[str, Any]:
+        return {self.id_for(text): value for text, value in mapping.items()}
+    
+    def decode_keys(self, mapping: Dict[str, Any]) -> Dict[str, Any]:
+        return {self.text_for(qid): value for qid, value in mapping.items()}
+
+@dataclass(**_DATACLASS_OPTIONS)
 class Question:
     """Модель вопроса"""
     text: str
@@ -13,7 +72,7 @@ class Question:
     weight: str = "medium"
     adapted_for: str = ""
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class Answer:
     """Модель ответа"""
     question: str
@@ -21,7 +80,7 @@ class Answer:
     comment: str = ""
     timestamp: datetime = field(default_factory=datetime.now)
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class CompetencyProfile:
     """Профиль компетенций пользователя"""
     domain: str
@@ -35,7 +94,7 @@ class CompetencyProfile:
     question_strategy: Dict[str, Any] = field(default_factory=dict)
     profile_summary: str = ""
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class DomainAnalysis:
     """Анализ области знаний"""
     primary_domain: str
@@ -45,7 +104,7 @@ class DomainAnalysis:
     requires_specialized_knowledge: bool = False
     domain_description: str = ""
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class RequiredCompetencies:
     """Необходимые компетенции для области"""
     domain: str
@@ -54,7 +113,7 @@ class RequiredCompetencies:
     skills: List[str] = field(default_factory=list)
     experience: List[str] = field(default_factory=list)
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class SessionIteration:
     """Итерация сессии"""
     iteration: int
@@ -65,7 +124,7 @@ class SessionIteration:
     questions: List[Question] = field(default_factory=list)
     answers: List[Answer] = field(default_factory=list)
 
-@dataclass
+@dataclass(**_DATACLASS_OPTIONS)
 class SessionData:
     """Данные сессии"""
     session_id: str
@@ -76,6 +135,9 @@ class SessionData:
     iteration_count: int = 0
     competency_stage: str = ""
     
+    # Версия документа на момент загрузки: растет с каждой записью, нужна для проверки конфликтов
+    version: int = 0
+    
     # Основные данные
     user_idea: str = ""
     original_user_idea: str = ""
@@ -105,12 +167,82 @@ class SessionData:
     all_iterations: List[SessionIteration] = field(default_factory=list)
     validation_history: List[Dict[str, Any]] = field(default_factory=list)
     
+    # Еще не разобранные тяжелые секции (имя поля -> список словарей из документа)
+    _raw_sections: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict, init=False, repr=False, compare=False)
+    
+    # Таблица вопросов: ID из загруженного документа остаются стабильными при пересохранении
+    _question_table: QuestionTable = field(default_factory=QuestionTable, init=False, repr=False, compare=False)
+    
+    def __getattr__(self, name: str):
+        # Вызывается только для отсутствующих атрибутов: разбираем ленивую секцию при первом обращении
+        deserializer = _LAZY_SECTIONS.get(name)
+        if deserializer is None:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        
+        raw = self._raw_sections.pop(name, [])
+        deserialize = getattr(type(self), deserializer)
+        value = [deserialize(item, self._question_table) for item in raw]
+        setattr(self, name, value)
+        return value
+    
+    def _is_materialized(self, name: str) -> bool:
+        # object.__getattribute__ не вызывает __getattr__, поэтому не разбирает секцию
+        try:
+            object.__getattribute__(self, name)
+            return True
+        except AttributeError:
+            return False
+    
+    def _serialize_section(self, name: str, serializer) -> List[Dict[str, Any]]:
+        """Секция для сохранения: неразобранная отдается как есть, без повторной сериализации"""
+        if name in self._raw_sections and not self._is_materialized(name):
+            return self._raw_sections[name]
+        table = self._question_table
+        return [serializer(item, table) for item in getattr(self, name)]
+    
+    def question_id(self, text: str) -> str:
+        """Стабильный ID вопроса в этой сессии"""
+        return self._question_table.id_for(text)
+    
+    # === Изменения сессии (для транзакций менеджера сессий) ===
+    
+    def add_iteration(self, iteration_data: Dict[str, Any]) -> SessionIteration:
+        """Добавление новой итерации с увеличением счетчика"""
+        self.iteration_count += 1
+        iteration = SessionIteration(
+            iteration=self.iteration_count,
+            timestamp=datetime.now(),
+            refined_idea=iteration_data.get('refined_idea', ''),
+            feedback_type=iteration_data.get('feedback_type', ''),
+            comments=iteration_data.get('comments', '')
+        )
+        self.all_iterations.append(iteration)
+        return iteration
+    
+    def add_validation(self, validation_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Добавление записи валидации с отметкой времени"""
+        record = {
+            'timestamp': datetime.now().isoformat(),
+            **validation_data
+        }
+        self.validation_history.append(record)
+        return record
+    
+    def complete(self, final_result: str):
+        """Завершение сессии с итоговым результатом"""
+        self.status = 'completed'
+        self.final_result = final_result
+        self.current_step = SessionStep.COMPLETED
+    
     def to_dict(self) -> Dict[str, Any]:
         """Преобразование в словарь для сохранения"""
-        return {
+        table = self._question_table
+        document = {
+            'format_version': FORMAT_VERSION,
             'session_id': self.session_id,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
+            'version': self.version,
             'status': self.status,
             'current_step': self.current_step.value,
             'iteration_count': self.iteration_count,
@@ -122,19 +254,23 @@ class SessionData:
             'competency_profile': self._serialize_competency_profile(),
             'domain_analysis': self._serialize_domain_analysis(),
             'required_competencies': self._serialize_required_competencies(),
-            'context_questions': self.context_questions,
-            'competency_questions': [self._serialize_question(q) for q in self.competency_questions],
-            'clarifying_questions': [self._serialize_question(q) for q in self.clarifying_questions],
-            'competency_answers': self.competency_answers,
-            'competency_comments': self.competency_comments,
-            'main_answers': self.main_answers,
-            'main_comments': self.main_comments,
-            'answers': self.answers,
-            'comments': self.comments,
-            'all_asked_questions': self.all_asked_questions,
-            'all_iterations': [self._serialize_iteration(it) for it in self.all_iterations],
-            'validation_history': self.validation_history
+            # Копии списков: документ не должен меняться вместе с объектом (кэш и транзакции сравнивают снимки)
+            'context_questions': list(self.context_questions),
+            'competency_questions': self._serialize_section('competency_questions', self._serialize_question),
+            'clarifying_questions': self._serialize_section('clarifying_questions', self._serialize_question),
+            'competency_answers': table.encode_keys(self.competency_answers),
+            'competency_comments': table.encode_keys(self.competency_comments),
+            'main_answers': table.encode_keys(self.main_answers),
+            'main_comments': table.encode_keys(self.main_comments),
+            'answers': table.encode_keys(self.answers),
+            'comments': table.encode_keys(self.comments),
+            'all_asked_questions': [table.id_for(text) for text in self.all_asked_questions],
+            'all_iterations': self._serialize_section('all_iterations', self._serialize_iteration),
+            'validation_history': list(self.validation_history)
         }
+        # Таблица заполняется по ходу сериализации, поэтому добавляется последней
+        document['question_table'] = dict(table.texts)
+        return document
     
     def _serialize_competency_profile(self) -> Optional[Dict[str, Any]]:
         if not self.competency_profile:
@@ -175,44 +311,56 @@ class SessionData:
             'experience': self.required_competencies.experience
         }
     
-    def _serialize_question(self, question: Question) -> Dict[str, Any]:
-        return {
-            'text': question.text,
+    @classmethod
+    def _serialize_question(cls, question: Question, table: QuestionTable = None) -> Dict[str, Any]:
+        # Без таблицы - самодостаточный словарь с текстом (формат 1)
+        data = {'id': table.id_for(question.text)} if table is not None else {'text': question.text}
+        data.update({
             'explanation': question.explanation,
             'examples': question.examples,
             'category': question.category,
             'weight': question.weight,
             'adapted_for': question.adapted_for
-        }
+        })
+        return data
     
-    def _serialize_iteration(self, iteration: SessionIteration) -> Dict[str, Any]:
+    @classmethod
+    def _serialize_iteration(cls, iteration: SessionIteration, table: QuestionTable = None) -> Dict[str, Any]:
         return {
             'iteration': iteration.iteration,
             'timestamp': iteration.timestamp.isoformat(),
             'refined_idea': iteration.refined_idea,
             'feedback_type': iteration.feedback_type,
             'comments': iteration.comments,
-            'questions': [self._serialize_question(q) for q in iteration.questions],
-            'answers': [self._serialize_answer(a) for a in iteration.answers]
+            'questions': [cls._serialize_question(q, table) for q in iteration.questions],
+            'answers': [cls._serialize_answer(a, table) for a in iteration.answers]
         }
     
-    def _serialize_answer(self, answer: Answer) -> Dict[str, Any]:
-        return {
-            'question': answer.question,
+    @classmethod
+    def _serialize_answer(cls, answer: Answer, table: QuestionTable = None) -> Dict[str, Any]:
+        if table is not None:
+            data = {'question_id': table.id_for(answer.question)}
+        else:
+            data = {'question': answer.question}
+        data.update({
             'answer': answer.answer,
             'comment': answer.comment,
             'timestamp': answer.timestamp.isoformat()
-        }
+        })
+        return data
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'SessionData':
-        """Создание из словаря"""
+        """Создание из словаря (формат 1 с текстами вопросов или формат 2 с таблицей)"""
+        table = QuestionTable(data.get('question_table'))
         session = cls(
             session_id=data.get('session_id', ''),
             created_at=datetime.fromisoformat(data.get('created_at', datetime.now().isoformat())),
             updated_at=datetime.fromisoformat(data.get('updated_at', datetime.now().isoformat())),
+            # journal_seq - имя версии в снимках журнала до появления версий
+            version=data.get('version', data.get('journal_seq', 0)),
             status=data.get('status', 'active'),
-            current_step=SessionStep(data.get('current_step', 'input_idea')),
+            current_step=_STEP_BY_VALUE.get(data.get('current_step')) or SessionStep(data.get('current_step', 'input_idea')),
             iteration_count=data.get('iteration_count', 0),
             competency_stage=data.get('competency_stage', ''),
             user_idea=data.get('user_idea', ''),
@@ -220,14 +368,15 @@ class SessionData:
             refined_idea=data.get('refined_idea', ''),
             final_result=data.get('final_result', ''),
             context_questions=data.get('context_questions', []),
-            competency_answers=data.get('competency_answers', {}),
-            competency_comments=data.get('competency_comments', {}),
-            main_answers=data.get('main_answers', {}),
-            main_comments=data.get('main_comments', {}),
-            answers=data.get('answers', {}),
-            comments=data.get('comments', {}),
+            competency_answers=table.decode_keys(data.get('competency_answers', {})),
+            competency_comments=table.decode_keys(data.get('competency_comments', {})),
+            main_answers=table.decode_keys(data.get('main_answers', {})),
+            main_comments=table.decode_keys(data.get('main_comments', {})),
+            answers=table.decode_keys(data.get('answers', {})),
+            comments=table.decode_keys(data.get('comments', {})),
             validation_history=data.get('validation_history', [])
         )
+        session._question_table = table
         
         # Десериализация сложных объектов
         if data.get('competency_profile'):
@@ -239,17 +388,14 @@ class SessionData:
         if data.get('required_competencies'):
             session.required_competencies = cls._deserialize_required_competencies(data['required_competencies'])
         
-        if data.get('competency_questions'):
-            session.competency_questions = [cls._deserialize_question(q) for q in data['competency_questions']]
-        
-        if data.get('clarifying_questions'):
-            session.clarifying_questions = [cls._deserialize_question(q) for q in data['clarifying_questions']]
-        
-        if data.get('all_iterations'):
-            session.all_iterations = [cls._deserialize_iteration(it) for it in data['all_iterations']]
+        # Тяжелые секции разбираются лениво - при первом обращении к полю
+        for name in _LAZY_SECTIONS:
+            if data.get(name):
+                session._raw_sections[name] = data[name]
+                object.__delattr__(session, name)
         
         # Десериализация all_asked_questions
-        session.all_asked_questions = data.get('all_asked_questions', [])
+        session.all_asked_questions = [table.text_for(qid) for qid in data.get('all_asked_questions', [])]
         
         return session
     
@@ -257,7 +403,7 @@ class SessionData:
     def _deserialize_competency_profile(cls, data: Dict[str, Any]) -> CompetencyProfile:
         return CompetencyProfile(
             domain=data.get('domain', ''),
-            overall_level=CompetencyLevel(data.get('overall_level', 'базовый')),
+            overall_level=_LEVEL_BY_VALUE.get(data.get('overall_level')) or CompetencyLevel(data.get('overall_level', 'базовый')),
             education_level=data.get('education_level', ''),
             practical_experience=data.get('practical_experience', ''),
             theoretical_knowledge=data.get('theoretical_knowledge', ''),
@@ -290,33 +436,48 @@ class SessionData:
         )
     
     @classmethod
-    def _deserialize_question(cls, data: Dict[str, Any]) -> Question:
+    def _deserialize_question(cls, data: Dict[str, Any], table: QuestionTable = None) -> Question:
+        # Самый частый объект в сессии: позиционные аргументы в порядке полей Question
+        get = data.get
+        qid = get('id')
         return Question(
-            text=data.get('text', ''),
-            explanation=data.get('explanation', ''),
-            examples=data.get('examples', []),
-            category=data.get('category', ''),
-            weight=data.get('weight', 'medium'),
-            adapted_for=data.get('adapted_for', '')
+            table.text_for(qid) if qid is not None and table is not None else get('text', ''),
+            get('explanation', ''),
+            get('examples', []),
+            _intern(get('category', '')),
+            _intern(get('weight', 'medium')),
+            _intern(get('adapted_for', ''))
         )
     
     @classmethod
-    def _deserialize_iteration(cls, data: Dict[str, Any]) -> SessionIteration:
+    def _deserialize_iteration(cls, data: Dict[str, Any], table: QuestionTable = None) -> SessionIteration:
         return SessionIteration(
             iteration=data.get('iteration', 0),
             timestamp=datetime.fromisoformat(data.get('timestamp', datetime.now().isoformat())),
             refined_idea=data.get('refined_idea', ''),
             feedback_type=data.get('feedback_type', ''),
             comments=data.get('comments', ''),
-            questions=[cls._deserialize_question(q) for q in data.get('questions', [])],
-            answers=[cls._deserialize_answer(a) for a in data.get('answers', [])]
+            questions=[cls._deserialize_question(q, table) for q in data.get('questions', [])],
+            answers=[cls._deserialize_answer(a, table) for a in data.get('answers', [])]
         )
     
     @classmethod
-    def _deserialize_answer(cls, data: Dict[str, Any]) -> Answer:
+    def _deserialize_answer(cls, data: Dict[str, Any], table: QuestionTable = None) -> Answer:
+        # Позиционные аргументы в порядке полей Answer
+        get = data.get
+        qid = get('question_id')
+        timestamp = get('timestamp')
         return Answer(
-            question=data.get('question', ''),
-            answer=data.get('answer', ''),
-            comment=data.get('comment', ''),
-            timestamp=datetime.fromisoformat(data.get('timestamp', datetime.now().isoformat()))
-        ) 
\ No newline at end of file
+            table.text_for(qid) if qid is not None and table is not None else get('question', ''),
+            get('answer', ''),
+            get('comment', ''),
+            datetime.fromisoformat(timestamp) if timestamp else datetime.now()
+        ) 
+
+
+# Секции SessionData, разбираемые при первом обращении (поле -> метод десериализации элемента)
+_LAZY_SECTIONS = {
+    'competency_questions': '_deserialize_question',
+    'clarifying_questions': '_deserialize_question',
+    'all_iterations': '_deserialize_iteration',
+}
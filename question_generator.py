@@ -43,7 +43,7 @@ class QuestionGenerator:
             # Проверяем схожесть с помощью difflib
             similarity = difflib.SequenceMatcher(None, normalized_new, normalized_existing).ratio()
             if similarity >= similarity_threshold:
-                logger.info(f"Найден похожий вопрос (схожесть: {similarity:.2f}): '{new_question}' ~ '{existing}'")
+                logger.debug("Найден похожий вопрос (схожесть: %.2f): '%s' ~ '%s'", similarity, new_question, existing)
                 return True
         
         return False
@@ -77,7 +77,7 @@ class QuestionGenerator:
                 unique_questions.append(question)
                 all_questions.append(question.text)  # Добавляем в локальный список для проверки следующих
             else:
-                logger.info(f"Исключен дубликат вопроса: '{question.text}'")
+                logger.info("Исключен дубликат вопроса: '%s'", question.text)
         
         return unique_questions
 
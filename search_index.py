@@ -0,0 +1,384 @@
+"""
+Полнотекстовый поиск по сессиям
+
+Инвертированный индекс по идее, уточненной идее, итоговому результату,
+текстам вопросов и ответам. Индекс обновляется при каждом сохранении сессии
+и хранится журналом в sessions/.index/search.jsonl: каждая строка - термы
+одной сессии (последняя запись побеждает), журнал периодически сворачивается.
+
+Поиск - ранжирование BM25 по всем словам запроса; слово со звездочкой
+(и последнее слово запроса при поиске по мере ввода) ищется как префикс
+по отсортированному словарю термов.
+"""
+
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import json_backend
+from config import STORAGE
+from file_lock import FileLock
+from logger import logger
+
+
+# Параметры BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Сколько термов максимум подставлять вместо одного префикса
+MAX_PREFIX_EXPANSIONS = 64
+
+MIN_STEM_LENGTH = 3
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Слово запроса и необязательная звездочка префиксного поиска
+_QUERY_RE = re.compile(r'(\w+)(\*?)', re.UNICODE)
+
+# Окончания русских слов (легкий стемминг без словаря)
+_RUSSIAN_ENDINGS = frozenset({
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией', 'ать', 'ять', 'ить',
+    'еть', 'ешь', 'ете', 'ите', 'ует', 'уют', 'ают', 'яют', 'ала', 'ило', 'ила', 'ся', 'сь',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ом', 'ем', 'ам', 'ям', 'ах',
+    'ях', 'ов', 'ев', 'ию', 'ья', 'ье', 'ьи', 'ия', 'ть', 'ут', 'ют', 'ит', 'ет', 'ал', 'ил',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й'
+})
+
+# Длины окончаний, от длинных к коротким: проверяется срез, а не каждое окончание
+_ENDING_LENGTHS = sorted({len(ending) for ending in _RUSSIAN_ENDINGS}, reverse=True)
+
+_CYRILLIC_RE = re.compile(r'[а-я]')
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """Отбрасывание типичного окончания русского слова (латиница не меняется)"""
+    if not _CYRILLIC_RE.search(token):
+        return token
+    # Два прохода: возвратная частица, затем окончание ("развиваются" -> "развива")
+    for _ in range(2):
+        for length in _ENDING_LENGTHS:
+            if len(token) - length >= MIN_STEM_LENGTH and token[-length:] in _RUSSIAN_ENDINGS:
+                token = token[:-length]
+                break
+        else:
+            break
+    return token
+
+
+def normalize(text: str) -> List[str]:
+    """Слова текста в нижнем регистре, ё -> е"""
+    return _TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+
+def tokenize(text: str) -> List[str]:
+    """Термы для индекса: нормализованные слова с отброшенными окончаниями"""
+    return [stem(token) for token in normalize(text) if len(token) > 1 or token.isdigit()]
+
+
+def document_text(document: Dict[str, Any]) -> Iterable[str]:
+    """Тексты документа сессии, попадающие в поиск"""
+    for key in ('user_idea', 'refined_idea', 'final_result'):
+        if document.get(key):
+            yield document[key]
+
+    # Формат 2: тексты вопросов собраны в таблице
+    table = document.get('question_table') or {}
+    yield from table.values()
+
+    for key in ('competency_questions', 'clarifying_questions'):
+        for question in document.get(key) or []:
+            if 'text' in question:
+                yield question['text']
+
+    for key in ('competency_answers', 'main_answers', 'answers', 'competency_comments', 'main_comments', 'comments'):
+        for question, answer in (document.get(key) or {}).items():
+            if question not in table:
+                yield question
+            if isinstance(answer, str):
+                yield answer
+
+    for iteration in document.get('all_iterations') or []:
+        if iteration.get('refined_idea'):
+            yield iteration['refined_idea']
+        for answer in iteration.get('answers', []):
+            if 'question' in answer:
+                yield answer['question']
+            yield answer.get('answer', '')
+            yield answer.get('comment', '')
+
+
+def document_terms(document: Dict[str, Any]) -> Dict[str, int]:
+    """Частоты термов документа сессии"""
+    counts: Counter = Counter()
+    for text in document_text(document):
+        counts.update(tokenize(text))
+    return dict(counts)
+
+
+class SearchIndex:
+    """Инвертированный индекс сессий с журналом на диске"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._total_length = 0
+        self._sorted_terms: Optional[List[str]] = None
+        self._norms: Optional[Dict[str, float]] = None
+        self._log_lines = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    # === Журнал на диске ===
+
+    def _file_lock(self) -> FileLock:
+        # Дописывание и свертка журнала - под межпроцессной блокировкой
+        return FileLock(self.path.with_name(f".{self.path.stem}.lock"), STORAGE.lock_timeout)
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        with self._file_lock():
+            self._read_log()
+        if self._log_lines > 2 * len(self._documents) + 100:
+            self.compact()
+
+    def _read_log(self):
+        """Построение индекса по журналу на диске (с нуля)"""
+        self._postings = {}
+        self._documents = {}
+        self._total_length = 0
+        self._sorted_terms = None
+        self._norms = None
+        self._log_lines = 0
+
+        if not self.path.exists():
+            return
+
+        with open(self.path, 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json_backend.loads(line)
+                except ValueError:
+                    # Строка, оборванная при сбое записи
+                    continue
+                self._log_lines += 1
+                if entry.get('deleted'):
+                    self._unindex(entry['id'])
+                elif 'terms' in entry:
+                    self._index(entry['id'], entry['terms'], entry.get('updated_at', ''))
+                elif entry['id'] in self._documents:
+                    # Сохранение без изменения индексируемого текста - только отметка времени
+                    self._documents[entry['id']]['updated_at'] = entry.get('updated_at', '')
+
+    def _append_log(self, *entries: Dict[str, Any]):
+        with self._file_lock():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(b''.join(json_backend.backend.dumps_bytes(entry) + b'\n' for entry in entries))
+            self._log_lines += len(entries)
+
+    def compact(self):
+        """Перезапись журнала только актуальными записями"""
+        with self._lock, self._file_lock():
+            # Индекс перечитывается с диска: журнал могли дописать другие процессы,
+            # а все изменения этого процесса к этому моменту уже в журнале
+            self._read_log()
+            lines = [
+                json_backend.backend.dumps_bytes({'id': session_id, 'updated_at': info['updated_at'], 'terms': info['terms']})
+                for session_id, info in self._documents.items()
+            ]
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            json_backend.atomic_write_bytes(self.path, b'\n'.join(lines) + b'\n' if lines else b'')
+            self._log_lines = len(lines)
+
+    # === Индексация ===
+
+    def _index(self, session_id: str, terms: Dict[str, int], updated_at: str):
+        self._unindex(session_id)
+        for term, count in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._sorted_terms = None
+            postings[session_id] = count
+
+        length = sum(terms.values())
+        self._documents[session_id] = {'terms': terms, 'length': length, 'updated_at': updated_at}
+        self._total_length += length
+        self._norms = None
+
+    def _unindex(self, session_id: str):
+        info = self._documents.pop(session_id, None)
+        if info is None:
+            return
+
+        self._total_length -= info['length']
+        self._norms = None
+        for term in info['terms']:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(session_id, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+
+    def update(self, document: Dict[str, Any]):
+        """Переиндексация сессии после сохранения (без записи, если термы не изменились)"""
+        self.update_many([document])
+
+    def update_many(self, documents: Iterable[Dict[str, Any]]):
+        """Переиндексация пачки сессий одной записью в журнал"""
+        entries = []
+        with self._lock:
+            self._load()
+            for document in documents:
+                session_id = document['session_id']
+                terms = document_terms(document)
+                updated_at = document.get('updated_at', '')
+
+                current = self._documents.get(session_id)
+                if current is not None and current['terms'] == terms:
+                    if current['updated_at'] != updated_at:
+                        current['updated_at'] = updated_at
+                        entries.append({'id': session_id, 'updated_at': updated_at})
+                    continue
+
+                self._index(session_id, terms, updated_at)
+                entries.append({'id': session_id, 'updated_at': updated_at, 'terms': terms})
+
+            if entries:
+                self._append_log(*entries)
+
+    def remove(self, session_id: str):
+        """Удаление сессии из индекса"""
+        with self._lock:
+            self._load()
+            if session_id in self._documents:
+                self._unindex(session_id)
+                self._append_log({'id': session_id, 'deleted': True})
+
+    def sync(self, updated: Dict[str, str], load_document):
+        """
+        Сверка с актуальным списком сессий {id: updated_at}
+        Переиндексируются новые и измененные в обход менеджера сессии, удаленные - убираются
+        """
+        with self._lock:
+            self._load()
+            for session_id in [sid for sid in self._documents if sid not in updated]:
+                self.remove(session_id)
+
+            for session_id, updated_at in updated.items():
+                info = self._documents.get(session_id)
+                if info is not None and info['updated_at'] == updated_at:
+                    continue
+                try:
+                    document = load_document(session_id)
+                except (ValueError, OSError) as e:
+                    logger.warning(f"Не удалось проиндексировать сессию {session_id}: {e}")
+                    continue
+                if document is not None:
+                    document['session_id'] = session_id
+                    self.update(document)
+
+    # === Поиск ===
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+
+        terms = []
+        position = bisect_left(self._sorted_terms, prefix)
+        while position < len(self._sorted_terms) and len(terms) < MAX_PREFIX_EXPANSIONS:
+            term = self._sorted_terms[position]
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+            position += 1
+        return terms
+
+    def _parse_query(self, query: str, prefix_last: bool) -> List[List[str]]:
+        """Группы термов запроса: документ должен содержать хотя бы один терм каждой группы"""
+        # Тот же фильтр, что и при индексации: однобуквенных слов (предлогов, союзов) в индексе нет
+        words = [
+            (word, star) for word, star in _QUERY_RE.findall(query.lower().replace('ё', 'е'))
+            if len(word) > 1 or word.isdigit()
+        ]
+        groups = []
+        for position, (word, star) in enumerate(words):
+            term = stem(word)
+            if star or (prefix_last and position == len(words) - 1):
+                groups.append(self._expand_prefix(term))
+            else:
+                groups.append([term] if term in self._postings else [])
+        return groups
+
+    def search(self, query: str, limit: int = 20, prefix_last: bool = True) -> List[Tuple[str, float]]:
+        """
+        Поиск сессий по запросу
+        Возвращает [(session_id, score)] по убыванию релевантности
+        """
+        with self._lock:
+            self._load()
+            groups = self._parse_query(query, prefix_last)
+            if not groups or any(not group for group in groups):
+                return []
+
+            # Кандидаты - пересечение, начиная с самой редкой группы
+            group_postings = [
+                [self._postings[term] for term in group]
+                for group in groups
+            ]
+            group_postings.sort(key=lambda postings: sum(len(p) for p in postings))
+
+            candidates = set().union(*group_postings[0])
+            for postings in group_postings[1:]:
+                candidates &= set().union(*postings)
+                if not candidates:
+                    return []
+
+            norms = self._length_norms()
+            total = len(self._documents)
+            scores: Dict[str, float] = dict.fromkeys(candidates, 0.0)
+
+            for postings_group in group_postings:
+                for postings in postings_group:
+                    idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for session_id in candidates:
+                        tf = postings.get(session_id)
+                        if tf:
+                            scores[session_id] += idf * tf * (BM25_K1 + 1) / (tf + norms[session_id])
+
+            if limit is None:
+                return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _length_norms(self) -> Dict[str, float]:
+        """Нормировка BM25 по длине документа (пересчитывается после изменений индекса)"""
+        if self._norms is None:
+            total = len(self._documents)
+            average_length = self._total_length / total if total else 0.0
+            self._norms = {
+                session_id: BM25_K1 * (1 - BM25_B + BM25_B * info['length'] / average_length) if average_length else BM25_K1
+                for session_id, info in self._documents.items()
+            }
+        return self._norms
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._documents)
@@ -0,0 +1,255 @@
+"""
+Архив завершенных сессий (холодный уровень хранения)
+
+Старые завершенные сессии переносятся из sessions/ в сегменты
+sessions/archive/segment-NNNNNN.dat. Каждая сессия сжимается отдельно (zlib)
+и дописывается в конец текущего сегмента, поэтому сегмент никогда не
+переписывается. Рядом лежит индекс segment-NNNNNN.idx (JSON Lines):
+ID, смещение, длина записи и краткая сводка для списка сессий.
+
+Чтение по ID - поиск в индексе и срез memory-mapped сегмента:
+распаковывается только одна запись. Удаление - строка-надгробие в индексе.
+Запись в индекс делается после записи данных, поэтому оборванная при сбое
+запись просто не видна. Дописывание идет под межпроцессной блокировкой
+архива: смещения считаются по фактическому размеру сегмента.
+
+Индекс в памяти сверяется с отпечатком файлов .idx (имя, размер, время
+изменения) и перечитывается, если архив пополнил другой процесс.
+"""
+
+import mmap
+import os
+import re
+import threading
+import zlib
+from collections import deque
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import json_backend
+from config import STORAGE
+from file_lock import FileLock
+from logger import logger
+from session_index import summarize_document
+
+
+_SEGMENT_RE = re.compile(r'^segment-(\d{6})\.idx$')
+
+READ_RETRIES = 3
+
+COMPRESSION_LEVEL = 6
+
+
+class SessionArchive:
+    """Append-only сегменты сжатых сессий с индексом смещений"""
+
+    def __init__(self, archive_dir: Path, segment_size: int = None):
+        self.archive_dir = Path(archive_dir)
+        self.segment_size = segment_size or STORAGE.archive_segment_size
+
+        # session_id -> (номер сегмента, смещение, длина, сводка)
+        self._entries: Optional[Dict[str, Tuple[int, int, int, Dict[str, Any]]]] = None
+        self._signature: Optional[Tuple] = None
+        self._current_segment = 1
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._lock = threading.RLock()
+
+    def _data_path(self, segment: int) -> Path:
+        return self.archive_dir / f"segment-{segment:06d}.dat"
+
+    def _index_path(self, segment: int) -> Path:
+        return self.archive_dir / f"segment-{segment:06d}.idx"
+
+    def _file_lock(self) -> FileLock:
+        return FileLock(self.archive_dir / '.lock', STORAGE.lock_timeout)
+
+    # === Индекс ===
+
+    def _segments(self) -> List[int]:
+        if not self.archive_dir.exists():
+            return []
+        return sorted(
+            int(match.group(1))
+            for match in (_SEGMENT_RE.match(name) for name in os.listdir(self.archive_dir))
+            if match
+        )
+
+    def _index_signature(self) -> Tuple:
+        """Отпечаток индексов: меняется при любой записи в архив"""
+        signature = []
+        for segment in self._segments():
+            try:
+                stat = self._index_path(segment).stat()
+            except OSError:
+                continue
+            signature.append((segment, stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _load(self) -> Dict[str, Tuple[int, int, int, Dict[str, Any]]]:
+        """
+        Индекс архива; перечитывается, если файлы индекса изменились.
+        Чтение оптимистичное: если индекс дописали во время чтения, оно повторяется
+        """
+        signature = self._index_signature()
+        if self._entries is not None and signature == self._signature:
+            return self._entries
+
+        for _ in range(READ_RETRIES):
+            entries = self._read_index([entry[0] for entry in signature])
+            current_signature = self._index_signature()
+            if current_signature == signature:
+                break
+            signature = current_signature
+        else:
+            # Архив непрерывно пополняется: прочитанное отдаем, но при следующем обращении перечитываем
+            signature = None
+
+        self._entries = entries
+        self._signature = signature
+        if signature:
+            self._current_segment = max(self._current_segment, signature[-1][0])
+        return self._entries
+
+    def _read_index(self, segments: List[int]) -> Dict[str, Tuple[int, int, int, Dict[str, Any]]]:
+        entries = {}
+        for segment in segments:
+            try:
+                with open(self._index_path(segment), 'rb') as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                continue
+            for line in lines:
+                # Строка без перевода строки еще дописывается другим процессом
+                if not line.endswith(b'\n'):
+                    continue
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json_backend.loads(line)
+                except ValueError:
+                    logger.warning(f"Пропущена поврежденная строка индекса архива segment-{segment:06d}")
+                    continue
+                if entry.get('deleted'):
+                    entries.pop(entry['id'], None)
+                else:
+                    entries[entry['id']] = (segment, entry['offset'], entry['length'], entry['summary'])
+        return entries
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Сводки всех сессий в архиве (формат как у манифеста)"""
+        with self._lock:
+            return [dict(entry[3]) for entry in self._load().values()]
+
+    def summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._load().get(session_id)
+            return dict(entry[3]) if entry else None
+
+    # === Чтение ===
+
+    def _segment_map(self, segment: int, end: int) -> mmap.mmap:
+        """Отображение сегмента в память (переоткрывается, если сегмент вырос)"""
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(self._data_path(segment), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def load_document(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Документ сессии из архива или None"""
+        with self._lock:
+            entry = self._load().get(session_id)
+            if entry is None:
+                return None
+
+            segment, offset, length, _ = entry
+            mapped = self._segment_map(segment, offset + length)
+            data = zlib.decompress(mapped[offset:offset + length])
+
+        return json_backend.loads(data)
+
+    # === Запись ===
+
+    def append(self, document: Dict[str, Any]):
+        """Добавление документа сессии в конец текущего сегмента"""
+        self.append_many([document])
+
+    def append_many(self, documents: List[Dict[str, Any]]):
+        """Добавление пачки документов: одна запись данных и одна запись индекса на сегмент"""
+        with self._lock, self._file_lock():
+            entries = self._load()
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+            pending = deque(documents)
+            while pending:
+                segment = self._current_segment
+                data_path = self._data_path(segment)
+                offset = data_path.stat().st_size if data_path.exists() else 0
+                if offset >= self.segment_size:
+                    self._close_map(segment)
+                    self._current_segment += 1
+                    continue
+
+                chunks, index_lines, written = [], [], []
+                while pending and offset < self.segment_size:
+                    document = pending.popleft()
+                    record = zlib.compress(json_backend.backend.dumps_bytes(document), COMPRESSION_LEVEL)
+                    summary = summarize_document(document)
+                    chunks.append(record)
+                    index_lines.append(json_backend.backend.dumps_bytes({
+                        'id': document['session_id'], 'offset': offset, 'length': len(record), 'summary': summary
+                    }))
+                    written.append((document['session_id'], offset, len(record), summary))
+                    offset += len(record)
+
+                # Сначала данные, затем индекс: запись без строки индекса не существует
+                with open(data_path, 'ab') as f:
+                    f.write(b''.join(chunks))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._append_index(segment, index_lines)
+
+                for session_id, record_offset, length, summary in written:
+                    entries[session_id] = (segment, record_offset, length, summary)
+
+            self._signature = self._index_signature()
+
+    def delete(self, session_id: str) -> bool:
+        """Удаление сессии из архива (место в сегменте не освобождается)"""
+        with self._lock, self._file_lock():
+            # Под блокировкой архива: индекс и текущий сегмент - такие, как на диске сейчас
+            if self._load().pop(session_id, None) is None:
+                return False
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            self._append_index(self._current_segment, [json_backend.backend.dumps_bytes({'id': session_id, 'deleted': True})])
+            self._signature = self._index_signature()
+            return True
+
+    def _append_index(self, segment: int, lines: List[bytes]):
+        with open(self._index_path(segment), 'ab') as f:
+            f.write(b''.join(line + b'\n' for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _close_map(self, segment: int):
+        mapped = self._maps.pop(segment, None)
+        if mapped is not None:
+            mapped.close()
+
+    def close(self):
+        """Закрытие отображенных в память сегментов"""
+        with self._lock:
+            for segment in list(self._maps):
+                self._close_map(segment)
@@ -0,0 +1,480 @@
+"""
+Кэш сессий с отложенной записью
+
+GUI загружает сессию в начале почти каждого обработчика и часто сразу же
+сохраняет ее, так что одно действие пользователя многократно читает и
+перезаписывает один и тот же файл. Кэш отдает загруженную сессию из памяти
+(каждому вызову - свою копию, поэтому объекты разных потоков не разделяются),
+отслеживает измененные поля и объединяет серию сохранений в одну атомарную
+запись, которую выполняет фоновый поток.
+
+Если сессию на диске успел изменить другой процесс, запись не затирает его
+изменения: измененные в кэше поля накладываются на свежий документ.
+
+Выданная копия помечена версией сессии в кэше (SessionData.version), которая
+растет с каждым сохранением с изменениями. Сохранение устаревшей копии -
+после того как сессию сохранили через другой объект или transaction() -
+отклоняется (False), как и без кэша. Для атомарного изменения - transaction():
+это транзакция самого менеджера под блокировкой сессии.
+"""
+
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
+
+import json_backend
+from config import SessionStep, STORAGE
+from exceptions import BriefingError, SessionConflictError, SessionNotFoundError
+from logger import logger
+from models import SessionData
+
+
+# Поля, изменение которых само по себе не требует записи
+_VOLATILE_FIELDS = ('updated_at', 'version')
+
+
+@dataclass
+class _CacheEntry:
+    """Запись кэша: последний зафиксированный документ сессии и состояние его записи на диск"""
+    snapshot: Dict[str, Any]
+    # Версия документа на диске, от которой отсчитаны изменения
+    disk_version: int = 0
+    # Версия сессии в кэше: ее получают выданные копии, сохранение с изменениями ее повышает
+    tag: int = 0
+    version: int = 0
+    flushed_version: int = 0
+    pending: Optional[Dict[str, Any]] = None
+    dirty_fields: Set[str] = field(default_factory=set)
+    first_dirty_at: float = 0.0
+    flush_at: float = 0.0
+
+    @property
+    def is_dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+    def session(self) -> SessionData:
+        """Новый объект сессии по последнему зафиксированному документу"""
+        # Через сериализацию: объект не должен разделять списки с документом, с которым его сравнивают
+        document = json_backend.loads(json_backend.backend.dumps_bytes(self.pending or self.snapshot))
+        session_data = SessionData.from_dict(document)
+        session_data.version = self.tag
+        return session_data
+
+
+def changed_fields(old: Dict[str, Any], new: Dict[str, Any]) -> Set[str]:
+    """Поля документа, отличающиеся от предыдущего снимка"""
+    return {
+        key for key, value in new.items()
+        if key not in _VOLATILE_FIELDS and old.get(key) != value
+    }
+
+
+class SessionCache:
+    """
+    Read-through кэш поверх менеджера сессий (SessionManager или SqliteSessionStore)
+
+    load_session возвращает копию сессии из памяти, пока сессия в кэше.
+    save_session фиксирует снимок документа и только планирует запись:
+    запись выполняется после flush_delay секунд без новых сохранений,
+    но не позже max_flush_delay после первого несохраненного изменения,
+    а также при flush()/close() и при выходе из программы.
+    """
+
+    def __init__(self, manager, capacity: int = None, flush_delay: float = None,
+                 max_flush_delay: float = None):
+        self.manager = manager
+        self.capacity = capacity or STORAGE.cache_capacity
+        self.flush_delay = STORAGE.cache_flush_delay if flush_delay is None else flush_delay
+        self.max_flush_delay = STORAGE.cache_max_flush_delay if max_flush_delay is None else max_flush_delay
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        # Версии вытесненных сессий: session_id -> (версия на диске, версия в кэше)
+        self._tags: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self.stats = {'hits': 0, 'misses': 0, 'saves': 0, 'skipped_saves': 0, 'writes': 0, 'conflicts': 0,
+                      'stale_saves': 0}
+
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-cache-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    # === Чтение и запись ===
+
+    def load_session(self, session_id: str) -> Optional[SessionData]:
+        """Загрузка сессии (из памяти, если она уже в кэше)"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                self.stats['hits'] += 1
+                return entry.session()
+
+        session_data = self.manager.load_session(session_id)
+        if session_data is None:
+            return None
+
+        with self._lock:
+            # Другой поток мог успеть загрузить ту же сессию
+            entry = self._entries.get(session_id)
+            if entry is None:
+                entry = self._new_entry(session_id, session_data.to_dict(), session_data.version)
+                self.stats['misses'] += 1
+                session_data.version = entry.tag
+                return session_data
+            self.stats['misses'] += 1
+            return entry.session()
+
+    def save_session(self, session_data: SessionData) -> bool:
+        """
+        Фиксация изменений сессии с отложенной записью
+        Если сессию сохранили после загрузки этой копии, сохранение отклоняется (False)
+        """
+        session_id = session_data.session_id
+        session_data.updated_at = datetime.now()
+        document = session_data.to_dict()
+        now = time.monotonic()
+
+        with self._lock:
+            loaded = session_id in self._entries
+        if not loaded:
+            # Сессия не загружалась через кэш (или вытеснена): версию копии сверяем с диском
+            self.load_session(session_id)
+
+        with self._wakeup:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                # Сессии нет на диске - считаем изменившимися все поля
+                entry = self._new_entry(session_id, {}, session_data.version)
+            self._entries.move_to_end(session_id)
+            self.stats['saves'] += 1
+
+            if session_data.version != entry.tag:
+                self.stats['stale_saves'] += 1
+                print(f"⚠️ Сессия не сохранена: {SessionConflictError(session_id, session_data.version, entry.tag).message}")
+                return False
+
+            changed = changed_fields(entry.pending or entry.snapshot, document)
+            if not changed:
+                self.stats['skipped_saves'] += 1
+                return True
+
+            if not entry.is_dirty:
+                entry.first_dirty_at = now
+            entry.version += 1
+            entry.tag += 1
+            entry.pending = document
+            entry.dirty_fields |= changed
+            entry.flush_at = min(now + self.flush_delay, entry.first_dirty_at + self.max_flush_delay)
+            session_data.version = entry.tag
+
+            self._evict()
+            closed = self._closed
+            if not closed:
+                self._wakeup.notify()
+
+        # Фоновый поток остановлен - запись сразу
+        return self._write_entry(session_id) if closed else True
+
+    @contextmanager
+    def transaction(self, session_id: str) -> Iterator[SessionData]:
+        """
+        Транзакция над сессией - транзакция менеджера под блокировкой сессии:
+        отложенные изменения записываются до блока, изменения блока - на выходе из него
+        (ошибка записи - BriefingError). При исключении в блоке изменения отбрасываются.
+        Копии, загруженные до транзакции, после нее устаревают
+        """
+        with self._session_lock(session_id):
+            if not self.flush(session_id):
+                raise BriefingError(f"Не удалось записать сессию {session_id}")
+
+            with self.manager.transaction(session_id) as session_data:
+                yield session_data
+
+            document = session_data.to_dict()
+            with self._lock:
+                entry = self._entries.get(session_id)
+                if entry is not None and entry.is_dirty:
+                    # Сохранение из другого потока: при записи оно наложится на документ транзакции
+                    return
+                if entry is not None and not changed_fields(entry.snapshot, document):
+                    session_data.version = entry.tag
+                    return
+                self._drop(session_id, stale=True)
+                entry = self._new_entry(session_id, document, session_data.version)
+                session_data.version = entry.tag
+
+    def flush(self, session_id: str = None) -> bool:
+        """Немедленная запись несохраненных изменений (одной сессии или всех)"""
+        with self._lock:
+            if session_id is not None:
+                session_ids = [session_id] if session_id in self._entries else []
+            else:
+                session_ids = list(self._entries)
+
+        success = True
+        for sid in session_ids:
+            success = self._write_entry(sid) and success
+        return success
+
+    def close(self):
+        """Запись всех изменений и остановка фонового потока"""
+        with self._wakeup:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+
+        self._flusher.join(timeout=5)
+        self.flush()
+
+    def dirty_fields(self, session_id: str) -> Set[str]:
+        """Поля сессии, еще не записанные на диск"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return set(entry.dirty_fields) if entry else set()
+
+    def invalidate(self, session_id: str = None):
+        """Сброс сессии (или всего кэша) с предварительной записью изменений"""
+        self.flush(session_id)
+        with self._lock:
+            for sid in (list(self._entries) if session_id is None else [session_id]):
+                self._drop(sid)
+
+    # === Фоновая запись ===
+
+    def _session_lock(self, session_id: str):
+        """Блокировка сессии менеджера (у SQLite ее нет - транзакции самой базы)"""
+        locks = getattr(self.manager, 'locks', None)
+        return locks.lock(session_id) if locks is not None else nullcontext()
+
+    def _write_entry(self, session_id: str) -> bool:
+        # Записи одной очередью: иначе более старый снимок мог бы лечь поверх нового.
+        # Блокировка сессии берется до очереди - в том же порядке, что и в transaction()
+        try:
+            with self._session_lock(session_id), self._write_lock:
+                return self._write_entry_locked(session_id)
+        except TimeoutError as e:
+            with self._lock:
+                entry = self._entries.get(session_id)
+                if entry is not None:
+                    entry.flush_at = time.monotonic() + max(self.flush_delay, 1.0)
+            logger.error(f"Сессия из кэша не записана: {e}", session_id=session_id)
+            return False
+
+    def _write_entry_locked(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or not entry.is_dirty:
+                return True
+            document = entry.pending
+            version = entry.version
+            disk_version = entry.disk_version
+            dirty = set(entry.dirty_fields)
+
+        # Запись идет без блокировки: новые сохранения в это время просто повысят версию
+        document, stored_version, merged = self._write_document(session_id, document, disk_version, dirty)
+
+        with self._lock:
+            if document is None:
+                entry.flush_at = time.monotonic() + max(self.flush_delay, 1.0)
+                logger.error(f"Не удалось записать сессию из кэша, повтор через {max(self.flush_delay, 1.0):.1f}с", session_id=session_id)
+                return False
+
+            self.stats['writes'] += 1
+            entry.snapshot = document
+            entry.disk_version = stored_version
+            if entry.version == version:
+                entry.flushed_version = version
+                entry.pending = None
+                entry.dirty_fields.clear()
+                if merged:
+                    # В памяти устаревшие поля: следующая загрузка возьмет объединенный документ
+                    self._drop(session_id, stale=True)
+            return True
+
+    def _write_document(self, session_id: str, document: Dict[str, Any], disk_version: int,
+                        dirty: Set[str]):
+        """
+        Запись документа с проверкой версии
+        При конфликте измененные в кэше поля накладываются на свежий документ с диска
+        Возвращает (записанный документ или None при ошибке, версия на диске, было ли слияние)
+        """
+        write = getattr(self.manager, 'write_document', None)
+        if write is None:
+            # Хранилище без версий документов (SQLite) - просто запись
+            return (document if self.manager.save_document(document) else None), disk_version, False
+
+        merged = False
+        for attempt in range(STORAGE.conflict_retries + 1):
+            try:
+                stored = write({**document, 'version': disk_version})
+                return document, stored.get('version', disk_version), merged
+            except SessionConflictError as e:
+                self.stats['conflicts'] += 1
+                logger.warning(f"{e.message}, изменения кэша накладываются на свежую версию", session_id=session_id)
+                fresh = self.manager.load_session(session_id)
+                if fresh is None:
+                    return None, disk_version, merged
+                fresh_document = fresh.to_dict()
+                document = {
+                    **fresh_document,
+                    **{key: document[key] for key in dirty if key in document},
+                    'question_table': {**fresh_document.get('question_table', {}), **document.get('question_table', {})}
+                }
+                disk_version = fresh.version
+                merged = True
+            except Exception as e:
+                logger.error(f"Ошибка записи сессии из кэша: {e}", session_id=session_id)
+                return None, disk_version, merged
+
+        return None, disk_version, merged
+
+    def _flush_loop(self):
+        while True:
+            with self._wakeup:
+                if self._closed:
+                    return
+
+                now = time.monotonic()
+                due = [sid for sid, entry in self._entries.items() if entry.is_dirty and entry.flush_at <= now]
+                if not due:
+                    deadlines = [entry.flush_at for entry in self._entries.values() if entry.is_dirty]
+                    timeout = (min(deadlines) - now) if deadlines else None
+                    self._wakeup.wait(timeout)
+                    continue
+
+            for session_id in due:
+                try:
+                    self._write_entry(session_id)
+                except Exception as e:
+                    logger.error(f"Ошибка фоновой записи сессии: {e}", session_id=session_id)
+
+    def _new_entry(self, session_id: str, document: Dict[str, Any], disk_version: int) -> _CacheEntry:
+        """
+        Новая запись кэша (вызывается под self._lock)
+        Версия в кэше продолжает версию вытесненной записи: копии, выданные до
+        вытеснения, остаются действительными, только если сессия на диске не менялась
+        """
+        tag = disk_version
+        remembered = self._tags.pop(session_id, None)
+        if remembered is not None:
+            remembered_disk_version, remembered_tag = remembered
+            tag = remembered_tag if remembered_disk_version == disk_version else max(disk_version, remembered_tag + 1)
+
+        entry = _CacheEntry(snapshot=document, disk_version=disk_version, tag=tag)
+        self._entries[session_id] = entry
+        self._evict()
+        return entry
+
+    def _drop(self, session_id: str, stale: bool = False):
+        """Удаление записи из кэша с запоминанием версии (stale - выданные копии устарели)"""
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._tags[session_id] = (entry.disk_version, entry.tag + 1 if stale else entry.tag)
+
+    def _evict(self):
+        """Вытеснение самых старых записанных сессий сверх емкости"""
+        overflow = len(self._entries) - self.capacity
+        if overflow <= 0:
+            return
+
+        # Последняя запись только что использована - она не вытесняется
+        for session_id in list(self._entries)[:-1]:
+            if overflow <= 0:
+                break
+            if not self._entries[session_id].is_dirty:
+                self._drop(session_id)
+                overflow -= 1
+
+    # === Интерфейс менеджера сессий ===
+
+    def create_session(self) -> str:
+        """Создание новой сессии"""
+        return self.manager.create_session()
+
+    def update_step(self, session_id: str, step: SessionStep) -> bool:
+        """Обновление текущего шага"""
+        session_data = self.load_session(session_id)
+        if not session_data:
+            return False
+
+        session_data.current_step = step
+        return self.save_session(session_data)
+
+    def add_iteration(self, session_id: str, iteration_data: Dict[str, Any]) -> bool:
+        """Добавление новой итерации"""
+        session_data = self.load_session(session_id)
+        if not session_data:
+            return False
+
+        session_data.add_iteration(iteration_data)
+        return self.save_session(session_data)
+
+    def add_validation(self, session_id: str, validation_data: Dict[str, Any]) -> bool:
+        """Добавление записи валидации"""
+        session_data = self.load_session(session_id)
+        if not session_data:
+            return False
+
+        session_data.add_validation(validation_data)
+        return self.save_session(session_data)
+
+    def complete_session(self, session_id: str, final_result: str) -> bool:
+        """Завершение сессии"""
+        session_data = self.load_session(session_id)
+        if not session_data:
+            return False
+
+        session_data.complete(final_result)
+        return self.save_session(session_data)
+
+    def get_all_sessions(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        """Список сессий - после записи отложенных изменений"""
+        self.flush()
+        return self.manager.get_all_sessions(*args, **kwargs)
+
+    def search(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        """Поиск сессий - после записи отложенных изменений"""
+        self.flush()
+        return self.manager.search(*args, **kwargs)
+
+    def delete_session(self, session_id: str) -> bool:
+        """Удаление сессии вместе с несохраненными изменениями"""
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._tags.pop(session_id, None)
+        return self.manager.delete_session(session_id)
+
+    def get_session_statistics(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self.flush(session_id)
+        return self.manager.get_session_statistics(session_id)
+
+    def cleanup_old_sessions(self, days_old: int = 30) -> int:
+        self.invalidate()
+        return self.manager.cleanup_old_sessions(days_old)
+
+    def export_session(self, session_id: str, export_path: str) -> bool:
+        self.flush(session_id)
+        return self.manager.export_session(session_id, export_path)
+
+    def archive_old_sessions(self, days_old: int = None) -> int:
+        self.invalidate()
+        return self.manager.archive_old_sessions(days_old)
+
+    def export_sessions(self, *args, **kwargs) -> int:
+        self.flush()
+        return self.manager.export_sessions(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        # Остальные методы (import_session, migrate_from_directory, ...) - напрямую менеджеру
+        if name == 'manager':
+            raise AttributeError(name)
+        return getattr(self.manager, name)
@@ -0,0 +1,285 @@
+"""
+Манифест сессий - небольшой индекс с краткими сводками
+
+Сайдбару нужны только превью идеи, статус и шаг, поэтому список сессий
+строится по манифесту, а не по полным файлам.
+
+Манифест - снимок sessions/.index/manifest.json и журнал изменений
+manifest.log: сохранение сессии дописывает в журнал одну строку, а не
+перезаписывает весь манифест; журнал периодически сворачивается в снимок.
+Один раз за запуск манифест сверяется с mtime/размером файлов: перечитываются
+только измененные в обход менеджера файлы. Дальше список строится из памяти.
+"""
+
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Any, Iterable, List, Optional
+
+import json_backend
+from config import STORAGE
+from file_lock import FileLock
+from logger import logger
+from session_layout import SessionLayout, SNAPSHOT_SUFFIX, JOURNAL_SUFFIX
+
+
+MANIFEST_VERSION = 1
+
+IDEA_PREVIEW_LENGTH = 100
+
+# Служебные поля записи манифеста, не попадающие в сводку
+_SIGNATURE_KEYS = ('mtime_ns', 'size', 'journal_mtime_ns', 'journal_size')
+
+# Допустимые ключи сортировки списка сессий
+SORT_KEYS = ('created_at', 'updated_at', 'status', 'current_step', 'iteration_count')
+
+
+def idea_preview(user_idea: str) -> str:
+    """Обрезка длинной идеи для отображения в списке сессий"""
+    if len(user_idea) > IDEA_PREVIEW_LENGTH:
+        return user_idea[:IDEA_PREVIEW_LENGTH] + '...'
+    return user_idea
+
+
+def summarize_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Краткая сводка сессии из сериализованного документа"""
+    return {
+        'session_id': document.get('session_id', ''),
+        'created_at': document.get('created_at', ''),
+        'updated_at': document.get('updated_at', ''),
+        'status': document.get('status', 'active'),
+        'user_idea': idea_preview(document.get('user_idea', '')),
+        'iteration_count': document.get('iteration_count', 0),
+        'current_step': document.get('current_step', 'input_idea')
+    }
+
+
+class SessionManifest:
+    """Индекс сводок сессий, хранится в sessions/.index/manifest.json"""
+
+    def __init__(self, sessions_dir: Path, load_document: Callable[[str], Optional[Dict[str, Any]]] = None,
+                 layout: SessionLayout = None):
+        self.sessions_dir = Path(sessions_dir)
+        self.layout = layout or SessionLayout(self.sessions_dir)
+        # Загрузчик документа по ID (с учетом журнала событий); по умолчанию - чтение JSON файла
+        self.load_document = load_document or self._read_snapshot
+        self.index_dir = self.sessions_dir / STORAGE.index_dirname
+        self.path = self.index_dir / "manifest.json"
+        self.log_path = self.index_dir / "manifest.log"
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._log_lines = 0
+        self._refreshed = False
+        self._lock = threading.RLock()
+
+    def _file_lock(self) -> FileLock:
+        # Дописывание и свертка журнала - под межпроцессной блокировкой папки индекса
+        return FileLock(self.index_dir / '.manifest.lock', STORAGE.lock_timeout)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            with self._file_lock():
+                self._entries = self._read_disk()
+            if self._log_lines > len(self._entries) + 100:
+                self.compact()
+        return self._entries
+
+    def _read_disk(self) -> Dict[str, Dict[str, Any]]:
+        """Снимок манифеста с примененным журналом изменений (последняя запись побеждает)"""
+        entries: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                data = json_backend.load_file(self.path)
+                if data.get('version') == MANIFEST_VERSION:
+                    entries = data.get('sessions', {})
+            except (ValueError, OSError) as e:
+                logger.warning(f"Манифест сессий поврежден, будет перестроен: {e}")
+
+        self._log_lines = 0
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return entries
+
+        with f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json_backend.loads(line)
+                except ValueError:
+                    # Строка, оборванная при сбое записи
+                    continue
+                self._log_lines += 1
+                session_id = entry.pop('id')
+                if entry.get('deleted'):
+                    entries.pop(session_id, None)
+                else:
+                    entries[session_id] = entry
+        return entries
+
+    def _append_log(self, *entries: Dict[str, Any]):
+        with self._file_lock():
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, 'ab') as f:
+                f.write(b''.join(json_backend.backend.dumps_bytes(entry) + b'\n' for entry in entries))
+            self._log_lines += len(entries)
+            if self._log_lines > len(self._entries) + 100:
+                self._compact_locked()
+
+    def compact(self):
+        """Свертка журнала изменений в снимок манифеста"""
+        with self._lock, self._file_lock():
+            self._compact_locked()
+
+    def _compact_locked(self):
+        # Снимок строится по файлам, а не по памяти: журнал могли дописать другие процессы.
+        # Все изменения этого процесса к этому моменту уже в журнале
+        self._entries = self._read_disk()
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        json_backend.dump_file(
+            {'version': MANIFEST_VERSION, 'sessions': self._entries},
+            self.path,
+            atomic=True
+        )
+        self.log_path.unlink(missing_ok=True)
+        self._log_lines = 0
+
+    def _read_snapshot(self, session_id: str) -> Optional[Dict[str, Any]]:
+        path = self.layout.find(session_id, SNAPSHOT_SUFFIX)
+        return json_backend.load_file(path) if path is not None else None
+
+    def _file_signature(self, session_id: str) -> Optional[Dict[str, int]]:
+        """Отпечаток файлов сессии: снимок и (если есть) журнал событий"""
+        try:
+            stat = self.layout.find(session_id, SNAPSHOT_SUFFIX).stat()
+        except (OSError, AttributeError):
+            return None
+
+        signature = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+        journal_path = self.layout.find(session_id, JOURNAL_SUFFIX)
+        if journal_path is not None:
+            try:
+                journal_stat = journal_path.stat()
+                signature['journal_mtime_ns'] = journal_stat.st_mtime_ns
+                signature['journal_size'] = journal_stat.st_size
+            except OSError:
+                pass
+        return signature
+
+    def update(self, document: Dict[str, Any]):
+        """Обновление сводки после сохранения сессии"""
+        signature = self._file_signature(document['session_id'])
+        if signature is None:
+            return
+
+        with self._lock:
+            entries = self._load()
+            entry = entries[document['session_id']] = {**summarize_document(document), **signature}
+            self._append_log({'id': document['session_id'], **entry})
+
+    def update_many(self, documents: Iterable[Dict[str, Any]]):
+        """Обновление сводок пачки сессий одной записью в журнал"""
+        with self._lock:
+            entries = self._load()
+            changes = []
+            for document in documents:
+                signature = self._file_signature(document['session_id'])
+                if signature is not None:
+                    entry = entries[document['session_id']] = {**summarize_document(document), **signature}
+                    changes.append({'id': document['session_id'], **entry})
+            if changes:
+                self._append_log(*changes)
+
+    def remove(self, session_id: str):
+        """Удаление сводки"""
+        with self._lock:
+            entries = self._load()
+            if entries.pop(session_id, None) is not None:
+                self._append_log({'id': session_id, 'deleted': True})
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Сверка манифеста с файлами сессий
+        Стоимость - один параллельный обход шардов; перечитываются только новые и измененные сессии
+        """
+        with self._lock:
+            entries = self._load()
+            self._refreshed = True
+            signatures: Dict[str, Dict[str, int]] = {}
+
+            for session_id, files in self.layout.session_files().items():
+                if SNAPSHOT_SUFFIX not in files:
+                    continue
+                stat = files[SNAPSHOT_SUFFIX][0]
+                signature = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+                if JOURNAL_SUFFIX in files:
+                    journal_stat = files[JOURNAL_SUFFIX][0]
+                    signature['journal_mtime_ns'] = journal_stat.st_mtime_ns
+                    signature['journal_size'] = journal_stat.st_size
+                signatures[session_id] = signature
+
+            changes = []
+            for session_id, signature in signatures.items():
+                cached = entries.get(session_id)
+                if cached and all(cached.get(key) == value for key, value in signature.items()) \
+                        and ('journal_size' in cached) == ('journal_size' in signature):
+                    continue
+
+                try:
+                    document = self.load_document(session_id)
+                except (ValueError, OSError) as e:
+                    logger.warning(f"Не удалось прочитать сессию {session_id} для манифеста: {e}")
+                    continue
+                if document is None:
+                    continue
+
+                document['session_id'] = session_id
+                entry = entries[session_id] = {**summarize_document(document), **signature}
+                changes.append({'id': session_id, **entry})
+
+            for session_id in [sid for sid in entries if sid not in signatures]:
+                del entries[session_id]
+                changes.append({'id': session_id, 'deleted': True})
+
+            if changes:
+                self._append_log(*changes)
+                if len(changes) > 100:
+                    self.compact()
+
+            return self._entries
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Сводка одной сессии (без сверки с файлами)"""
+        with self._lock:
+            entry = self._load().get(session_id)
+            if entry is None:
+                return None
+            return {key: value for key, value in entry.items() if key not in _SIGNATURE_KEYS}
+
+    def list(self, offset: int = 0, limit: int = None, sort_by: str = 'created_at',
+             descending: bool = True, status: str = None,
+             extra: Iterable[Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
+        """
+        Страница сводок сессий
+        extra - сводки сессий вне папки (например, из архива), участвуют в сортировке наравне
+        С файлами манифест сверяется только при первом вызове; затем - по сохранениям менеджера
+        """
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Неизвестный ключ сортировки: {sort_by}")
+
+        with self._lock:
+            entries = self._load() if self._refreshed else self.refresh()
+            entries = dict(entries)
+        summaries = [
+            {key: value for key, value in entry.items() if key not in _SIGNATURE_KEYS}
+            for entry in entries.values()
+            if status is None or entry.get('status') == status
+        ]
+        summaries.extend(
+            summary for summary in extra
+            if summary['session_id'] not in entries and (status is None or summary.get('status') == status)
+        )
+        summaries.sort(key=lambda x: x[sort_by], reverse=descending)
+
+        end = offset + limit if limit is not None else None
+        return summaries[offset:end]
@@ -0,0 +1,353 @@
+"""
+Журнал событий сессии (event sourcing)
+
+Вместо перезаписи всего документа каждое изменение дописывается строкой
+в {id}.journal рядом со снимком: смена шага, отправка ответов, добавление итерации,
+валидации, завершение. Документ сессии в {id}.json становится
+снимком, помеченным номером последнего вошедшего в него события (version).
+Загрузка = снимок + проигрывание хвоста журнала. Периодически журнал
+сворачивается в новый снимок.
+
+Запись события - O(размер изменения): сохранение полного документа пишет
+только изменившиеся поля, а в словарях (ответы, таблица вопросов) и списках
+(итерации, заданные вопросы) - только измененные ключи и дописанные элементы.
+Поле целиком записывается, лишь если поэлементное изменение не короче. Оборванная при сбое последняя строка
+просто пропускается при проигрывании, поэтому документ никогда не бывает
+записан наполовину.
+
+Запись идет под межпроцессной блокировкой сессии, поэтому номера событий
+не пересекаются, даже если с папкой работают несколько процессов.
+Состояние в памяти сверяется с отпечатком файлов (inode, mtime, размер)
+и перечитывается, если сессию изменил другой процесс.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+import json_backend
+from config import SessionStep, STORAGE
+from exceptions import SessionConflictError
+from file_lock import SessionLocks
+from logger import logger
+from session_layout import SessionLayout, SNAPSHOT_SUFFIX, JOURNAL_SUFFIX
+
+
+# Типы событий
+STEP_CHANGED = 'step_changed'
+FIELDS_UPDATED = 'fields_updated'
+FIELDS_PATCHED = 'fields_patched'
+ITERATION_ADDED = 'iteration_added'
+VALIDATION_ADDED = 'validation_added'
+SESSION_COMPLETED = 'session_completed'
+
+# Служебный ключ снимка: номер последнего примененного события (он же версия документа)
+SEQ_KEY = 'version'
+
+# Имя ключа в снимках, записанных до появления версий
+_LEGACY_SEQ_KEY = 'journal_seq'
+
+# Попыток согласованного чтения, пока другой процесс пишет ту же сессию
+READ_RETRIES = 3
+
+# Поля, изменение которых само по себе не требует записи события
+_VOLATILE_FIELDS = ('updated_at', SEQ_KEY)
+
+
+def apply_event(document: Dict[str, Any], event: Dict[str, Any]):
+    """Применение события журнала к документу сессии"""
+    event_type = event['type']
+    data = event.get('data', {})
+
+    if event_type == STEP_CHANGED:
+        document['current_step'] = data['current_step']
+    elif event_type == FIELDS_UPDATED:
+        document.update(data['fields'])
+    elif event_type == FIELDS_PATCHED:
+        document.update(data.get('fields', {}))
+        for key, entries in data.get('entries', {}).items():
+            document.setdefault(key, {}).update(entries)
+        for key, removed in data.get('removed', {}).items():
+            for entry_key in removed:
+                document.get(key, {}).pop(entry_key, None)
+        for key, items in data.get('appended', {}).items():
+            document.setdefault(key, []).extend(items)
+    elif event_type == ITERATION_ADDED:
+        document.setdefault('all_iterations', []).append(data['iteration'])
+        document['iteration_count'] = data['iteration'].get('iteration', document.get('iteration_count', 0) + 1)
+    elif event_type == VALIDATION_ADDED:
+        document.setdefault('validation_history', []).append(data['record'])
+    elif event_type == SESSION_COMPLETED:
+        document['status'] = 'completed'
+        document['final_result'] = data['final_result']
+        document['current_step'] = SessionStep.COMPLETED.value
+    else:
+        logger.warning(f"Неизвестный тип события журнала: {event_type}")
+        return
+
+    document['updated_at'] = event['ts']
+    document[SEQ_KEY] = event['seq']
+
+
+def diff_fields(current: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Данные события для изменившихся полей: словари - измененными и удаленными ключами,
+    списки с дописанным хвостом - новыми элементами, остальное - значением целиком
+    """
+    patch: Dict[str, Dict[str, Any]] = {}
+    for key, value in fields.items():
+        old = current.get(key)
+        if isinstance(old, dict) and isinstance(value, dict):
+            entries = {k: v for k, v in value.items() if k not in old or old[k] != v}
+            removed = [k for k in old if k not in value]
+            if len(entries) + len(removed) < len(value):
+                if entries:
+                    patch.setdefault('entries', {})[key] = entries
+                if removed:
+                    patch.setdefault('removed', {})[key] = removed
+                continue
+        elif isinstance(old, list) and isinstance(value, list) \
+                and len(old) < len(value) and value[:len(old)] == old:
+            patch.setdefault('appended', {})[key] = value[len(old):]
+            continue
+        patch.setdefault('fields', {})[key] = value
+    return patch
+
+
+class SessionJournal:
+    """Журналы событий для сессий в папке sessions/"""
+
+    def __init__(self, sessions_dir: Path, compact_every: int = None, mirror_size: int = 64,
+                 layout: SessionLayout = None, locks: SessionLocks = None):
+        self.sessions_dir = Path(sessions_dir)
+        self.layout = layout or SessionLayout(self.sessions_dir)
+        self.locks = locks or SessionLocks(self.sessions_dir / STORAGE.lock_dirname)
+        self.compact_every = compact_every or STORAGE.journal_compact_every
+
+        # Последнее известное состояние документов и отпечаток файлов, с которых оно прочитано
+        self._mirror: "OrderedDict[str, Tuple[Dict[str, Any], Tuple]]" = OrderedDict()
+        self._mirror_size = mirror_size
+        self._events_since_snapshot: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def snapshot_path(self, session_id: str) -> Optional[Path]:
+        """Существующий снимок сессии (в текущей или старой раскладке)"""
+        return self.layout.find(session_id, SNAPSHOT_SUFFIX)
+
+    def journal_path(self, session_id: str) -> Path:
+        """Существующий журнал сессии, иначе - место нового журнала"""
+        return self.layout.find(session_id, JOURNAL_SUFFIX) or self.layout.path_for(session_id, JOURNAL_SUFFIX)
+
+    # === Чтение ===
+
+    def load_document(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Снимок + проигрывание хвоста журнала (возвращается независимая копия)"""
+        with self._lock:
+            document = self._current(session_id)
+            return _copy_document(document) if document is not None else None
+
+    def _signature(self, session_id: str) -> Tuple:
+        """Отпечаток файлов сессии: меняется при любой записи снимка или события"""
+        signature = []
+        for suffix in (SNAPSHOT_SUFFIX, JOURNAL_SUFFIX):
+            path = self.layout.find(session_id, suffix)
+            try:
+                stat = path.stat() if path is not None else None
+            except OSError:
+                stat = None
+            signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size) if stat else None)
+        return tuple(signature)
+
+    def _current(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Актуальный документ из зеркала (без копирования, только для чтения)
+        Зеркало перечитывается, если файлы изменил другой процесс. Чтение оптимистичное:
+        если файлы изменились во время чтения, оно повторяется
+        """
+        signature = self._signature(session_id)
+        cached = self._mirror.get(session_id)
+        if cached is not None and cached[1] == signature:
+            self._mirror.move_to_end(session_id)
+            return cached[0]
+
+        for _ in range(READ_RETRIES):
+            snapshot_path = self.snapshot_path(session_id)
+            if snapshot_path is None:
+                self.forget(session_id)
+                return None
+
+            document = json_backend.load_file(snapshot_path)
+            if _LEGACY_SEQ_KEY in document:
+                document.setdefault(SEQ_KEY, document.pop(_LEGACY_SEQ_KEY))
+            replayed = self._replay(session_id, document)
+
+            current_signature = self._signature(session_id)
+            if current_signature == signature:
+                self._events_since_snapshot[session_id] = replayed
+                self._remember(session_id, document, signature)
+                return document
+            signature = current_signature
+
+        # Сессию непрерывно пишет другой процесс: отдаем прочитанное, но не запоминаем
+        logger.debug("Сессия меняется во время чтения, состояние не закэшировано", session_id=session_id)
+        return document
+
+    def _replay(self, session_id: str, document: Dict[str, Any]) -> int:
+        journal_path = self.journal_path(session_id)
+        if not journal_path.exists():
+            return 0
+
+        applied_seq = document.get(SEQ_KEY, 0)
+        replayed = 0
+        with open(journal_path, 'rb') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event = json_backend.loads(line)
+                except ValueError:
+                    # Строка, оборванная при сбое записи
+                    logger.warning(f"Пропущена поврежденная строка журнала {journal_path.name}:{line_number}")
+                    continue
+
+                if event.get('seq', 0) <= applied_seq:
+                    continue
+                apply_event(document, event)
+                applied_seq = event['seq']
+                replayed += 1
+
+        return replayed
+
+    def _remember(self, session_id: str, document: Dict[str, Any], signature: Tuple = None):
+        if signature is None:
+            signature = self._signature(session_id)
+        self._mirror[session_id] = (document, signature)
+        self._mirror.move_to_end(session_id)
+        while len(self._mirror) > self._mirror_size:
+            self._mirror.popitem(last=False)
+
+    # === Запись ===
+
+    def append(self, session_id: str, event_type: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Дописывание события в журнал
+        Возвращает актуальный документ (только для чтения) или None, если сессии нет
+        """
+        with self.locks.lock(session_id), self._lock:
+            document = self._current(session_id)
+            if document is None:
+                return None
+
+            event = {
+                'seq': document.get(SEQ_KEY, 0) + 1,
+                'ts': datetime.now().isoformat(),
+                'type': event_type,
+                'data': data
+            }
+            self._write_event(session_id, event)
+
+            apply_event(document, event)
+            self._remember(session_id, document)
+            self._events_since_snapshot[session_id] = self._events_since_snapshot.get(session_id, 0) + 1
+
+            if self._events_since_snapshot[session_id] >= self.compact_every:
+                self.compact(session_id)
+
+            return document
+
+    def record(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Сохранение полного документа: для новой сессии - снимок,
+        для существующей - событие только с изменившимися полями
+        Если в документе есть version и она отстала от текущей - SessionConflictError
+        Возвращает актуальный документ (только для чтения)
+        """
+        session_id = document['session_id']
+        with self.locks.lock(session_id), self._lock:
+            current = self._current(session_id)
+            if current is None:
+                snapshot = _copy_document(document)
+                snapshot[SEQ_KEY] = 0
+                self._write_snapshot(session_id, snapshot)
+                return snapshot
+
+            expected = document.get(SEQ_KEY)
+            actual = current.get(SEQ_KEY, 0)
+            if expected is not None and expected != actual:
+                raise SessionConflictError(session_id, expected, actual)
+
+            fields = {
+                key: value for key, value in document.items()
+                if key not in _VOLATILE_FIELDS and current.get(key) != value
+            }
+            if not fields:
+                return current
+
+            patch = diff_fields(current, fields)
+            if 'fields' in patch and len(patch) == 1:
+                return self.append(session_id, FIELDS_UPDATED, {'fields': _copy_document(fields)})
+            return self.append(session_id, FIELDS_PATCHED, _copy_document(patch))
+
+    def _write_event(self, session_id: str, event: Dict[str, Any]):
+        line = json_backend.backend.dumps_bytes(event) + b'\n'
+        journal_path = self.journal_path(session_id)
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(journal_path, 'ab') as f:
+            # Если предыдущая запись оборвалась без перевода строки - начинаем с новой строки
+            if f.tell() > 0:
+                with open(journal_path, 'rb') as tail:
+                    tail.seek(-1, os.SEEK_END)
+                    if tail.read(1) != b'\n':
+                        line = b'\n' + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, session_id: str, document: Dict[str, Any]):
+        json_backend.dump_file(document, self.layout.write_path(session_id, SNAPSHOT_SUFFIX),
+                               pretty=STORAGE.pretty_json, atomic=True)
+        self.layout.discard_legacy(session_id, SNAPSHOT_SUFFIX)
+        self._events_since_snapshot[session_id] = 0
+        self._remember(session_id, document)
+
+    def compact(self, session_id: str):
+        """
+        Свертка журнала в новый снимок
+        Сбой между записью снимка и удалением журнала безопасен:
+        события с seq <= version при проигрывании пропускаются
+        """
+        with self.locks.lock(session_id), self._lock:
+            document = self._current(session_id)
+            if document is None:
+                return
+
+            self._write_snapshot(session_id, document)
+            self.layout.remove(session_id, JOURNAL_SUFFIX)
+            self._remember(session_id, document)
+            logger.debug("Журнал свернут в снимок (seq %d)", document.get(SEQ_KEY, 0), session_id=session_id)
+
+    def forget(self, session_id: str):
+        """Удаление состояния сессии из памяти"""
+        with self._lock:
+            self._mirror.pop(session_id, None)
+            self._events_since_snapshot.pop(session_id, None)
+
+    def delete(self, session_id: str):
+        """Удаление журнала сессии"""
+        with self.locks.lock(session_id):
+            self.forget(session_id)
+            self.layout.remove(session_id, JOURNAL_SUFFIX)
+
+
+def _copy_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Глубокая копия документа через JSON бэкенд (быстрее copy.deepcopy)
+    Зеркало журнала не должно разделять списки и словари с объектами вызывающего,
+    иначе их последующие мутации молча попадут в зеркало и потеряются в диффе
+    """
+    return json_backend.backend.loads(json_backend.backend.dumps_bytes(document))
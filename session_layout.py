@@ -0,0 +1,217 @@
+"""
+Шардированная раскладка файлов сессий
+
+Файлы сессии ({id}.json и {id}.journal) лежат не в одной папке sessions/,
+а в подпапках по префиксу ID: при глубине 2 - sessions/3f/a2/{id}.json.
+Так папки остаются небольшими, а листинг и создание файлов - быстрыми.
+
+Переход со старой (плоской) раскладки или между глубинами выполняется
+онлайн: migrate() переносит файлы без остановки работы, а find() на время
+переноса ищет файл и в новом, и в старых местах. Каждая сессия переносится
+под ее блокировкой (SessionLocks), поэтому запись в журнал, начатая по старому
+пути, не может оказаться в файле, который уже заменен перенесенным.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import STORAGE
+from file_lock import SessionLocks
+from logger import logger
+
+
+SNAPSHOT_SUFFIX = '.json'
+JOURNAL_SUFFIX = '.journal'
+SESSION_SUFFIXES = (SNAPSHOT_SUFFIX, JOURNAL_SUFFIX)
+
+# Символов ID на один уровень шарда
+SHARD_WIDTH = 2
+
+# Максимальная глубина, которую find() проверяет на время миграции
+MAX_SHARD_DEPTH = 3
+
+_SHARD_RE = re.compile(r'^[0-9a-f]{%d}$' % SHARD_WIDTH)
+
+# Потоков для параллельного обхода шардов
+SCAN_WORKERS = 8
+
+
+class SessionLayout:
+    """Пути к файлам сессий в шардированной папке"""
+
+    def __init__(self, root: Path, depth: int = None, locks: SessionLocks = None):
+        self.root = Path(root)
+        self.depth = STORAGE.shard_depth if depth is None else depth
+        # Блокировки сессий для миграции (по умолчанию - в папке сессий, создаются при первом переносе)
+        self.locks = locks
+
+    def _shard_dir(self, session_id: str, depth: int) -> Path:
+        key = session_id.replace('-', '').lower()
+        directory = self.root
+        for level in range(depth):
+            directory = directory / key[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+        return directory
+
+    def path_for(self, session_id: str, suffix: str = SNAPSHOT_SUFFIX) -> Path:
+        """Место файла сессии в текущей раскладке"""
+        return self._shard_dir(session_id, self.depth) / f"{session_id}{suffix}"
+
+    def find(self, session_id: str, suffix: str = SNAPSHOT_SUFFIX) -> Optional[Path]:
+        """
+        Существующий файл сессии: сначала в текущей раскладке, затем в старых
+        Текущее место проверяется повторно - файл мог быть перенесен между проверками
+        """
+        target = self.path_for(session_id, suffix)
+        if target.exists():
+            return target
+
+        for depth in range(MAX_SHARD_DEPTH + 1):
+            if depth == self.depth:
+                continue
+            legacy = self._shard_dir(session_id, depth) / f"{session_id}{suffix}"
+            if legacy.exists():
+                return legacy
+
+        return target if target.exists() else None
+
+    def write_path(self, session_id: str, suffix: str = SNAPSHOT_SUFFIX) -> Path:
+        """Путь для записи в текущей раскладке (папка шарда создается при необходимости)"""
+        path = self.path_for(session_id, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def discard_legacy(self, session_id: str, suffix: str = SNAPSHOT_SUFFIX):
+        """Удаление устаревших копий файла вне текущей раскладки"""
+        for depth in range(MAX_SHARD_DEPTH + 1):
+            if depth == self.depth:
+                continue
+            legacy = self._shard_dir(session_id, depth) / f"{session_id}{suffix}"
+            try:
+                legacy.unlink()
+            except FileNotFoundError:
+                pass
+
+    def remove(self, session_id: str, suffix: str = SNAPSHOT_SUFFIX) -> bool:
+        """Удаление файла сессии во всех раскладках"""
+        removed = False
+        for depth in range(MAX_SHARD_DEPTH + 1):
+            path = self._shard_dir(session_id, depth) / f"{session_id}{suffix}"
+            try:
+                path.unlink()
+                removed = True
+            except FileNotFoundError:
+                pass
+        return removed
+
+    # === Обход ===
+
+    def _scan_dir(self, directory: Path, depth: int) -> List[Tuple[str, str, os.stat_result, Path]]:
+        """Файлы сессий в папке и ее шардах до оставшейся глубины"""
+        found = []
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            return found
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if depth > 0 and _SHARD_RE.match(entry.name):
+                    found.extend(self._scan_dir(Path(entry.path), depth - 1))
+                continue
+            for suffix in SESSION_SUFFIXES:
+                if entry.name.endswith(suffix) and not entry.name.startswith('.'):
+                    found.append((entry.name[:-len(suffix)], suffix, entry.stat(), Path(entry.path)))
+                    break
+        return found
+
+    def scan(self) -> Iterator[Tuple[str, str, os.stat_result, Path]]:
+        """
+        Все файлы сессий во всех раскладках: (session_id, суффикс, stat, путь)
+        Шарды верхнего уровня обходятся параллельно
+        """
+        depth = max(self.depth, MAX_SHARD_DEPTH)
+        top_level = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False) and _SHARD_RE.match(entry.name):
+                    top_level.append(Path(entry.path))
+
+        # Файлы в корне (плоская раскладка) - без рекурсии
+        yield from self._scan_dir(self.root, 0)
+
+        if not top_level:
+            return
+        with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(top_level))) as pool:
+            for found in pool.map(lambda directory: self._scan_dir(directory, depth - 1), top_level):
+                yield from found
+
+    def session_files(self) -> Dict[str, Dict[str, Tuple[os.stat_result, Path]]]:
+        """Файлы сессий, сгруппированные по ID: {id: {суффикс: (stat, путь)}}"""
+        files: Dict[str, Dict[str, Tuple[os.stat_result, Path]]] = {}
+        for session_id, suffix, stat, path in self.scan():
+            current = files.setdefault(session_id, {}).get(suffix)
+            # Во время миграции файл может встретиться дважды - побеждает текущая раскладка
+            if current is None or path == self.path_for(session_id, suffix):
+                files[session_id][suffix] = (stat, path)
+        return files
+
+    # === Миграция ===
+
+    def migrate(self, limit: int = None) -> int:
+        """
+        Перенос файлов из старых раскладок в текущую, не более limit файлов за вызов
+        Безопасен при одновременной работе менеджера: файлы сессии переносятся под ее блокировкой,
+        файл в новом месте никогда не перезаписывается
+        """
+        if self.locks is None:
+            self.locks = SessionLocks(self.root / STORAGE.lock_dirname)
+
+        moved = 0
+        for session_id, suffix, _, path in list(self.scan()):
+            target = self.path_for(session_id, suffix)
+            if path == target:
+                continue
+            if limit is not None and moved >= limit:
+                break
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                with self.locks.lock(session_id):
+                    # Пока ждали блокировку, файл мог перенести или удалить другой процесс
+                    if not path.exists():
+                        continue
+                    _move_no_clobber(path, target)
+                moved += 1
+            except OSError as e:
+                # Файл занят (например, открыт на Windows) - перенесем при следующем вызове
+                logger.warning(f"Не удалось перенести {path.name}: {e}")
+
+        if moved:
+            logger.debug(f"Перенесено файлов сессий в шарды: {moved}")
+        return moved
+
+    def needs_migration(self) -> bool:
+        """Есть ли файлы вне текущей раскладки"""
+        return any(path != self.path_for(session_id, suffix) for session_id, suffix, _, path in self.scan())
+
+
+def _move_no_clobber(source: Path, target: Path):
+    """
+    Перенос файла без перезаписи цели
+    Если цель уже есть, ее записал менеджер после начала миграции - она новее, источник удаляется
+    """
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        pass
+    except (AttributeError, NotImplementedError, PermissionError):
+        # Без жестких ссылок: os.rename на Windows сам не перезаписывает существующую цель
+        if target.exists():
+            source.unlink()
+            return
+        os.rename(source, target)
+        return
+    source.unlink()
@@ -1,12 +1,25 @@
+import gzip
+import lzma
 import os
-import json
+import threading
 import uuid
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 
+import json_backend
+from exceptions import SessionConflictError, SessionNotFoundError
+from file_lock import SessionLocks
 from models import SessionData, SessionIteration
-from config import SessionStep
+from session_index import SessionManifest, summarize_document
+from search_index import SearchIndex
+from session_archive import SessionArchive
+from session_layout import SessionLayout, SNAPSHOT_SUFFIX, JOURNAL_SUFFIX
+from session_journal import (
+    SessionJournal, STEP_CHANGED, ITERATION_ADDED, VALIDATION_ADDED, SESSION_COMPLETED
+)
+from config import SessionStep, STORAGE
 
 
 class SessionManager:
@@ -15,6 +28,32 @@ class SessionManager:
     def __init__(self, sessions_dir: str = "sessions"):
         self.sessions_dir = Path(sessions_dir)
         self.sessions_dir.mkdir(exist_ok=True)
+        # Межпроцессные блокировки: с папкой могут работать несколько процессов
+        self.locks = SessionLocks(self.sessions_dir / STORAGE.lock_dirname)
+        self.layout = SessionLayout(self.sessions_dir, locks=self.locks)
+        self.journal = SessionJournal(self.sessions_dir, layout=self.layout, locks=self.locks) \
+            if STORAGE.journal_enabled else None
+        # Версии файлов без журнала: session_id -> (отпечаток файла, версия)
+        self._versions: Dict[str, Tuple[Tuple[int, int, int], int]] = {}
+        self.manifest = SessionManifest(self.sessions_dir, self._load_document, layout=self.layout)
+        self.search_index = SearchIndex(self.sessions_dir / STORAGE.index_dirname / "search.jsonl")
+        self.archive = SessionArchive(self.sessions_dir / STORAGE.archive_dirname)
+        self._search_synced = False
+
+        if STORAGE.shard_migrate_on_start:
+            threading.Thread(target=self.migrate_layout, name="session-layout-migration", daemon=True).start()
+
+    def migrate_layout(self, batch_size: int = 500) -> int:
+        """
+        Онлайн перенос файлов сессий в текущую шардированную раскладку
+        Пока перенос идет, сессии ищутся и в старых местах
+        """
+        total = 0
+        while True:
+            moved = self.layout.migrate(limit=batch_size)
+            total += moved
+            if moved < batch_size:
+                return total
 
     def create_session(self) -> str:
         """Создание новой сессии"""
@@ -29,127 +68,301 @@ class SessionManager:
         self.save_session(session_data)
         return session_id
 
-    def load_session(self, session_id: str) -> Optional[SessionData]:
-        """Загрузка сессии"""
-        file_path = self.sessions_dir / f"{session_id}.json"
-        
-        if not file_path.exists():
+    def _load_document(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Документ сессии: снимок с проигранным журналом событий, иначе - из архива"""
+        document = self._load_hot_document(session_id)
+        if document is None:
+            document = self.archive.load_document(session_id)
+        return document
+
+    def _load_hot_document(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if self.journal is not None:
+            return self.journal.load_document(session_id)
+
+        file_path = self.layout.find(session_id)
+        if file_path is None:
             return None
+        return json_backend.load_file(file_path)
 
+    def load_session(self, session_id: str) -> Optional[SessionData]:
+        """Загрузка сессии"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return SessionData.from_dict(data)
-        except (json.JSONDecodeError, FileNotFoundError, KeyError) as e:
+            data = self._load_document(session_id)
+            if data is None:
+                return None
+            return SessionData.from_dict(data)
+        except (ValueError, FileNotFoundError, KeyError) as e:
             print(f"⚠️ Ошибка загрузки сессии {session_id}: {e}")
             return None
 
     def save_session(self, session_data: SessionData) -> bool:
-        """Сохранение сессии"""
+        """
+        Сохранение сессии
+        Если сессию изменили после загрузки (другой процесс или другой объект),
+        запись не выполняется и возвращается False; изменение без конфликтов - transaction
+        """
         session_data.updated_at = datetime.now()
-        file_path = self.sessions_dir / f"{session_data.session_id}.json"
-        
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(session_data.to_dict(), f, ensure_ascii=False, indent=2)
-            return True
+            stored = self.write_document(session_data.to_dict())
+        except SessionConflictError as e:
+            print(f"⚠️ Сессия не сохранена: {e.message}")
+            return False
         except Exception as e:
             print(f"⚠️ Ошибка сохранения сессии {session_data.session_id}: {e}")
             return False
 
+        session_data.version = stored.get('version', session_data.version)
+        return True
+
+    def save_document(self, document: Dict[str, Any]) -> bool:
+        """Запись уже сериализованного документа сессии (при конфликте версий - False)"""
+        try:
+            self.write_document(document)
+            return True
+        except SessionConflictError as e:
+            print(f"⚠️ Сессия не сохранена: {e.message}")
+            return False
+        except Exception as e:
+            print(f"⚠️ Ошибка сохранения сессии {document['session_id']}: {e}")
+            return False
+
+    def write_document(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Запись документа сессии под блокировкой сессии
+        С журналом дописывается только событие с изменившимися полями,
+        без журнала - запись во временный файл и атомарная замена
+        Если в документе есть version, она сверяется с текущей (оптимистичная блокировка)
+        Возвращает записанный документ с новой версией; ошибки не перехватываются
+        """
+        session_id = document['session_id']
+
+        with self.locks.lock(session_id):
+            if self.journal is not None:
+                document = self.journal.record(document)
+            else:
+                document = self._write_versioned(document)
+
+        self.manifest.update(document)
+        self.search_index.update(document)
+        # Измененная архивная сессия снова живет в папке сессий
+        if session_id in self.archive:
+            self.archive.delete(session_id)
+        return document
+
+    def _write_versioned(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Атомарная перезапись файла сессии с проверкой и увеличением версии (без журнала)"""
+        session_id = document['session_id']
+        actual = self._stored_version(session_id)
+        expected = document.get('version')
+        if actual is not None and expected is not None and expected != actual:
+            raise SessionConflictError(session_id, expected, actual)
+
+        document = {**document, 'version': 0 if actual is None else actual + 1}
+        file_path = self.layout.write_path(session_id)
+        json_backend.dump_file(document, file_path, pretty=STORAGE.pretty_json, atomic=True)
+        self.layout.discard_legacy(session_id)
+
+        stat = file_path.stat()
+        self._versions[session_id] = ((stat.st_ino, stat.st_mtime_ns, stat.st_size), document['version'])
+        return document
+
+    def _stored_version(self, session_id: str) -> Optional[int]:
+        """Версия файла сессии на диске (None - файла нет); файл читается, только если изменился"""
+        file_path = self.layout.find(session_id)
+        try:
+            stat = file_path.stat() if file_path is not None else None
+        except OSError:
+            stat = None
+        if stat is None:
+            self._versions.pop(session_id, None)
+            return None
+
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._versions.get(session_id)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        version = json_backend.load_file(file_path).get('version', 0)
+        self._versions[session_id] = (signature, version)
+        return version
+
+    @contextmanager
+    def transaction(self, session_id: str) -> Iterator[SessionData]:
+        """
+        Транзакция над сессией: все изменения внутри блока with - одной записью на диск
+
+            with manager.transaction(session_id) as session_data:
+                session_data.current_step = SessionStep.GENERATE_QUESTIONS
+                session_data.add_iteration({'refined_idea': ...})
+
+        С журналом записывается одно событие только с изменившимися полями.
+        Сессия заблокирована для других процессов и потоков на все время блока,
+        поэтому долгие операции (запросы к ИИ) выполняются до него.
+        При исключении в блоке ничего не записывается; нет сессии - SessionNotFoundError
+        """
+        with self.locks.lock(session_id):
+            session_data = self.load_session(session_id)
+            if session_data is None:
+                raise SessionNotFoundError(session_id)
+            before = session_data.to_dict()
+
+            yield session_data
+
+            document = session_data.to_dict()
+            if all(before.get(key) == value for key, value in document.items() if key != 'updated_at'):
+                return
+
+            session_data.updated_at = datetime.now()
+            document['updated_at'] = session_data.updated_at.isoformat()
+            stored = self.write_document(document)
+            session_data.version = stored.get('version', session_data.version)
+
+    def modify_session(self, session_id: str, mutate: Callable[[SessionData], None]) -> bool:
+        """Изменение сессии функцией mutate(session_data) в транзакции"""
+        try:
+            with self.transaction(session_id) as session_data:
+                mutate(session_data)
+            return True
+        except SessionNotFoundError:
+            return False
+        except Exception as e:
+            print(f"⚠️ Ошибка сохранения сессии {session_id}: {e}")
+            return False
+
+    def _append_event(self, session_id: str, event_type: str, data: Dict[str, Any]) -> bool:
+        """
+        Дописывание события в журнал без загрузки и перезаписи всей сессии
+        Архивная сессия сначала возвращается в папку сессий, как при save_session
+        """
+        try:
+            with self.locks.lock(session_id):
+                if not self._ensure_hot(session_id):
+                    return False
+                document = self.journal.append(session_id, event_type, data)
+            if document is None:
+                return False
+            self.manifest.update(document)
+            self.search_index.update(document)
+            return True
+        except Exception as e:
+            print(f"⚠️ Ошибка записи события сессии {session_id}: {e}")
+            return False
+
+    def _ensure_hot(self, session_id: str) -> bool:
+        """Есть ли сессия в папке сессий; архивная сессия переносится туда из архива"""
+        if self._load_hot_document(session_id) is not None:
+            return True
+        document = self.archive.load_document(session_id)
+        if document is None:
+            return False
+        self.write_document(document)
+        return True
+
     def update_step(self, session_id: str, step: SessionStep) -> bool:
         """Обновление текущего шага"""
-        session_data = self.load_session(session_id)
-        if not session_data:
-            return False
+        if self.journal is not None:
+            return self._append_event(session_id, STEP_CHANGED, {'current_step': step.value})
+
+        def set_step(session_data: SessionData):
+            session_data.current_step = step
         
-        session_data.current_step = step
-        return self.save_session(session_data)
+        return self.modify_session(session_id, set_step)
 
     def add_iteration(self, session_id: str, iteration_data: Dict[str, Any]) -> bool:
         """Добавление новой итерации"""
-        session_data = self.load_session(session_id)
-        if not session_data:
-            return False
-        
-        session_data.iteration_count += 1
-        
-        iteration = SessionIteration(
-            iteration=session_data.iteration_count,
-            timestamp=datetime.now(),
-            refined_idea=iteration_data.get('refined_idea', ''),
-            feedback_type=iteration_data.get('feedback_type', ''),
-            comments=iteration_data.get('comments', '')
-        )
-        
-        session_data.all_iterations.append(iteration)
-        return self.save_session(session_data)
+        if self.journal is not None:
+            # Номер итерации и событие - под одной блокировкой, иначе параллельные итерации получат один номер
+            with self.locks.lock(session_id):
+                document = self._load_document(session_id)
+                if document is None:
+                    return False
+                
+                iteration = SessionIteration(
+                    iteration=document.get('iteration_count', 0) + 1,
+                    timestamp=datetime.now(),
+                    refined_idea=iteration_data.get('refined_idea', ''),
+                    feedback_type=iteration_data.get('feedback_type', ''),
+                    comments=iteration_data.get('comments', '')
+                )
+                return self._append_event(session_id, ITERATION_ADDED,
+                                          {'iteration': SessionData._serialize_iteration(iteration)})
+
+        return self.modify_session(session_id, lambda session_data: session_data.add_iteration(iteration_data))
 
     def add_validation(self, session_id: str, validation_data: Dict[str, Any]) -> bool:
         """Добавление записи валидации"""
-        session_data = self.load_session(session_id)
-        if not session_data:
-            return False
-        
-        validation_record = {
-            'timestamp': datetime.now().isoformat(),
-            **validation_data
-        }
-        
-        session_data.validation_history.append(validation_record)
-        return self.save_session(session_data)
+        if self.journal is not None:
+            validation_record = {
+                'timestamp': datetime.now().isoformat(),
+                **validation_data
+            }
+            return self._append_event(session_id, VALIDATION_ADDED, {'record': validation_record})
+
+        return self.modify_session(session_id, lambda session_data: session_data.add_validation(validation_data))
 
     def complete_session(self, session_id: str, final_result: str) -> bool:
         """Завершение сессии"""
-        session_data = self.load_session(session_id)
-        if not session_data:
-            return False
-        
-        session_data.status = 'completed'
-        session_data.final_result = final_result
-        session_data.current_step = SessionStep.COMPLETED
-        return self.save_session(session_data)
-
-    def get_all_sessions(self) -> List[Dict[str, Any]]:
-        """Получение списка всех сессий"""
-        sessions = []
-        
-        for file_path in self.sessions_dir.glob("*.json"):
-            session_id = file_path.stem
-            session_data = self.load_session(session_id)
-            
-            if session_data:
-                # Обрезаем длинные идеи для отображения
-                user_idea = session_data.user_idea
-                if len(user_idea) > 100:
-                    user_idea = user_idea[:100] + '...'
-                
-                sessions.append({
-                    'session_id': session_id,
-                    'created_at': session_data.created_at.isoformat(),
-                    'status': session_data.status,
-                    'user_idea': user_idea,
-                    'iteration_count': session_data.iteration_count,
-                    'current_step': session_data.current_step.value
-                })
-        
-        # Сортируем по дате создания (новые сначала)
-        sessions.sort(key=lambda x: x['created_at'], reverse=True)
-        return sessions
+        if self.journal is not None:
+            return self._append_event(session_id, SESSION_COMPLETED, {'final_result': final_result})
+
+        return self.modify_session(session_id, lambda session_data: session_data.complete(final_result))
+
+    def get_all_sessions(self, offset: int = 0, limit: int = None, sort_by: str = 'created_at',
+                         descending: bool = True, status: str = None) -> List[Dict[str, Any]]:
+        """
+        Получение списка сессий по манифесту (без разбора полных файлов)
+        Поддерживает постраничный вывод, сортировку и фильтр по статусу
+        """
+        return self.manifest.list(offset, limit, sort_by, descending, status, extra=self.archive.summaries())
+
+    def search(self, query: str, limit: int = 20, status: str = None) -> List[Dict[str, Any]]:
+        """
+        Полнотекстовый поиск сессий по идее, результату, вопросам и ответам
+        Возвращает сводки сессий (как get_all_sessions) с полем score, по убыванию релевантности
+        """
+        if not self._search_synced:
+            # Один раз за запуск подхватываем сессии, измененные без этого менеджера
+            updated = {summary['session_id']: summary.get('updated_at', '') for summary in self.archive.summaries()}
+            updated.update({session_id: entry.get('updated_at', '') for session_id, entry in self.manifest.refresh().items()})
+            self.search_index.sync(updated, self._load_document)
+            self._search_synced = True
+
+        results = []
+        for session_id, score in self.search_index.search(query, limit=None):
+            summary = self.manifest.get(session_id) or self.archive.summary(session_id)
+            if summary is None or (status is not None and summary['status'] != status):
+                continue
+            results.append({**summary, 'score': round(score, 3)})
+            if limit is not None and len(results) >= limit:
+                break
+        return results
 
     def delete_session(self, session_id: str) -> bool:
         """Удаление сессии"""
-        file_path = self.sessions_dir / f"{session_id}.json"
-        
         try:
-            if file_path.exists():
-                file_path.unlink()
+            if self._remove_files(session_id):
+                self.manifest.remove(session_id)
+                self.search_index.remove(session_id)
+                return True
+            if self.archive.delete(session_id):
+                self.search_index.remove(session_id)
                 return True
         except Exception as e:
             print(f"⚠️ Ошибка удаления сессии {session_id}: {e}")
         
         return False
 
+    def _remove_files(self, session_id: str) -> bool:
+        """Удаление снимка и журнала сессии под блокировкой; True, если снимок был"""
+        with self.locks.lock(session_id):
+            removed = self.layout.remove(session_id, SNAPSHOT_SUFFIX)
+            if self.journal is not None:
+                self.journal.delete(session_id)
+            else:
+                self.layout.remove(session_id, JOURNAL_SUFFIX)
+            self._versions.pop(session_id, None)
+            return removed
+
     def get_session_statistics(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Получение статистики сессии"""
         session_data = self.load_session(session_id)
@@ -175,16 +388,70 @@ class SessionManager:
         cutoff_date = datetime.now().timestamp() - (days_old * 24 * 60 * 60)
         deleted_count = 0
         
-        for file_path in self.sessions_dir.glob("*.json"):
-            if file_path.stat().st_mtime < cutoff_date:
+        for session_id, files in self.layout.session_files().items():
+            if SNAPSHOT_SUFFIX not in files:
+                continue
+            # Сессию с журналом последний раз меняли при дописывании события, а не при записи снимка
+            modified = max(stat.st_mtime for stat, _ in files.values())
+
+            if modified < cutoff_date:
                 try:
-                    file_path.unlink()
+                    self._remove_files(session_id)
+                    self.search_index.remove(session_id)
                     deleted_count += 1
                 except Exception as e:
-                    print(f"⚠️ Ошибка удаления старой сессии {file_path.name}: {e}")
+                    print(f"⚠️ Ошибка удаления старой сессии {session_id}: {e}")
         
         return deleted_count
 
+    def archive_old_sessions(self, days_old: int = None, batch_size: int = 50) -> int:
+        """
+        Перенос завершенных сессий, не менявшихся days_old дней, в сжатый архив
+        Сессии остаются доступны через load_session, список и поиск
+        """
+        days_old = STORAGE.archive_after_days if days_old is None else days_old
+        cutoff = (datetime.now() - timedelta(days=days_old)).isoformat()
+        candidates = [
+            summary['session_id'] for summary in self.manifest.list(status='completed')
+            if summary['updated_at'] < cutoff
+        ]
+        archived = 0
+
+        for start in range(0, len(candidates), batch_size):
+            documents = []
+            for session_id in candidates[start:start + batch_size]:
+                try:
+                    document = self._load_hot_document(session_id)
+                except (ValueError, OSError) as e:
+                    print(f"⚠️ Ошибка чтения сессии {session_id} для архивации: {e}")
+                    continue
+                if document is not None:
+                    documents.append(document)
+
+            try:
+                self.archive.append_many(documents)
+            except OSError as e:
+                print(f"⚠️ Ошибка записи архива: {e}")
+                break
+
+            # Файлы удаляются только после того, как сессии надежно записаны в архив
+            for document in documents:
+                session_id = document['session_id']
+                try:
+                    with self.locks.lock(session_id):
+                        current = self._load_hot_document(session_id)
+                        if current is not None and current.get('version') != document.get('version'):
+                            # Сессию изменили после чтения - она остается в папке, копия в архиве не нужна
+                            self.archive.delete(session_id)
+                            continue
+                        self._remove_files(session_id)
+                except OSError as e:
+                    print(f"⚠️ Ошибка удаления архивированной сессии {session_id}: {e}")
+                self.manifest.remove(session_id)
+                archived += 1
+
+        return archived
+
     def export_session(self, session_id: str, export_path: str) -> bool:
         """Экспорт сессии в файл"""
         session_data = self.load_session(session_id)
@@ -195,8 +462,7 @@ class SessionManager:
             export_file = Path(export_path)
             export_file.parent.mkdir(parents=True, exist_ok=True)
             
-            with open(export_file, 'w', encoding='utf-8') as f:
-                json.dump(session_data.to_dict(), f, ensure_ascii=False, indent=2)
+            json_backend.dump_file(session_data.to_dict(), export_file, pretty=True)
             
             return True
         except Exception as e:
@@ -206,8 +472,7 @@ class SessionManager:
     def import_session(self, import_path: str) -> Optional[str]:
         """Импорт сессии из файла"""
         try:
-            with open(import_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = json_backend.load_file(import_path)
             
             session_data = SessionData.from_dict(data)
             
@@ -222,4 +487,178 @@ class SessionManager:
         except Exception as e:
             print(f"⚠️ Ошибка импорта сессии: {e}")
         
-        return None
\ No newline at end of file
+        return None
+
+    def iter_documents(self, status: str = None, created_after: Union[datetime, str] = None,
+                       created_before: Union[datetime, str] = None, domain: str = None) -> Iterator[Dict[str, Any]]:
+        """
+        Документы сессий по одному, с фильтрами
+        Статус и даты проверяются по манифесту, домен - по документу
+        """
+        created_after = created_after.isoformat() if isinstance(created_after, datetime) else created_after
+        created_before = created_before.isoformat() if isinstance(created_before, datetime) else created_before
+        domain = domain.lower() if domain else None
+
+        for summary in self.get_all_sessions(sort_by='created_at', descending=False, status=status):
+            if created_after and summary['created_at'] < created_after:
+                continue
+            if created_before and summary['created_at'] >= created_before:
+                continue
+
+            try:
+                document = self._load_document(summary['session_id'])
+            except (ValueError, OSError) as e:
+                print(f"⚠️ Ошибка чтения сессии {summary['session_id']}: {e}")
+                continue
+            if document is None:
+                continue
+            if domain and domain not in session_domain(document).lower():
+                continue
+
+            # Версия имеет смысл только внутри этого хранилища
+            document.pop('version', None)
+            yield document
+
+    def export_sessions(self, export_path: str, **filters) -> int:
+        """
+        Потоковый экспорт сессий в JSON Lines (по документу на строку)
+        Сжатие по расширению: .gz - gzip, .xz/.lzma - lzma. Фильтры - как у iter_documents
+        Возвращает количество выгруженных сессий
+        """
+        export_file = Path(export_path)
+        export_file.parent.mkdir(parents=True, exist_ok=True)
+        exported = 0
+
+        with open_stream(export_file, 'wb') as stream:
+            for document in self.iter_documents(**filters):
+                stream.write(json_backend.backend.dumps_bytes(document) + b'\n')
+                exported += 1
+
+        return exported
+
+    def import_sessions(self, import_path: str, batch_size: int = 100) -> int:
+        """
+        Потоковый импорт сессий из JSON Lines (в том числе сжатого)
+        Каждая сессия получает новый ID, как в import_session; манифест обновляется
+        один раз в конце, поисковый индекс - по пачкам
+        Возвращает количество импортированных сессий
+        """
+        imported = []
+        batch = []
+
+        with open_stream(import_path, 'rb') as stream:
+            for line_number, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    session_data = SessionData.from_dict(json_backend.loads(line))
+                except (ValueError, KeyError) as e:
+                    print(f"⚠️ Пропущена поврежденная строка импорта {line_number}: {e}")
+                    continue
+
+                session_data.session_id = str(uuid.uuid4())
+                session_data.created_at = datetime.now()
+                session_data.updated_at = datetime.now()
+                document = session_data.to_dict()
+
+                try:
+                    self._write_new_document(document)
+                except OSError as e:
+                    print(f"⚠️ Ошибка импорта сессии (строка {line_number}): {e}")
+                    continue
+
+                imported.append(summarize_document(document))
+                batch.append(document)
+                if len(batch) >= batch_size:
+                    self.search_index.update_many(batch)
+                    batch = []
+
+        if batch:
+            self.search_index.update_many(batch)
+        self.manifest.update_many(imported)
+        return len(imported)
+
+    def _write_new_document(self, document: Dict[str, Any]):
+        """Запись документа новой сессии без обновления индексов"""
+        session_id = document['session_id']
+        if self.journal is not None:
+            self.journal.record(document)
+            # При массовом импорте не держим импортированные сессии в памяти журнала
+            self.journal.forget(session_id)
+        else:
+            json_backend.dump_file({**document, 'version': 0}, self.layout.write_path(session_id),
+                                   pretty=STORAGE.pretty_json, atomic=True)
+
+
+def open_stream(path: Union[str, Path], mode: str):
+    """Открытие файла выгрузки с прозрачным сжатием по расширению (.gz, .xz, .lzma)"""
+    suffix = Path(path).suffix.lower()
+    if suffix == '.gz':
+        return gzip.open(path, mode)
+    if suffix in ('.xz', '.lzma'):
+        return lzma.open(path, mode)
+    return open(path, mode)
+
+
+def session_domain(document: Dict[str, Any]) -> str:
+    """Область знаний сессии из анализа домена или профиля компетенций"""
+    for key, field_name in (('domain_analysis', 'primary_domain'), ('competency_profile', 'domain'),
+                            ('required_competencies', 'domain')):
+        value = (document.get(key) or {}).get(field_name)
+        if value:
+            return value
+    return ''
+
+
+def create_session_manager(backend: str = None, cached: bool = None):
+    """
+    Создание менеджера сессий для выбранного хранилища
+    json - файлы в папке sessions/, sqlite - SqliteSessionStore
+    cached - обернуть в SessionCache с отложенной записью (по умолчанию из STORAGE)
+    """
+    backend = backend or STORAGE.backend
+    cached = STORAGE.cache_enabled if cached is None else cached
+    
+    if backend == 'sqlite':
+        from sqlite_session_store import SqliteSessionStore
+        manager = SqliteSessionStore(STORAGE.sqlite_path)
+    else:
+        manager = SessionManager(STORAGE.sessions_dir)
+    
+    if cached:
+        from session_cache import SessionCache
+        return SessionCache(manager)
+    
+    return manager
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Массовый экспорт и импорт сессий")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Выгрузка сессий в JSON Lines (.jsonl, .jsonl.gz, .jsonl.xz)")
+    export_parser.add_argument('path', help="Файл выгрузки")
+    export_parser.add_argument('--status', help="Только сессии с этим статусом (active, completed)")
+    export_parser.add_argument('--since', help="Созданные не раньше даты (ISO, например 2024-01-31)")
+    export_parser.add_argument('--until', help="Созданные раньше даты (ISO)")
+    export_parser.add_argument('--domain', help="Подстрока области знаний")
+
+    import_parser = subparsers.add_parser('import', help="Загрузка сессий из JSON Lines")
+    import_parser.add_argument('path', help="Файл выгрузки")
+    import_parser.add_argument('--batch-size', type=int, default=100, help="Размер пачки индексации")
+
+    parser.add_argument('--sessions-dir', default=STORAGE.sessions_dir, help="Папка с сессиями")
+    args = parser.parse_args()
+
+    manager = SessionManager(args.sessions_dir)
+    if args.command == 'export':
+        count = manager.export_sessions(args.path, status=args.status, created_after=args.since,
+                                        created_before=args.until, domain=args.domain)
+        print(f"Выгружено сессий: {count}")
+    else:
+        count = manager.import_sessions(args.path, batch_size=args.batch_size)
+        print(f"Загружено сессий: {count}")
@@ -1,114 +1,338 @@
+import heapq
+import math
+import sys
+import threading
 import time
-from typing import Dict, Any, Optional
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from logger import logger
 
 
-class SessionMonitor:
-    """Монитор состояния сессий для предотвращения зацикливания"""
-    
+# Сессий под наблюдением одновременно; сверх - вытесняются давно не активные
+DEFAULT_CAPACITY = 1000
+
+# Сессия без активности дольше этого времени забывается (секунды)
+DEFAULT_TTL = 24 * 3600
+
+# Границы корзин гистограммы длительностей (секунды): от 10 мс до ~1.6 часа с шагом x1.5.
+# Набор фиксирован, поэтому гистограмма занимает постоянную память при любом числе замеров
+HISTOGRAM_BOUNDS = tuple(0.01 * 1.5 ** i for i in range(30))
+
+# Квантили в снимке статистики
+SNAPSHOT_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """Гистограмма длительностей с фиксированными логарифмическими корзинами"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
     def __init__(self):
-        self.session_states = {}
+        # Последняя корзина - все, что длиннее последней границы
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        seconds = max(seconds, 0.0)
+        self.counts[bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценка квантиля: корзина находится по накопленным счетчикам,
+        внутри корзины - интерполяция в логарифмической шкале
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if not count or cumulative + count < rank:
+                cumulative += count
+                continue
+
+            upper = HISTOGRAM_BOUNDS[index] if index < len(HISTOGRAM_BOUNDS) else self.max
+            lower = HISTOGRAM_BOUNDS[index - 1] if index > 0 else upper / 1.5
+            fraction = (rank - cumulative) / count
+            estimate = math.exp(math.log(lower) + (math.log(max(upper, lower)) - math.log(lower)) * fraction)
+            return min(estimate, self.max)
+
+        return self.max
+
+    def summary(self, quantiles: Iterable[float] = SNAPSHOT_QUANTILES) -> Dict[str, float]:
+        result = {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'total': self.total
+        }
+        for q in quantiles:
+            result[f"p{round(q * 100)}"] = self.quantile(q)
+        return result
+
+
+class SessionMonitor:
+    """
+    Монитор состояния сессий для предотвращения зацикливания
+
+    Потокобезопасен (вызывается из GUI и фоновых потоков) и ограничен по памяти:
+    не больше capacity сессий (вытесняется самая давно активная, LRU) и
+    не дольше ttl секунд без активности. Время последней активности лежит в куче,
+    поэтому очистка просроченных стоит O(log n) на удаленную сессию, а не обход всех.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, ttl: float = DEFAULT_TTL):
+        self.session_states: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
         self.max_attempts = 3
         self.max_stage_time = 300  # 5 минут на этап
-    
+        self.capacity = capacity
+        self.ttl = ttl
+
+        # Время последней активности сессии и куча (время, session_id) для вытеснения по TTL.
+        # Устаревшие записи кучи не удаляются сразу, а пропускаются при извлечении
+        self._last_seen: Dict[str, float] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._lock = threading.RLock()
+        self._evicted = {'ttl': 0, 'capacity': 0}
+
+        # Длительности этапов по всем сессиям (этапов немного, не вытесняются)
+        self.stage_histograms: Dict[str, LatencyHistogram] = {}
+
+    # === Вытеснение ===
+
+    def _touch(self, session_id: str, now: float) -> Dict[str, Dict[str, Any]]:
+        """Состояние сессии с отметкой активности (создается при необходимости)"""
+        session_state = self.session_states.get(session_id)
+        if session_state is None:
+            session_state = self.session_states[session_id] = {}
+        else:
+            self.session_states.move_to_end(session_id)
+
+        self._last_seen[session_id] = now
+        heapq.heappush(self._expiry_heap, (now, session_id))
+
+        # Куча копит устаревшие записи - время от времени пересобираем ее
+        if len(self._expiry_heap) > 2 * len(self._last_seen) + 64:
+            self._expiry_heap = [(seen, sid) for sid, seen in self._last_seen.items()]
+            heapq.heapify(self._expiry_heap)
+
+        while len(self.session_states) > self.capacity:
+            evicted_id, _ = self.session_states.popitem(last=False)
+            self._last_seen.pop(evicted_id, None)
+            self._evicted['capacity'] += 1
+            logger.debug("Данные мониторинга вытеснены по емкости", session_id=evicted_id)
+
+        return session_state
+
+    def _expire(self, cutoff: float) -> int:
+        """Удаление сессий, не активных с момента cutoff; O(log n) на удаленную сессию"""
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] < cutoff:
+            seen, session_id = heapq.heappop(self._expiry_heap)
+            if self._last_seen.get(session_id) != seen:
+                continue  # Сессия была активна позже (или уже удалена)
+            del self._last_seen[session_id]
+            self.session_states.pop(session_id, None)
+            removed += 1
+        return removed
+
+    def _state(self, session_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Состояние сессии без отметки активности (просроченное не возвращается)"""
+        seen = self._last_seen.get(session_id)
+        if seen is None or time.time() - seen > self.ttl:
+            return None
+        return self.session_states.get(session_id)
+
+    # === Этапы ===
+
     def track_stage_entry(self, session_id: str, stage: str) -> bool:
         """
         Отслеживает вход в этап и проверяет на зацикливание
         Возвращает True если можно продолжить, False если нужно прервать
         """
         current_time = time.time()
-        
-        if session_id not in self.session_states:
-            self.session_states[session_id] = {}
-        
-        session_state = self.session_states[session_id]
-        
-        # Инициализируем данные этапа если их нет
-        if stage not in session_state:
-            session_state[stage] = {
-                'attempts': 0,
-                'first_entry': current_time,
-                'last_entry': current_time
-            }
-        
-        stage_data = session_state[stage]
-        
-        # Проверяем, не слишком ли долго находимся на этом этапе
-        time_on_stage = current_time - stage_data['first_entry']
-        if time_on_stage > self.max_stage_time:
-            logger.warning(f"Сессия {session_id} слишком долго на этапе {stage}: {time_on_stage:.1f}с")
-            return False
-        
-        # Проверяем количество попыток
-        if stage_data['attempts'] >= self.max_attempts:
-            logger.warning(f"Сессия {session_id} превысила лимит попыток на этапе {stage}: {stage_data['attempts']}")
-            return False
-        
-        # Проверяем частоту входов (защита от быстрого зацикливания)
-        time_since_last = current_time - stage_data['last_entry']
-        if time_since_last < 1.0:  # Менее секунды между входами
-            stage_data['attempts'] += 1
-            logger.warning(f"Быстрое повторение этапа {stage} в сессии {session_id}, попытка {stage_data['attempts']}")
-        
-        stage_data['last_entry'] = current_time
-        
-        return True
-    
-    def mark_stage_completed(self, session_id: str, stage: str):
-        """Отмечает этап как завершенный"""
-        if session_id in self.session_states and stage in self.session_states[session_id]:
-            self.session_states[session_id][stage]['completed'] = True
-            logger.debug(f"Этап {stage} завершен для сессии {session_id}")
-    
+
+        with self._lock:
+            self._evicted['ttl'] += self._expire(current_time - self.ttl)
+            session_state = self._touch(session_id, current_time)
+
+            # Инициализируем данные этапа если их нет
+            if stage not in session_state:
+                session_state[stage] = {
+                    'attempts': 0,
+                    'first_entry': current_time,
+                    'last_entry': current_time
+                }
+
+            stage_data = session_state[stage]
+            # Начало прохода этапа: длительность считается до завершения, с учетом повторных входов
+            if stage_data.get('started') is None:
+                if stage_data.get('completed'):
+                    # Новый проход уже завершенного этапа (следующая итерация) - лимиты считаются заново
+                    stage_data['first_entry'] = current_time
+                    stage_data['attempts'] = 0
+                stage_data['started'] = current_time
+
+            # Проверяем, не слишком ли долго находимся на этом этапе
+            time_on_stage = current_time - stage_data['first_entry']
+            if time_on_stage > self.max_stage_time:
+                logger.warning("Слишком долго на этапе %s: %.1fс", stage, time_on_stage, session_id=session_id)
+                return False
+
+            # Проверяем количество попыток
+            if stage_data['attempts'] >= self.max_attempts:
+                logger.warning("Превышен лимит попыток на этапе %s: %d", stage, stage_data['attempts'], session_id=session_id)
+                return False
+
+            # Проверяем частоту входов (защита от быстрого зацикливания)
+            time_since_last = current_time - stage_data['last_entry']
+            if time_since_last < 1.0:  # Менее секунды между входами
+                stage_data['attempts'] += 1
+                logger.warning("Быстрое повторение этапа %s, попытка %d", stage, stage_data['attempts'], session_id=session_id)
+
+            stage_data['last_entry'] = current_time
+
+            return True
+
+    def mark_stage_completed(self, session_id: str, stage: str) -> Optional[float]:
+        """
+        Отмечает этап как завершенный и записывает длительность прохода
+        в гистограммы сессии и общую по этапу
+        Возвращает длительность в секундах (None, если вход в этап не отслеживался)
+        """
+        current_time = time.time()
+        with self._lock:
+            session_state = self._state(session_id)
+            if session_state is None or stage not in session_state:
+                return None
+
+            stage_data = session_state[stage]
+            stage_data['completed'] = True
+            self._touch(session_id, current_time)
+
+            started = stage_data.pop('started', None)
+            if started is None:
+                return None
+            duration = current_time - started
+
+            histogram = stage_data.get('histogram')
+            if histogram is None:
+                histogram = stage_data['histogram'] = LatencyHistogram()
+            histogram.record(duration)
+
+            aggregate = self.stage_histograms.get(stage)
+            if aggregate is None:
+                aggregate = self.stage_histograms[stage] = LatencyHistogram()
+            aggregate.record(duration)
+
+            logger.debug("Этап %s завершен за %.2fс", stage, duration, session_id=session_id)
+            return duration
+
     def is_stage_completed(self, session_id: str, stage: str) -> bool:
         """Проверяет, завершен ли этап"""
-        if session_id not in self.session_states:
-            return False
-        if stage not in self.session_states[session_id]:
-            return False
-        return self.session_states[session_id][stage].get('completed', False)
-    
+        with self._lock:
+            session_state = self._state(session_id)
+            if session_state is None or stage not in session_state:
+                return False
+            return session_state[stage].get('completed', False)
+
     def reset_stage(self, session_id: str, stage: str):
         """Сбрасывает состояние этапа"""
-        if session_id in self.session_states and stage in self.session_states[session_id]:
-            del self.session_states[session_id][stage]
-            logger.debug(f"Состояние этапа {stage} сброшено для сессии {session_id}")
-    
+        with self._lock:
+            session_state = self._state(session_id)
+            if session_state is not None and stage in session_state:
+                del session_state[stage]
+                logger.debug("Состояние этапа %s сброшено", stage, session_id=session_id)
+
     def get_session_stats(self, session_id: str) -> Dict[str, Any]:
         """Получает статистику сессии"""
-        if session_id not in self.session_states:
-            return {}
-        
-        stats = {}
-        for stage, data in self.session_states[session_id].items():
-            stats[stage] = {
-                'attempts': data['attempts'],
-                'time_spent': time.time() - data['first_entry'],
-                'completed': data.get('completed', False)
-            }
-        
-        return stats
-    
-    def cleanup_old_sessions(self, max_age_hours: int = 24):
-        """Очищает старые данные сессий"""
-        current_time = time.time()
-        max_age_seconds = max_age_hours * 3600
-        
-        sessions_to_remove = []
-        for session_id, session_state in self.session_states.items():
-            # Находим самое раннее время входа
-            earliest_time = min(
-                stage_data['first_entry'] 
-                for stage_data in session_state.values()
+        with self._lock:
+            session_state = self._state(session_id)
+            if session_state is None:
+                return {}
+
+            now = time.time()
+            stats = {}
+            for stage, data in session_state.items():
+                stats[stage] = {
+                    'attempts': data['attempts'],
+                    'time_spent': now - data['first_entry'],
+                    'completed': data.get('completed', False)
+                }
+                if data.get('histogram') is not None:
+                    stats[stage]['latency'] = data['histogram'].summary()
+
+            return stats
+
+    def latency_snapshot(self, quantiles: Iterable[float] = SNAPSHOT_QUANTILES) -> Dict[str, Dict[str, float]]:
+        """
+        Длительности этапов по всем сессиям: count, mean, max, total и квантили (p50/p95/p99)
+        Этапы отсортированы по суммарному времени - первым идет тот, что больше всего занимает брифинг
+        """
+        quantiles = tuple(quantiles)
+        with self._lock:
+            summaries = {stage: histogram.summary(quantiles) for stage, histogram in self.stage_histograms.items()}
+        return dict(sorted(summaries.items(), key=lambda item: item[1]['total'], reverse=True))
+
+    def cleanup_old_sessions(self, max_age_hours: float = 24) -> int:
+        """
+        Очищает данные сессий, не активных дольше max_age_hours
+        Возвращает количество удаленных сессий
+        """
+        with self._lock:
+            removed = self._expire(time.time() - max_age_hours * 3600)
+
+        if removed:
+            logger.info(f"Удалены старые данные мониторинга сессий: {removed}")
+        return removed
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Размер монитора: число сессий и этапов, записи кучи, примерный объем памяти"""
+        with self._lock:
+            stages = sum(len(state) for state in self.session_states.values())
+            approx_bytes = (
+                sys.getsizeof(self.session_states) + sys.getsizeof(self._last_seen)
+                + sys.getsizeof(self._expiry_heap)
+                + len(self._expiry_heap) * sys.getsizeof((0.0, ''))
+                + sum(
+                    sys.getsizeof(state) + sum(_stage_size(data) for data in state.values())
+                    for state in self.session_states.values()
+                )
+                + sum(_histogram_size(histogram) for histogram in self.stage_histograms.values())
             )
-            
-            if current_time - earliest_time > max_age_seconds:
-                sessions_to_remove.append(session_id)
-        
-        for session_id in sessions_to_remove:
-            del self.session_states[session_id]
-            logger.info(f"Удалены старые данные мониторинга для сессии {session_id}")
+            return {
+                'sessions': len(self.session_states),
+                'stages': stages,
+                'heap_entries': len(self._expiry_heap),
+                'capacity': self.capacity,
+                'ttl_seconds': self.ttl,
+                'evicted_ttl': self._evicted['ttl'],
+                'evicted_capacity': self._evicted['capacity'],
+                'approx_bytes': approx_bytes
+            }
+
+
+def _histogram_size(histogram: LatencyHistogram) -> int:
+    return sys.getsizeof(histogram) + sys.getsizeof(histogram.counts)
+
+
+def _stage_size(data: Dict[str, Any]) -> int:
+    histogram = data.get('histogram')
+    return sys.getsizeof(data) + (_histogram_size(histogram) if histogram is not None else 0)
 
 
 # Глобальный экземпляр монитора
-session_monitor = SessionMonitor() 
\ No newline at end of file
+session_monitor = SessionMonitor()
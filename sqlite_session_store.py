@@ -0,0 +1,666 @@
+"""
+Хранилище сессий в SQLite
+
+Тот же интерфейс, что и у SessionManager, но без перезаписи целого документа:
+скалярные поля (статус, шаг, даты, превью идеи) лежат в индексируемых колонках,
+тяжелые разделы (итерации, вопросы, ответы) - в отдельной таблице по одной строке на раздел.
+Список, фильтрация и обновление одного поля не требуют десериализации сессии.
+
+Полнотекстовый поиск - тот же SearchIndex, что у файлового хранилища (журнал
+рядом с базой, {имя базы}.search.jsonl); перед поиском индекс сверяется
+с updated_at сессий. Не поддерживается только архив старых сессий
+(archive_old_sessions): он нужен папке с тысячами файлов, а не базе.
+"""
+
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Any, Iterator, List, Optional, Iterable, Set, Union
+
+import json_backend
+from config import SessionStep, STORAGE
+from exceptions import SessionNotFoundError
+from logger import logger
+from models import SessionData, SessionIteration
+from search_index import SearchIndex
+from session_index import idea_preview, SORT_KEYS
+from session_journal import SessionJournal
+from session_layout import SessionLayout, SNAPSHOT_SUFFIX
+from session_manager import open_stream, session_domain
+
+
+# Поля документа, которые хранятся в колонках таблицы sessions
+SCALAR_FIELDS = ('created_at', 'updated_at', 'status', 'current_step', 'iteration_count', 'competency_stage')
+
+# Тяжелые разделы документа, каждый хранится отдельной строкой в session_payloads
+HEAVY_SECTIONS = (
+    'final_result',
+    'context_questions',
+    'competency_questions',
+    'clarifying_questions',
+    'competency_answers',
+    'competency_comments',
+    'main_answers',
+    'main_comments',
+    'answers',
+    'comments',
+    'all_asked_questions',
+    'all_iterations',
+    'validation_history'
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    current_step TEXT NOT NULL,
+    iteration_count INTEGER NOT NULL DEFAULT 0,
+    competency_stage TEXT NOT NULL DEFAULT '',
+    user_idea_preview TEXT NOT NULL DEFAULT '',
+    core TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions(status);
+CREATE INDEX IF NOT EXISTS idx_sessions_current_step ON sessions(current_step);
+CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at);
+CREATE TABLE IF NOT EXISTS session_payloads (
+    session_id TEXT NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, section)
+) WITHOUT ROWID;
+"""
+
+
+# Колонки сводки сессии для списка и поиска
+_SUMMARY_COLUMNS = "session_id, created_at, updated_at, status, user_idea_preview, iteration_count, current_step"
+
+
+def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+    """Сводка сессии из строки таблицы sessions (формат SessionManager.get_all_sessions)"""
+    return {
+        'session_id': row['session_id'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'status': row['status'],
+        'user_idea': row['user_idea_preview'],
+        'iteration_count': row['iteration_count'],
+        'current_step': row['current_step']
+    }
+
+
+class SqliteSessionStore:
+    """Менеджер сессий поверх SQLite в режиме WAL"""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = Path(db_path or STORAGE.sqlite_path)
+        if self.db_path.parent != Path('.'):
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # GUI работает из нескольких потоков - у каждого свое соединение
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+        self.search_index = SearchIndex(self.db_path.with_name(f"{self.db_path.stem}.search.jsonl"))
+
+    def _connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Закрытие соединения текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # === Внутренние операции с документом ===
+
+    def _write_document(self, conn: sqlite3.Connection, document: Dict[str, Any]):
+        """Запись документа сессии: колонки + легкое ядро + тяжелые разделы"""
+        core = {
+            key: value for key, value in document.items()
+            if key not in HEAVY_SECTIONS and key not in SCALAR_FIELDS and key != 'session_id'
+        }
+
+        conn.execute(
+            """
+            INSERT INTO sessions (session_id, created_at, updated_at, status, current_step,
+                                  iteration_count, competency_stage, user_idea_preview, core)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                created_at = excluded.created_at,
+                updated_at = excluded.updated_at,
+                status = excluded.status,
+                current_step = excluded.current_step,
+                iteration_count = excluded.iteration_count,
+                competency_stage = excluded.competency_stage,
+                user_idea_preview = excluded.user_idea_preview,
+                core = excluded.core
+            """,
+            (
+                document['session_id'],
+                document.get('created_at', datetime.now().isoformat()),
+                document.get('updated_at', datetime.now().isoformat()),
+                document.get('status', 'active'),
+                document.get('current_step', SessionStep.INPUT_IDEA.value),
+                document.get('iteration_count', 0),
+                document.get('competency_stage', ''),
+                idea_preview(document.get('user_idea', '')),
+                json_backend.dumps(core)
+            )
+        )
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO session_payloads (session_id, section, data) VALUES (?, ?, ?)",
+            [
+                (document['session_id'], section, json_backend.dumps(document[section]))
+                for section in HEAVY_SECTIONS if section in document
+            ]
+        )
+
+    def _write_fields(self, conn: sqlite3.Connection, document: Dict[str, Any], fields: Set[str]):
+        """Запись только изменившихся полей: колонок, ядра и затронутых разделов"""
+        session_id = document['session_id']
+
+        columns = {name: document[name] for name in SCALAR_FIELDS if name in fields}
+        if 'user_idea' in fields:
+            columns['user_idea_preview'] = idea_preview(document.get('user_idea', ''))
+        if any(key not in HEAVY_SECTIONS and key not in SCALAR_FIELDS for key in fields):
+            columns['core'] = json_backend.dumps({
+                key: value for key, value in document.items()
+                if key not in HEAVY_SECTIONS and key not in SCALAR_FIELDS and key != 'session_id'
+            })
+        if columns:
+            assignments = ', '.join(f"{name} = ?" for name in columns)
+            conn.execute(f"UPDATE sessions SET {assignments} WHERE session_id = ?", (*columns.values(), session_id))
+
+        sections = [section for section in HEAVY_SECTIONS if section in fields]
+        if sections:
+            conn.executemany(
+                "INSERT OR REPLACE INTO session_payloads (session_id, section, data) VALUES (?, ?, ?)",
+                [(session_id, section, json_backend.dumps(document[section])) for section in sections]
+            )
+
+    def _read_document(self, session_id: str,
+                       sections: Iterable[str] = HEAVY_SECTIONS) -> Optional[Dict[str, Any]]:
+        """Чтение документа сессии, тяжелые разделы - только запрошенные"""
+        conn = self._connection()
+        row = conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+
+        document = json_backend.loads(row['core'])
+        document['session_id'] = session_id
+        for field_name in SCALAR_FIELDS:
+            document[field_name] = row[field_name]
+
+        sections = list(sections)
+        if sections:
+            placeholders = ', '.join('?' * len(sections))
+            for payload in conn.execute(
+                f"SELECT section, data FROM session_payloads WHERE session_id = ? AND section IN ({placeholders})",
+                (session_id, *sections)
+            ):
+                document[payload['section']] = json_backend.loads(payload['data'])
+
+        return document
+
+    def _read_section(self, conn: sqlite3.Connection, session_id: str, section: str, default: Any) -> Any:
+        row = conn.execute(
+            "SELECT data FROM session_payloads WHERE session_id = ? AND section = ?",
+            (session_id, section)
+        ).fetchone()
+        return json_backend.loads(row['data']) if row else default
+
+    def _write_section(self, conn: sqlite3.Connection, session_id: str, section: str, value: Any):
+        conn.execute(
+            "INSERT OR REPLACE INTO session_payloads (session_id, section, data) VALUES (?, ?, ?)",
+            (session_id, section, json_backend.dumps(value))
+        )
+
+    def _update_columns(self, session_id: str, **columns) -> bool:
+        """Обновление скалярных колонок без чтения сессии"""
+        columns['updated_at'] = datetime.now().isoformat()
+        assignments = ', '.join(f"{name} = ?" for name in columns)
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE sessions SET {assignments} WHERE session_id = ?",
+                (*columns.values(), session_id)
+            )
+        return cursor.rowcount > 0
+
+    def _append_to_section(self, session_id: str, section: str, make_record: Callable[[int], Dict[str, Any]],
+                           increment_iterations: bool = False) -> bool:
+        """
+        Добавление записи в список-раздел в одной транзакции
+        make_record(iteration_count) вызывается внутри транзакции: запись (например, номер итерации)
+        строится по значениям, которые другие потоки и процессы не изменят до ее записи
+        """
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT iteration_count FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is None:
+                    return False
+
+                items = self._read_section(conn, session_id, section, [])
+                items.append(make_record(row['iteration_count']))
+                self._write_section(conn, session_id, section, items)
+
+                if increment_iterations:
+                    conn.execute(
+                        "UPDATE sessions SET iteration_count = iteration_count + 1, updated_at = ? WHERE session_id = ?",
+                        (datetime.now().isoformat(), session_id)
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE sessions SET updated_at = ? WHERE session_id = ?",
+                        (datetime.now().isoformat(), session_id)
+                    )
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка обновления раздела {section}: {e}", session_id=session_id)
+            return False
+
+    # === Интерфейс SessionManager ===
+
+    def create_session(self) -> str:
+        """Создание новой сессии"""
+        session_id = str(uuid.uuid4())
+        session_data = SessionData(
+            session_id=session_id,
+            created_at=datetime.now(),
+            status='active',
+            current_step=SessionStep.INPUT_IDEA
+        )
+
+        self.save_session(session_data)
+        return session_id
+
+    def load_session(self, session_id: str) -> Optional[SessionData]:
+        """Загрузка сессии"""
+        try:
+            document = self._read_document(session_id)
+            if document is None:
+                return None
+            return SessionData.from_dict(document)
+        except (sqlite3.Error, ValueError, KeyError) as e:
+            print(f"⚠️ Ошибка загрузки сессии {session_id}: {e}")
+            return None
+
+    def save_session(self, session_data: SessionData) -> bool:
+        """Сохранение сессии"""
+        session_data.updated_at = datetime.now()
+        return self.save_document(session_data.to_dict())
+
+    def save_document(self, document: Dict[str, Any]) -> bool:
+        """Запись уже сериализованного документа сессии одной транзакцией"""
+        conn = self._connection()
+
+        try:
+            with conn:
+                self._write_document(conn, document)
+            return True
+        except Exception as e:
+            print(f"⚠️ Ошибка сохранения сессии {document['session_id']}: {e}")
+            return False
+
+    @contextmanager
+    def transaction(self, session_id: str) -> Iterator[SessionData]:
+        """
+        Транзакция над сессией: изменения блока with - одна транзакция SQLite,
+        в которой обновляются только изменившиеся колонки и разделы
+        Запись в базу заблокирована на время блока; при исключении изменения откатываются
+        Нет сессии - SessionNotFoundError
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            document = self._read_document(session_id)
+            if document is None:
+                raise SessionNotFoundError(session_id)
+            session_data = SessionData.from_dict(document)
+            before = session_data.to_dict()
+
+            yield session_data
+
+            after = session_data.to_dict()
+            changed = {key for key, value in after.items() if key != 'updated_at' and before.get(key) != value}
+            if changed:
+                session_data.updated_at = datetime.now()
+                after['updated_at'] = session_data.updated_at.isoformat()
+                self._write_fields(conn, after, changed | {'updated_at'})
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def update_step(self, session_id: str, step: SessionStep) -> bool:
+        """Обновление текущего шага"""
+        return self._update_columns(session_id, current_step=step.value)
+
+    def add_iteration(self, session_id: str, iteration_data: Dict[str, Any]) -> bool:
+        """Добавление новой итерации"""
+        def make_iteration(iteration_count: int) -> Dict[str, Any]:
+            iteration = SessionIteration(
+                iteration=iteration_count + 1,
+                timestamp=datetime.now(),
+                refined_idea=iteration_data.get('refined_idea', ''),
+                feedback_type=iteration_data.get('feedback_type', ''),
+                comments=iteration_data.get('comments', '')
+            )
+            return SessionData._serialize_iteration(iteration)
+
+        return self._append_to_section(session_id, 'all_iterations', make_iteration, increment_iterations=True)
+
+    def add_validation(self, session_id: str, validation_data: Dict[str, Any]) -> bool:
+        """Добавление записи валидации"""
+        validation_record = {
+            'timestamp': datetime.now().isoformat(),
+            **validation_data
+        }
+        return self._append_to_section(session_id, 'validation_history', lambda _: validation_record)
+
+    def complete_session(self, session_id: str, final_result: str) -> bool:
+        """Завершение сессии"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE sessions SET status = ?, current_step = ?, updated_at = ? WHERE session_id = ?",
+                ('completed', SessionStep.COMPLETED.value, datetime.now().isoformat(), session_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._write_section(conn, session_id, 'final_result', final_result)
+        return True
+
+    def get_all_sessions(self, offset: int = 0, limit: int = None, sort_by: str = 'created_at',
+                         descending: bool = True, status: str = None,
+                         current_step: str = None) -> List[Dict[str, Any]]:
+        """Получение списка сессий с фильтрацией, сортировкой и постраничным выводом"""
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Неизвестный ключ сортировки: {sort_by}")
+
+        conditions = []
+        params: List[Any] = []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if current_step is not None:
+            conditions.append("current_step = ?")
+            params.append(current_step)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.extend([limit if limit is not None else -1, offset])
+        rows = self._connection().execute(
+            f"""
+            SELECT {_SUMMARY_COLUMNS}
+            FROM sessions {where}
+            ORDER BY {sort_by} {'DESC' if descending else 'ASC'}
+            LIMIT ? OFFSET ?
+            """,
+            params
+        ).fetchall()
+
+        return [_summary(row) for row in rows]
+
+    def search(self, query: str, limit: int = 20, status: str = None) -> List[Dict[str, Any]]:
+        """
+        Полнотекстовый поиск сессий по идее, результату, вопросам и ответам
+        Возвращает сводки сессий (как get_all_sessions) с полем score, по убыванию релевантности
+        """
+        conn = self._connection()
+        # Переиндексируются только сессии, изменившиеся после прошлой сверки
+        updated = {row['session_id']: row['updated_at'] for row in conn.execute("SELECT session_id, updated_at FROM sessions")}
+        self.search_index.sync(updated, self._read_document)
+
+        results = []
+        for session_id, score in self.search_index.search(query, limit=None):
+            row = conn.execute(f"SELECT {_SUMMARY_COLUMNS} FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None or (status is not None and row['status'] != status):
+                continue
+            results.append({**_summary(row), 'score': round(score, 3)})
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def delete_session(self, session_id: str) -> bool:
+        """Удаление сессии"""
+        conn = self._connection()
+        try:
+            with conn:
+                cursor = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self.search_index.remove(session_id)
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"⚠️ Ошибка удаления сессии {session_id}: {e}")
+            return False
+
+    def get_session_statistics(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Получение статистики сессии"""
+        document = self._read_document(
+            session_id,
+            sections=('clarifying_questions', 'competency_questions', 'answers', 'validation_history')
+        )
+        if document is None:
+            return None
+
+        created_at = datetime.fromisoformat(document['created_at'])
+        updated_at = datetime.fromisoformat(document['updated_at'])
+
+        return {
+            'session_id': session_id,
+            'status': document['status'],
+            'current_step': document['current_step'],
+            'iteration_count': document['iteration_count'],
+            'questions_count': len(document.get('clarifying_questions', [])),
+            'competency_questions_count': len(document.get('competency_questions', [])),
+            'answers_count': len(document.get('answers', {})),
+            'validations_count': len(document.get('validation_history', [])),
+            'created_at': created_at.isoformat(),
+            'updated_at': updated_at.isoformat(),
+            'duration_minutes': (updated_at - created_at).total_seconds() / 60
+        }
+
+    def cleanup_old_sessions(self, days_old: int = 30) -> int:
+        """Очистка старых сессий"""
+        cutoff = (datetime.now() - timedelta(days=days_old)).isoformat()
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,))
+        return cursor.rowcount
+
+    def export_session(self, session_id: str, export_path: str) -> bool:
+        """Экспорт сессии в файл"""
+        document = self._read_document(session_id)
+        if document is None:
+            return False
+
+        try:
+            export_file = Path(export_path)
+            export_file.parent.mkdir(parents=True, exist_ok=True)
+            json_backend.dump_file(document, export_file, pretty=True)
+            return True
+        except Exception as e:
+            print(f"⚠️ Ошибка экспорта сессии {session_id}: {e}")
+            return False
+
+    def import_session(self, import_path: str) -> Optional[str]:
+        """Импорт сессии из файла"""
+        try:
+            data = json_backend.load_file(import_path)
+            session_data = SessionData.from_dict(data)
+
+            # Генерируем новый ID для избежания конфликтов
+            session_data.session_id = str(uuid.uuid4())
+            session_data.created_at = datetime.now()
+            session_data.updated_at = datetime.now()
+
+            if self.save_session(session_data):
+                return session_data.session_id
+
+        except Exception as e:
+            print(f"⚠️ Ошибка импорта сессии: {e}")
+
+        return None
+
+    def archive_old_sessions(self, days_old: int = None) -> int:
+        """Архив старых сессий есть только у файлового хранилища"""
+        raise NotImplementedError("Архив сессий поддерживается только файловым хранилищем (STORAGE.backend = 'json')")
+
+    def iter_documents(self, status: str = None, created_after: Union[datetime, str] = None,
+                       created_before: Union[datetime, str] = None, domain: str = None) -> Iterator[Dict[str, Any]]:
+        """
+        Документы сессий по одному, с фильтрами (как у SessionManager)
+        Статус и даты проверяются запросом к колонкам, домен - по документу
+        """
+        conditions = []
+        params: List[Any] = []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if created_after:
+            conditions.append("created_at >= ?")
+            params.append(created_after.isoformat() if isinstance(created_after, datetime) else created_after)
+        if created_before:
+            conditions.append("created_at < ?")
+            params.append(created_before.isoformat() if isinstance(created_before, datetime) else created_before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        domain = domain.lower() if domain else None
+
+        session_ids = [
+            row['session_id'] for row in
+            self._connection().execute(f"SELECT session_id FROM sessions {where} ORDER BY created_at", params)
+        ]
+        for session_id in session_ids:
+            document = self._read_document(session_id)
+            if document is None:
+                continue
+            if domain and domain not in session_domain(document).lower():
+                continue
+            document.pop('version', None)
+            yield document
+
+    def export_sessions(self, export_path: str, **filters) -> int:
+        """
+        Потоковый экспорт сессий в JSON Lines (по документу на строку), формат - как у SessionManager
+        Возвращает количество выгруженных сессий
+        """
+        export_file = Path(export_path)
+        export_file.parent.mkdir(parents=True, exist_ok=True)
+        exported = 0
+
+        with open_stream(export_file, 'wb') as stream:
+            for document in self.iter_documents(**filters):
+                stream.write(json_backend.backend.dumps_bytes(document) + b'\n')
+                exported += 1
+
+        return exported
+
+    def import_sessions(self, import_path: str, batch_size: int = 100) -> int:
+        """
+        Потоковый импорт сессий из JSON Lines (в том числе сжатого)
+        Каждая сессия получает новый ID; пачка сессий - одна транзакция
+        Возвращает количество импортированных сессий
+        """
+        conn = self._connection()
+        imported = 0
+        batch: List[Dict[str, Any]] = []
+
+        def write_batch():
+            with conn:
+                for document in batch:
+                    self._write_document(conn, document)
+            self.search_index.update_many(batch)
+            batch.clear()
+
+        with open_stream(import_path, 'rb') as stream:
+            for line_number, line in enumerate(stream, 1):
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    session_data = SessionData.from_dict(json_backend.loads(line))
+                except (ValueError, KeyError) as e:
+                    print(f"⚠️ Пропущена поврежденная строка импорта {line_number}: {e}")
+                    continue
+
+                session_data.session_id = str(uuid.uuid4())
+                session_data.created_at = datetime.now()
+                session_data.updated_at = datetime.now()
+                batch.append(session_data.to_dict())
+                imported += 1
+                if len(batch) >= batch_size:
+                    write_batch()
+
+        if batch:
+            write_batch()
+        return imported
+
+    # === Миграция ===
+
+    def migrate_from_directory(self, sessions_dir: str = None, overwrite: bool = False) -> int:
+        """
+        Однократный перенос JSON файлов сессий в базу
+        Идентификаторы сохраняются; уже перенесенные сессии пропускаются, если не задан overwrite
+        """
+        source = Path(sessions_dir or STORAGE.sessions_dir)
+        if not source.exists():
+            return 0
+
+        conn = self._connection()
+        existing = {row['session_id'] for row in conn.execute("SELECT session_id FROM sessions")}
+        # Снимки с журналом событий читаются с проигранным хвостом журнала
+        journal = SessionJournal(source)
+        migrated = 0
+
+        with conn:
+            session_files = SessionLayout(source).session_files()
+            for session_id in sorted(sid for sid, files in session_files.items() if SNAPSHOT_SUFFIX in files):
+                if session_id in existing and not overwrite:
+                    continue
+
+                try:
+                    # Проходим через модель, чтобы нормализовать старые документы
+                    document = SessionData.from_dict(journal.load_document(session_id)).to_dict()
+                    document['session_id'] = session_id
+                    self._write_document(conn, document)
+                    journal.forget(session_id)
+                    migrated += 1
+                except (ValueError, KeyError) as e:
+                    logger.warning(f"Пропущен поврежденный файл сессии {session_id}: {e}")
+
+        logger.info(f"Перенесено сессий в SQLite: {migrated}")
+        return migrated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Перенос сессий из JSON файлов в SQLite")
+    parser.add_argument('sessions_dir', nargs='?', default=STORAGE.sessions_dir, help="Папка с JSON сессиями")
+    parser.add_argument('db_path', nargs='?', default=STORAGE.sqlite_path, help="Файл базы SQLite")
+    parser.add_argument('--overwrite', action='store_true', help="Перезаписать уже перенесенные сессии")
+    args = parser.parse_args()
+
+    store = SqliteSessionStore(args.db_path)
+    count = store.migrate_from_directory(args.sessions_dir, overwrite=args.overwrite)
+    print(f"✅ Перенесено сессий: {count}")
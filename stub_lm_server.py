@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Локальная заглушка LM Studio для нагрузочных тестов и замеров задержек
+
+Реализует /v1/models и /v1/chat/completions (в том числе потоковый ответ SSE)
+и отвечает правдоподобными заготовками по типу промпта: нумерованные вопросы
+да/нет на русском, JSON анализа области, компетенций, профиля, адаптивных
+вопросов и переформулировок - в тех формах, что ожидают CompetencyAnalyzer,
+QuestionGenerator и IdeaProcessor. Ответы детерминированы: зависят только от
+промпта и --seed.
+
+Задержка ответа - время до первого токена плюс время на каждый токен;
+max_tokens обрезает ответ, как у настоящей модели. Для проверки повторов
+AIClient можно включить случайные ошибки 500 и зависания без ответа,
+а --concurrency ограничивает число одновременно генерируемых ответов
+(остальные ждут в очереди, сверх --max-queue получают 503).
+
+Запуск: python stub_lm_server.py [--port 1234] [--ttft 0.2] [--per-token 0.01]
+                                 [--error-rate 0.1] [--hang-rate 0.05] [--concurrency 1]
+Статистика: GET /stub/stats
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from config import KNOWLEDGE_DOMAINS
+
+
+MODEL_ID = "stub-model"
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]|\s+')
+
+CLOSED_QUESTIONS = [
+    "Планируете запустить проект в течение года?",
+    "Нужна мобильная версия для клиентов?",
+    "Это будет платный сервис?",
+    "Требуется интеграция с внешними системами?",
+    "Есть ли у вас готовая команда?",
+    "Хотите привлечь внешние инвестиции?",
+    "Будет ли продукт ориентирован на массовую аудиторию?",
+    "Нужно ли хранить персональные данные пользователей?",
+    "Планируете продавать продукт за рубежом?",
+    "Это долгосрочный проект?",
+    "Требуется согласование с регуляторами?",
+    "Готовы выделить бюджет на рекламу?",
+    "Есть ли у проекта прямые конкуренты?",
+    "Нужна поддержка нескольких языков?",
+    "Планируете собирать обратную связь от пользователей?",
+    "Хотите запустить пилотную версию для небольшой группы?",
+    "Будет ли нужна круглосуточная поддержка?",
+    "Это ваш первый проект подобного рода?",
+    "Требуется обучение персонала?",
+    "Согласны начать с минимальной версии продукта?",
+    "Планируете использовать готовые решения сторонних компаний?",
+    "Нужно ли получать лицензии?",
+    "Есть ли ограничения по срокам запуска?",
+    "Хотите автоматизировать основные процессы?",
+    "Будет ли проект приносить доход в первый год?",
+    "Требуется собственное помещение?",
+    "Планируете нанимать сотрудников?",
+    "Нужна аналитика поведения пользователей?",
+    "Это проект для личного использования?",
+    "Готовы тестировать идею на реальных пользователях?",
+]
+
+# Вопросы не в закрытой форме - для проверки перегенерации (--open-rate)
+OPEN_QUESTIONS = [
+    "Какую платформу выберете для запуска?",
+    "Сколько времени займет разработка?",
+    "Мобильное или веб-приложение?",
+    "Кто будет основным пользователем?",
+]
+
+CONTEXT_QUESTIONS = [
+    "Кто целевая аудитория идеи?",
+    "Какой бюджет вы готовы выделить?",
+    "В какие сроки нужен результат?",
+    "Какие ресурсы у вас уже есть?",
+    "Какие ограничения нужно учесть?",
+    "Как вы поймете, что идея удалась?",
+    "Кто будет участвовать в реализации?",
+    "Какие риски вы видите сейчас?",
+    "Где будет использоваться результат?",
+    "Какой опыт у вас уже есть в этой теме?",
+]
+
+
+# === Заготовки ответов ===
+
+def _numbered(questions: List[str]) -> str:
+    return "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+
+
+def _requested_count(prompt: str, default: int) -> int:
+    match = re.search(r'Сгенерируй (?:ровно )?(\d+)', prompt)
+    return int(match.group(1)) if match else default
+
+
+def _closed_questions(prompt: str, rng: random.Random, count: int, open_rate: float) -> List[str]:
+    """Вопросы да/нет, которых еще нет в промпте (уже заданные не повторяются)"""
+    fresh = [question for question in CLOSED_QUESTIONS if question not in prompt]
+    picked = rng.sample(fresh, min(count, len(fresh)))
+    return [rng.choice(OPEN_QUESTIONS) if rng.random() < open_rate else question for question in picked]
+
+
+def _domain(prompt: str) -> str:
+    for domain in KNOWLEDGE_DOMAINS:
+        if domain in prompt:
+            return domain
+    return "Бизнес"
+
+
+def _quoted(prompt: str, label: str) -> str:
+    match = re.search(label + r'\s*"([^"]*)"', prompt)
+    return match.group(1) if match else ''
+
+
+def build_response(system_prompt: str, prompt: str, rng: random.Random, open_rate: float = 0.0) -> str:
+    """Правдоподобный ответ по типу промпта"""
+    domain = _domain(prompt)
+
+    if "json_repair" in system_prompt or "исправляешь синтаксические ошибки" in system_prompt:
+        match = re.search(r'Фрагмент с отметкой:\n(.*)\n\nИсправь', prompt, flags=re.DOTALL)
+        return match.group(1).replace("⟦⟧", "") if match else ""
+
+    if '"primary_domain"' in prompt:
+        return json.dumps({
+            "primary_domain": domain,
+            "secondary_domains": rng.sample([d for d in KNOWLEDGE_DOMAINS if d != domain], 2),
+            "complexity_level": rng.choice(["простая", "средняя", "сложная"]),
+            "requires_technical_knowledge": rng.random() < 0.5,
+            "requires_specialized_knowledge": rng.random() < 0.5,
+            "domain_description": f"Базовые знания в области {domain} и умение планировать проект"
+        }, ensure_ascii=False, indent=2)
+
+    if '"competencies"' in prompt and '"experience"' in prompt:
+        return json.dumps({
+            "domain": domain,
+            "competencies": ["Планирование", "Анализ рынка", "Управление ресурсами"],
+            "knowledge": [f"Основы {domain}", "Финансовое планирование", "Законодательство"],
+            "skills": ["Работа с клиентами", "Ведение бюджета", "Презентация идеи"],
+            "experience": ["Запуск небольших проектов", "Работа в команде"]
+        }, ensure_ascii=False, indent=2)
+
+    if '"category"' in prompt and '"weight"' in prompt:
+        count = _requested_count(prompt, 5)
+        templates = [
+            ("Есть ли у вас образование в области {d}?", "education", "high"),
+            ("Имеете ли вы практический опыт в {d}?", "experience", "high"),
+            ("Знакомы ли вы с профессиональной терминологией в {d}?", "knowledge", "medium"),
+            ("Умеете ли вы составлять бюджет проекта?", "skills", "medium"),
+            ("Запускали ли вы раньше собственный проект?", "experience", "medium"),
+            ("Работали ли вы с подрядчиками?", "experience", "low"),
+        ]
+        return json.dumps([
+            {"text": text.format(d=domain), "category": category, "weight": weight,
+             "explanation": "Оценить уровень подготовки"}
+            for text, category, weight in templates[:count]
+        ], ensure_ascii=False, indent=2)
+
+    if '"overall_level"' in prompt:
+        return json.dumps({
+            "domain": domain,
+            "overall_level": rng.choice(["новичок", "базовый", "средний", "продвинутый"]),
+            "competency_analysis": {
+                "education_level": "базовое",
+                "practical_experience": "минимальный",
+                "theoretical_knowledge": "базовое",
+                "technical_skills": "базовые"
+            },
+            "strengths": ["Понимание своей идеи", "Мотивация"],
+            "gaps": ["Нет опыта запуска", "Слабое знание рынка"],
+            "question_strategy": {
+                "complexity_level": "средние",
+                "terminology_usage": "базовая",
+                "explanation_needed": True,
+                "examples_needed": True
+            },
+            "profile_summary": "Пользователь с базовыми знаниями, нужны пояснения"
+        }, ensure_ascii=False, indent=2)
+
+    if '"adapted_for"' in prompt:
+        questions = _closed_questions(prompt, rng, 7, open_rate)
+        return json.dumps([
+            {"text": question, "explanation": "Пояснение к вопросу",
+             "examples": ["Пример ответа"], "adapted_for": "Адаптировано под уровень пользователя"}
+            for question in questions
+        ], ensure_ascii=False, indent=2)
+
+    if '"reformulated_question"' in prompt:
+        original = _quoted(prompt, "вопрос:") or "Вопрос"
+        result = {
+            "reformulated_question": f"Проще говоря: {original.rstrip('?')}?",
+            "explanation": "Этот вопрос помогает понять масштаб проекта",
+            "original_answer": "Без разницы" if '"options"' in prompt else "Не знаю"
+        }
+        if '"options"' in prompt:
+            result["options"] = [
+                {"title": "Вариант 1", "description": "Быстрый запуск с минимальными затратами"},
+                {"title": "Вариант 2", "description": "Полноценный запуск с расширенными возможностями"}
+            ]
+        return json.dumps(result, ensure_ascii=False, indent=2)
+
+    if '"technical_complexity"' in prompt:
+        return json.dumps({
+            "technical_complexity": 3, "required_resources": 2, "implementation_time": 3,
+            "required_knowledge": 3, "overall_complexity": "средняя",
+            "complexity_description": "Идея реализуема небольшой командой",
+            "main_challenges": ["Поиск клиентов", "Финансирование"],
+            "recommended_approach": "Начать с пилотной версии"
+        }, ensure_ascii=False, indent=2)
+
+    if "Некорректный вопрос:" in prompt:
+        return rng.choice(CLOSED_QUESTIONS)
+
+    if "уточняющих вопросов, которые помогут лучше понять" in prompt:
+        return _numbered(rng.sample(CONTEXT_QUESTIONS, 8))
+
+    if "ЗАКРЫТОЙ ФОРМЕ" in prompt or "закрытой форме" in prompt:
+        return _numbered(_closed_questions(prompt, rng, _requested_count(prompt, 7), open_rate))
+
+    for phrase in ("Уточненная идея:", "Доработанная идея:", "Переработанная идея:"):
+        if f'"{phrase}"' in prompt:
+            idea = _quoted(prompt, "Исходная идея пользователя:") or _quoted(prompt, "Исходная идея:")
+            return (f"{phrase} {idea}. Проект запускается поэтапно, начиная с пилотной версии "
+                    f"для небольшой группы пользователей. Бюджет и сроки определены, "
+                    f"основной риск - поиск первых клиентов.")
+
+    if "ИТОГОВЫЙ ОТЧЕТ" in prompt:
+        return ("## Исходная идея\nКратко описанная идея пользователя.\n\n"
+                "## Ключевые уточнения\n- Определена аудитория\n- Уточнены сроки и бюджет\n\n"
+                "## Финальная формулировка\nПроект запускается поэтапно с пилотной версией.\n\n"
+                "## Рекомендации\n1. Проверить спрос\n2. Собрать команду\n3. Запустить пилот")
+
+    if "улучшений" in prompt:
+        return _numbered(["Добавить программу лояльности", "Запустить рассылку",
+                          "Провести опрос клиентов", "Подготовить партнерскую программу"])
+
+    if 'Ответь "Да" или "Нет"' in prompt:
+        return rng.choice(["Да - это упростит запуск проекта", "Нет - на старте это не обязательно"])
+
+    return "Понял задачу. Готов помочь с уточнением идеи."
+
+
+def tokenize(text: str) -> List[str]:
+    """Грубое деление на токены: слова, знаки и пробелы"""
+    return _TOKEN_RE.findall(text)
+
+
+# === Сервер ===
+
+class StubState:
+    """Настройки и счетчики заглушки, общие для всех потоков обработки"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.slots = threading.BoundedSemaphore(args.concurrency)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.active = 0
+        self.stats = {'requests': 0, 'completed': 0, 'errors': 0, 'hangs': 0, 'rejected': 0,
+                      'completion_tokens': 0, 'max_active': 0}
+        self._counter = 0
+
+    def next_rng(self, system_prompt: str, prompt: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.args.seed}\0{system_prompt}\0{prompt}".encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], 'big'))
+
+    def fault_rng(self) -> random.Random:
+        """Случайность отказов - по номеру запроса, чтобы повтор того же запроса мог пройти"""
+        with self.lock:
+            self._counter += 1
+            return random.Random(self.args.seed * 1000003 + self._counter)
+
+    def count(self, key: str, value: int = 1):
+        with self.lock:
+            self.stats[key] += value
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "StubLMStudio/1.0"
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        if self.state.args.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, data: Dict[str, Any]):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/v1/models':
+            self._send_json(200, {"object": "list", "data": [
+                {"id": MODEL_ID, "object": "model", "owned_by": "organization_owner"}
+            ]})
+        elif self.path.rstrip('/') == '/stub/stats':
+            with self.state.lock:
+                self._send_json(200, {**self.state.stats, 'active': self.state.active,
+                                      'waiting': self.state.waiting})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            messages = payload['messages']
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": {"message": f"Bad request: {e}"}})
+            return
+
+        state = self.state
+        args = state.args
+        state.count('requests')
+
+        with state.lock:
+            if args.max_queue is not None and state.waiting >= args.max_queue:
+                state.stats['rejected'] += 1
+                rejected = True
+            else:
+                state.waiting += 1
+                rejected = False
+        if rejected:
+            self._send_json(503, {"error": {"message": "Model is busy"}})
+            return
+
+        state.slots.acquire()
+        with state.lock:
+            state.waiting -= 1
+            state.active += 1
+            state.stats['max_active'] = max(state.stats['max_active'], state.active)
+        try:
+            self._complete(payload, messages)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент ушел по таймауту - обычная ситуация при проверке зависаний
+            pass
+        finally:
+            with state.lock:
+                state.active -= 1
+            state.slots.release()
+
+    def _complete(self, payload: Dict[str, Any], messages: List[Dict[str, str]]):
+        state = self.state
+        args = state.args
+
+        faults = state.fault_rng()
+        if faults.random() < args.hang_rate:
+            state.count('hangs')
+            time.sleep(args.hang)
+            self.close_connection = True
+            return
+        if faults.random() < args.error_rate:
+            state.count('errors')
+            time.sleep(args.ttft)
+            self._send_json(500, {"error": {"message": "Injected failure"}})
+            return
+
+        system_prompt = next((m['content'] for m in messages if m.get('role') == 'system'), '')
+        prompt = next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+        content = build_response(system_prompt, prompt, state.next_rng(system_prompt, prompt), args.open_rate)
+
+        tokens = tokenize(content)
+        max_tokens = payload.get('max_tokens') or len(tokens)
+        finish_reason = 'length' if len(tokens) > max_tokens else 'stop'
+        tokens = tokens[:max_tokens]
+        usage = {
+            'prompt_tokens': len(tokenize(system_prompt)) + len(tokenize(prompt)),
+            'completion_tokens': len(tokens),
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        state.count('completion_tokens', len(tokens))
+
+        completion_id = f"chatcmpl-{hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]}"
+        created = int(time.time())
+        model = payload.get('model') or MODEL_ID
+
+        if payload.get('stream'):
+            self._stream(completion_id, created, model, tokens, finish_reason)
+        else:
+            time.sleep(args.ttft + args.per_token * len(tokens))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ''.join(tokens)},
+                    "finish_reason": finish_reason
+                }],
+                "usage": usage
+            })
+        state.count('completed')
+
+    def _stream(self, completion_id: str, created: int, model: str, tokens: List[str], finish_reason: str):
+        """Потоковый ответ: по событию SSE на токен"""
+        args = self.state.args
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(delta: Dict[str, str], finish: Optional[str] = None):
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        time.sleep(args.ttft)
+        send({"role": "assistant", "content": ""})
+        for token in tokens:
+            time.sleep(args.per_token)
+            send({"content": token})
+        send({}, finish_reason)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def make_server(args: argparse.Namespace) -> ThreadingHTTPServer:
+    """Сервер-заглушка (не запущенный); server.serve_forever() - в своем потоке"""
+    handler = type('BoundStubHandler', (StubHandler,), {'state': StubState(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Заглушка LM Studio")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1234)
+    parser.add_argument('--ttft', type=float, default=0.2, help="Секунд до первого токена")
+    parser.add_argument('--per-token', type=float, default=0.01, help="Секунд на токен")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument('--hang-rate', type=float, default=0.0, help="Доля запросов без ответа")
+    parser.add_argument('--hang', type=float, default=300.0, help="Секунд зависания до закрытия соединения")
+    parser.add_argument('--concurrency', type=int, default=1, help="Одновременно генерируемых ответов")
+    parser.add_argument('--max-queue', type=int, default=None, help="Ожидающих запросов до ответа 503")
+    parser.add_argument('--open-rate', type=float, default=0.0,
+                        help="Доля вопросов не в закрытой форме (проверка перегенерации)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--verbose', action='store_true', help="Логировать каждый запрос")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    server = make_server(args)
+    print(f"Заглушка LM Studio: http://{args.host}:{args.port}/v1 "
+          f"(ttft {args.ttft}с, {args.per_token}с/токен, параллельно {args.concurrency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
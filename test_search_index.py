@@ -0,0 +1,32 @@
+"""Тесты полнотекстового поиска по сессиям"""
+
+from search_index import SearchIndex
+
+
+def make_index(tmp_path) -> SearchIndex:
+    index = SearchIndex(tmp_path / "search.jsonl")
+    index.update_many([
+        {'session_id': 'delivery', 'user_idea': "Доставка еды в офисы бизнес-центра"},
+        {'session_id': 'coffee', 'user_idea': "Кофейня с выпечкой у дома"},
+    ])
+    return index
+
+
+def test_query_with_preposition_matches(tmp_path):
+    index = make_index(tmp_path)
+
+    assert [sid for sid, _ in index.search("доставка в офисы")] == ['delivery']
+    assert [sid for sid, _ in index.search("доставка еды в офис")] == ['delivery']
+    assert [sid for sid, _ in index.search("кофейня с выпечкой", prefix_last=False)] == ['coffee']
+
+
+def test_query_of_only_short_words_finds_nothing(tmp_path):
+    index = make_index(tmp_path)
+
+    assert index.search("в и с") == []
+
+
+def test_unknown_word_still_required(tmp_path):
+    index = make_index(tmp_path)
+
+    assert index.search("доставка цветов", prefix_last=False) == []
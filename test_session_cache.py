@@ -0,0 +1,84 @@
+"""Тесты кэша сессий: устаревшие сохранения и транзакции"""
+
+import threading
+
+import pytest
+
+from config import STORAGE
+from session_cache import SessionCache
+from session_manager import SessionManager
+from sqlite_session_store import SqliteSessionStore
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def cache(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(STORAGE, 'shard_migrate_on_start', False)
+    if request.param == 'json':
+        manager = SessionManager(str(tmp_path / "sessions"))
+    else:
+        manager = SqliteSessionStore(str(tmp_path / "sessions.db"))
+    cache = SessionCache(manager, flush_delay=60, max_flush_delay=60)
+    yield cache
+    cache.close()
+
+
+def test_stale_save_after_transaction_is_rejected(cache):
+    session_id = cache.create_session()
+    stale = cache.load_session(session_id)
+
+    with cache.transaction(session_id) as session_data:
+        session_data.main_answers = {'q1': "ответ"}
+
+    stale.refined_idea = "устаревшая правка"
+    assert cache.save_session(stale) is False
+
+    cache.flush()
+    session_data = cache.manager.load_session(session_id)
+    assert session_data.main_answers == {'q1': "ответ"}
+    assert session_data.refined_idea == ""
+
+
+def test_stale_save_after_other_copy_is_rejected(cache):
+    session_id = cache.create_session()
+    first = cache.load_session(session_id)
+    second = cache.load_session(session_id)
+
+    first.user_idea = "первая"
+    assert cache.save_session(first) is True
+    second.user_idea = "вторая"
+    assert cache.save_session(second) is False
+
+    # Сохраненная копия остается действительной для следующих сохранений
+    first.refined_idea = "уточнение"
+    assert cache.save_session(first) is True
+    assert cache.load_session(session_id).user_idea == "первая"
+
+
+def test_copy_from_transaction_can_be_saved(cache):
+    session_id = cache.create_session()
+
+    with cache.transaction(session_id) as session_data:
+        session_data.user_idea = "идея"
+    session_data.refined_idea = "уточнение"
+
+    assert cache.save_session(session_data) is True
+    cache.flush()
+    stored = cache.manager.load_session(session_id)
+    assert (stored.user_idea, stored.refined_idea) == ("идея", "уточнение")
+
+
+def test_concurrent_transactions_keep_all_updates(cache):
+    session_id = cache.create_session()
+
+    def work(worker: int):
+        for step in range(10):
+            with cache.transaction(session_id) as session_data:
+                session_data.main_answers = {**session_data.main_answers, f"{worker}-{step}": "ответ"}
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(cache.load_session(session_id).main_answers) == 40
@@ -0,0 +1,95 @@
+"""Тесты хранилища сессий: журнал, архив, параллельные итерации"""
+
+import threading
+
+import pytest
+
+from config import STORAGE, SessionStep
+from session_manager import SessionManager
+from sqlite_session_store import SqliteSessionStore
+
+
+@pytest.fixture(autouse=True)
+def storage(monkeypatch):
+    monkeypatch.setattr(STORAGE, 'shard_migrate_on_start', False)
+    monkeypatch.setattr(STORAGE, 'journal_enabled', True)
+
+
+def archived_session(sessions_dir) -> str:
+    manager = SessionManager(str(sessions_dir))
+    session_id = manager.create_session()
+    manager.complete_session(session_id, "итог")
+    assert manager.archive_old_sessions(days_old=-1) == 1
+    return session_id
+
+
+def test_mutators_work_on_archived_session(tmp_path):
+    session_id = archived_session(tmp_path)
+    manager = SessionManager(str(tmp_path))
+
+    assert manager.update_step(session_id, SessionStep.GENERATE_QUESTIONS)
+    assert manager.add_iteration(session_id, {'refined_idea': "уточнение"})
+    assert manager.add_validation(session_id, {'is_valid': True})
+    assert manager.complete_session(session_id, "новый итог")
+
+    session_data = manager.load_session(session_id)
+    assert session_data.current_step == SessionStep.COMPLETED
+    assert session_data.iteration_count == 1
+    assert session_data.final_result == "новый итог"
+    assert session_id not in manager.archive
+
+
+def test_archive_written_by_other_instance_is_visible(tmp_path):
+    writer = SessionManager(str(tmp_path))
+    reader = SessionManager(str(tmp_path))
+    session_id = writer.create_session()
+    writer.complete_session(session_id, "итог")
+
+    # Читатель уже загрузил индекс архива, когда сессия еще была в папке сессий
+    assert len(reader.archive) == 0
+    assert writer.archive_old_sessions(days_old=-1) == 1
+
+    assert reader.load_session(session_id).final_result == "итог"
+    assert reader.delete_session(session_id)
+    assert session_id not in writer.archive
+
+
+def test_journal_replay_after_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(STORAGE, 'journal_compact_every', 4)
+    first = SessionManager(str(tmp_path))
+    second = SessionManager(str(tmp_path))
+    session_id = first.create_session()
+
+    # Два экземпляра по очереди пишут события через несколько сверток журнала
+    for number in range(10):
+        manager = first if number % 2 else second
+        assert manager.add_validation(session_id, {'attempt': number})
+    assert first.update_step(session_id, SessionStep.VALIDATE_IDEA)
+
+    session_data = SessionManager(str(tmp_path)).load_session(session_id)
+    assert [record['attempt'] for record in session_data.validation_history] == list(range(10))
+    assert session_data.current_step == SessionStep.VALIDATE_IDEA
+    assert first.load_session(session_id).to_dict() == session_data.to_dict()
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_concurrent_iterations_get_distinct_numbers(tmp_path, backend):
+    if backend == 'json':
+        manager = SessionManager(str(tmp_path / "sessions"))
+    else:
+        manager = SqliteSessionStore(str(tmp_path / "sessions.db"))
+    session_id = manager.create_session()
+
+    def work():
+        for _ in range(10):
+            assert manager.add_iteration(session_id, {'refined_idea': "уточнение"})
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    session_data = manager.load_session(session_id)
+    assert session_data.iteration_count == 40
+    assert sorted(iteration.iteration for iteration in session_data.all_iterations) == list(range(1, 41))